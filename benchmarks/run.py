@@ -0,0 +1,299 @@
+"""
+Run the benchmarks against synthetic repositories.
+
+Usage (with ``src`` first in ``PYTHONPATH`` to benchmark the working
+tree rather than an installed copy; ``make bench`` does so)::
+
+    PYTHONPATH=src python benchmarks/run.py --shape small --output results.json
+    PYTHONPATH=src python benchmarks/run.py --shape small --baseline results.json
+
+Each benchmark reports the minimum and median wall time over
+``--repeat`` runs and the number of Git processes it starts.  Results
+are written as JSON.  The run fails (exit status 1) if a benchmark
+starts more Git processes than allowed by ``thresholds.json`` or, when
+a baseline is given, if it is slower or starts more processes than in
+the baseline beyond the tolerances in ``thresholds.json``.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import synthrepo
+
+import vcslinks
+from vcslinks import api
+from vcslinks.cache import default_cache
+from vcslinks.discovery import default_finder
+from vcslinks.linemap import default_linemaps
+from vcslinks.weburl import WebURL
+
+HERE = Path(__file__).resolve().parent
+SRC = HERE.parent / "src"
+DEFAULT_CACHE_DIR = HERE / ".repos"
+DEFAULT_THRESHOLDS = HERE / "thresholds.json"
+
+
+class Benchmark(NamedTuple):
+    name: str
+    func: Callable[[], object]
+    # Called before each run, not timed:
+    setup: Optional[Callable[[], object]] = None
+    # Arguments of vcsbrowse, for benchmarks running it in a child process:
+    cli: Optional[Tuple[str, ...]] = None
+
+
+def clear_caches() -> None:
+    default_cache.clear()
+    default_finder.clear()
+    default_linemaps.clear()
+
+
+def vcsbrowse(cwd: Path, *args: str, trace: Optional[str] = None) -> None:
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(
+            filter(None, [str(SRC), os.environ.get("PYTHONPATH")])
+        ),
+        # Do not talk to a daemon started outside of the benchmark:
+        VCSLINKS_SOCKET=str(cwd / "no-such-daemon.sock"),
+    )
+    env.pop("VCSLINKS_TRACE", None)
+    if trace:
+        env["VCSLINKS_TRACE"] = trace
+    code = "import sys; from vcslinks.browse import main; sys.exit(main())"
+    subprocess.run(
+        [sys.executable, "-c", code, "--dry-run", *args],
+        cwd=str(cwd),
+        env=env,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def benchmarks(layout: synthrepo.Layout) -> List[Benchmark]:
+    root = layout.root
+    target = root / layout.target
+    weburl: WebURL = api.analyze(root)
+    middle_tag = layout.tags[len(layout.tags) // 2]
+    head = weburl.repo.resolve_revision("HEAD")
+    some_files = [root / path for path in layout.files[:1000]]
+
+    items = [
+        Benchmark("analyze.cold", lambda: api.analyze(root), setup=clear_caches),
+        Benchmark("analyze.warm", lambda: api.analyze(root)),
+        Benchmark("weburl.pull_request", weburl.pull_request),
+        Benchmark("weburl.commit.head", lambda: weburl.commit("HEAD")),
+        Benchmark("weburl.commit.tag", lambda: weburl.commit(middle_tag)),
+        Benchmark("weburl.commit.abbrev", lambda: weburl.commit(head[:10])),
+        Benchmark("weburl.commit.short", lambda: weburl.commit(head, short=True)),
+        Benchmark("weburl.commits.tags", lambda: weburl.commits(layout.tags[:1000])),
+        Benchmark("weburl.log", weburl.log),
+        Benchmark("weburl.file", lambda: weburl.file(target)),
+        Benchmark("weburl.file.lines", lambda: weburl.file(target, lines=(10, 20))),
+        Benchmark("weburl.blame", lambda: weburl.blame(target)),
+        Benchmark(
+            "weburl.blame_commits",
+            lambda: list(weburl.blame_commits(target, lines=(1, 200))),
+        ),
+        Benchmark("weburl.tree", lambda: weburl.tree(target.parent)),
+        Benchmark("weburl.diff", lambda: weburl.diff("branch-0001")),
+        Benchmark(
+            "weburl.diff.permalink",
+            lambda: weburl.diff("branch-0001", "master", permalink=True),
+        ),
+        Benchmark(
+            "weburl.diff.merge_base",
+            lambda: weburl.diff("branch-0001", "master", merge_base=True),
+        ),
+        Benchmark("weburl.is_published", lambda: weburl.is_published("HEAD")),
+        Benchmark(
+            "api.files",
+            lambda: list(api.files(some_files, revision="HEAD", permalink=True)),
+        ),
+    ]
+    if layout.submodules:
+        submodule_file = root / layout.submodules[0] / "README.md"
+        items.append(
+            Benchmark(
+                "weburl.file.submodule", lambda: weburl.file(submodule_file, lines=1)
+            )
+        )
+    for worktree in layout.worktrees[:1]:
+        items.append(
+            Benchmark(
+                "analyze.worktree.cold",
+                lambda worktree=worktree: api.analyze(worktree),
+                setup=clear_caches,
+            )
+        )
+    for name, cli in [
+        ("file", ("file", layout.target, "3-5")),
+        ("commit", ("commit", middle_tag)),
+    ]:
+        items.append(
+            Benchmark(
+                f"vcsbrowse.{name}", lambda cli=cli: vcsbrowse(root, *cli), cli=cli
+            )
+        )
+    return items
+
+
+def count_processes(bench: Benchmark, layout: synthrepo.Layout) -> int:
+    if bench.setup is not None:
+        bench.setup()
+    if bench.cli is not None:
+        # Read the summary the child process writes at exit:
+        with tempfile.TemporaryDirectory() as tmp:
+            trace = os.path.join(tmp, "trace.jsonl")
+            vcsbrowse(layout.root, *bench.cli, trace=trace)
+            with open(trace) as file:
+                records = [json.loads(line) for line in file]
+        (summary,) = [r for r in records if r["type"] == "summary"]
+        del summary["type"]
+        return sum(int(s["processes"]) for s in summary.values())
+    with vcslinks.trace() as tracer:
+        bench.func()
+    return sum(int(s["processes"]) for s in tracer.summary().values())
+
+
+def measure(bench: Benchmark, repeat: int) -> List[float]:
+    times = []
+    for _ in range(repeat):
+        if bench.setup is not None:
+            bench.setup()
+        start = time.perf_counter()
+        bench.func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def git_version() -> str:
+    return subprocess.run(
+        ["git", "--version"], stdout=subprocess.PIPE, universal_newlines=True
+    ).stdout.strip()
+
+
+def run(layout: synthrepo.Layout, repeat: int, only: Optional[str]) -> Dict:
+    results = {}
+    for bench in benchmarks(layout):
+        if only and only not in bench.name:
+            continue
+        processes = count_processes(bench, layout)
+        times = measure(bench, repeat)
+        results[bench.name] = {
+            "min": min(times),
+            "median": statistics.median(times),
+            "processes": processes,
+        }
+        print(
+            f"{bench.name:<28} {min(times) * 1e3:10.3f} ms"
+            f" {statistics.median(times) * 1e3:10.3f} ms {processes:4d} git",
+            file=sys.stderr,
+        )
+    return results
+
+
+def check(results: Dict, thresholds: Dict, baseline: Optional[Dict]) -> List[str]:
+    """
+    Return descriptions of the regressions in `results`.
+
+    >>> thresholds = {"time_ratio": 1.5, "min_time": 0.001,
+    ...               "max_processes": {"a": 0}}
+    >>> check({"a": {"median": 1.0, "processes": 1}}, thresholds, None)
+    ['a: 1 git processes (at most 0 allowed)']
+    >>> baseline = {"results": {"b": {"median": 0.010, "processes": 2}}}
+    >>> check({"b": {"median": 0.020, "processes": 3}}, thresholds, baseline)
+    ['b: 3 git processes (2 in baseline)', 'b: 20.000 ms (10.000 ms in baseline)']
+    >>> check({"b": {"median": 0.0105, "processes": 2}}, thresholds, baseline)
+    []
+    """
+    failures = []
+    max_processes = thresholds.get("max_processes", {})
+    ratio = thresholds.get("time_ratio", 1.5)
+    min_time = thresholds.get("min_time", 0.001)
+    for name, result in sorted(results.items()):
+        limit = max_processes.get(name)
+        if limit is not None and result["processes"] > limit:
+            failures.append(
+                f"{name}: {result['processes']} git processes"
+                f" (at most {limit} allowed)"
+            )
+        old = (baseline or {}).get("results", {}).get(name)
+        if old is None:
+            continue
+        if result["processes"] > old["processes"]:
+            failures.append(
+                f"{name}: {result['processes']} git processes"
+                f" ({old['processes']} in baseline)"
+            )
+        if result["median"] > old["median"] * ratio + min_time:
+            failures.append(
+                f"{name}: {result['median'] * 1e3:.3f} ms"
+                f" ({old['median'] * 1e3:.3f} ms in baseline)"
+            )
+    return failures
+
+
+def main(args=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--shape", default="small", choices=sorted(synthrepo.SHAPES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", help="Compare with results in this JSON file.")
+    parser.add_argument("--thresholds", default=str(DEFAULT_THRESHOLDS))
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR))
+    parser.add_argument(
+        "--rebuild", action="store_true", help="Regenerate the repository."
+    )
+    parser.add_argument("--only", help="Run benchmarks whose name contains this.")
+    ns = parser.parse_args(args)
+    if Path(vcslinks.__file__).resolve().parent != SRC / "vcslinks":
+        print(f"warning: benchmarking {vcslinks.__file__}", file=sys.stderr)
+
+    shape = synthrepo.SHAPES[ns.shape]
+    start = time.perf_counter()
+    layout = synthrepo.ensure(Path(ns.cache_dir), ns.shape, shape, rebuild=ns.rebuild)
+    print(
+        f"repository: {layout.root} ({time.perf_counter() - start:.1f} s)",
+        file=sys.stderr,
+    )
+    report = {
+        "meta": {
+            "shape": dict(shape._asdict(), name=ns.shape),
+            "repeat": ns.repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "git": git_version(),
+            "vcslinks": vcslinks.__version__,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": run(layout, ns.repeat, ns.only),
+    }
+    if ns.output:
+        with open(ns.output, "w") as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+            file.write("\n")
+
+    with open(ns.thresholds) as file:
+        thresholds = json.load(file)
+    baseline = None
+    if ns.baseline:
+        with open(ns.baseline) as file:
+            baseline = json.load(file)
+    failures = check(report["results"], thresholds, baseline)
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+"""
+Generate synthetic Git repositories for benchmarking.
+
+The history is written with ``git fast-import`` and the references
+(tags, branches and remote-tracking branches) directly into a sorted
+``packed-refs``, so even the large shapes are generated in seconds.
+Generated repositories are cached by shape.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+GIT = [
+    "git",
+    "-c",
+    "user.name=Benchmark",
+    "-c",
+    "user.email=benchmark@vcslinks",
+    "-c",
+    "protocol.file.allow=always",
+    "-c",
+    "init.defaultBranch=master",
+]
+
+# Author/committer line of all generated commits:
+IDENTITY = "Benchmark <benchmark@vcslinks>"
+EPOCH = 1_500_000_000
+
+
+class Shape(NamedTuple):
+    # Number of files in the working tree:
+    files: int
+    # Directory nesting of each file:
+    depth: int
+    # Number of commits; all but the first modify `Layout.target`:
+    commits: int
+    # Number of (packed) tags:
+    tags: int
+    # Number of remotes besides ``origin``:
+    remotes: int
+    # Number of local branches and of remote-tracking branches per remote:
+    branches: int
+    worktrees: int
+    submodules: int
+    commit_graph: bool = True
+
+
+SHAPES: Dict[str, Shape] = {
+    "tiny": Shape(
+        files=50,
+        depth=3,
+        commits=5,
+        tags=100,
+        remotes=3,
+        branches=5,
+        worktrees=1,
+        submodules=1,
+    ),
+    "small": Shape(
+        files=2_000,
+        depth=6,
+        commits=20,
+        tags=5_000,
+        remotes=20,
+        branches=50,
+        worktrees=1,
+        submodules=2,
+    ),
+    "large": Shape(
+        files=30_000,
+        depth=12,
+        commits=100,
+        tags=100_000,
+        remotes=200,
+        branches=300,
+        worktrees=2,
+        submodules=3,
+    ),
+}
+
+
+class Layout(NamedTuple):
+    root: Path
+    # A file at the deepest level, modified by every commit:
+    target: str
+    # Paths (relative to `root`) of all files:
+    files: List[str]
+    tags: List[str]
+    worktrees: List[Path]
+    submodules: List[str]
+
+    def to_json(self) -> dict:
+        return dict(
+            self._asdict(),
+            root=str(self.root),
+            worktrees=[str(p) for p in self.worktrees],
+        )
+
+    @classmethod
+    def from_json(cls, data: dict) -> "Layout":
+        return cls(
+            **dict(
+                data,
+                root=Path(data["root"]),
+                worktrees=[Path(p) for p in data["worktrees"]],
+            )
+        )
+
+
+def git(cwd: Path, *args: str, **kwargs) -> str:
+    return subprocess.run(
+        GIT + list(args),
+        cwd=str(cwd),
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        **kwargs,
+    ).stdout.strip()
+
+
+def file_path(i: int, depth: int, fanout: int = 8) -> str:
+    """
+    Path of the `i`-th file.
+
+    >>> file_path(10, 3)
+    'd2/d1/d0/f10.txt'
+    """
+    parts = [f"d{(i // fanout ** k) % fanout}" for k in range(depth)]
+    return "/".join(parts + [f"f{i}.txt"])
+
+
+def shape_key(name: str, shape: Shape) -> str:
+    digest = hashlib.sha1(repr(tuple(shape)).encode()).hexdigest()[:10]
+    return f"{name}-{digest}"
+
+
+def _data(text: str) -> bytes:
+    data = text.encode()
+    return b"data %d\n" % len(data) + data + b"\n"
+
+
+def _make_submodule(path: Path, index: int) -> str:
+    path.mkdir(parents=True)
+    git(path, "init", "--quiet")
+    text = "".join(f"sub {index} line {n}\n" for n in range(20))
+    (path / "README.md").write_text(text)
+    git(path, "add", "README.md")
+    git(path, "commit", "--quiet", "--message", f"submodule {index}")
+    return git(path, "rev-parse", "HEAD")
+
+
+def _fast_import_stream(shape: Shape, target: str, gitlinks: Dict[str, str]):
+    files = [file_path(i, shape.depth) for i in range(shape.files)]
+    lines = [f"line {n}\n" for n in range(200)]
+    for n in range(shape.commits):
+        chunks = [
+            b"commit refs/heads/master\n",
+            f"committer {IDENTITY} {EPOCH + n * 60} +0000\n".encode(),
+            _data(f"commit {n}"),
+        ]
+        if n == 0:
+            for i, path in enumerate(files):
+                if path != target:
+                    chunks.append(f"M 100644 inline {path}\n".encode())
+                    chunks.append(_data(f"file {i}\n"))
+            if gitlinks:
+                gitmodules = "".join(
+                    f'[submodule "{path}"]\n\tpath = {path}\n'
+                    f"\turl = ../{Path(path).name}.git\n"
+                    for path in gitlinks
+                )
+                chunks.append(b"M 100644 inline .gitmodules\n" + _data(gitmodules))
+                for path, oid in gitlinks.items():
+                    chunks.append(f"M 160000 {oid} {path}\n".encode())
+        else:
+            # Rewrite one line per commit so that blame has some history:
+            lines[(n * 37) % len(lines)] = f"line changed in commit {n}\n"
+        chunks.append(f"M 100644 inline {target}\n".encode())
+        chunks.append(_data("".join(lines)))
+        yield b"".join(chunks)
+    yield b"done\n"
+
+
+def _write_packed_refs(
+    root: Path, shape: Shape, commits: List[str], tags: List[str]
+) -> None:
+    head = commits[-1]
+    refs = {"refs/heads/master": head}
+    for i in range(shape.branches):
+        refs[f"refs/heads/branch-{i:04d}"] = commits[i % len(commits)]
+    for remote in ["origin"] + [f"remote-{k:03d}" for k in range(shape.remotes)]:
+        for i in range(shape.branches):
+            refs[f"refs/remotes/{remote}/branch-{i:04d}"] = commits[i % len(commits)]
+        refs[f"refs/remotes/{remote}/master"] = head
+    for i, tag in enumerate(tags):
+        refs[f"refs/tags/{tag}"] = commits[i % len(commits)]
+    with open(str(root / ".git" / "packed-refs"), "w") as file:
+        file.write("# pack-refs with: peeled fully-peeled sorted \n")
+        for name in sorted(refs):
+            file.write(f"{refs[name]} {name}\n")
+    # fast-import wrote a loose ref; keep only the packed one:
+    (root / ".git" / "refs" / "heads" / "master").unlink()
+
+
+def _write_config(root: Path, shape: Shape) -> None:
+    with open(str(root / ".git" / "config"), "a") as file:
+        file.write(
+            '[remote "origin"]\n'
+            "\turl = git@github.com:USER/PROJECT.git\n"
+            "\tfetch = +refs/heads/*:refs/remotes/origin/*\n"
+            '[branch "master"]\n'
+            "\tremote = origin\n"
+            "\tmerge = refs/heads/master\n"
+        )
+        for k in range(shape.remotes):
+            file.write(
+                f'[remote "remote-{k:03d}"]\n'
+                f"\turl = git@github.com:FORK{k}/PROJECT.git\n"
+                f"\tfetch = +refs/heads/*:refs/remotes/remote-{k:03d}/*\n"
+            )
+
+
+def generate(directory: Path, shape: Shape) -> Layout:
+    """
+    Generate a repository of `shape` under `directory` (which must not
+    exist) and return its `Layout`.
+    """
+    directory.mkdir(parents=True)
+    root = directory / "repo"
+    root.mkdir()
+    git(root, "init", "--quiet")
+    target = file_path(shape.files - 1, shape.depth)
+    gitlinks = {}
+    submodules = []
+    for k in range(shape.submodules):
+        path = f"vendor/sub{k}"
+        gitlinks[path] = _make_submodule(directory / f"sub{k}", k)
+        submodules.append(path)
+
+    proc = subprocess.Popen(
+        GIT + ["fast-import", "--quiet", "--done"], cwd=str(root), stdin=subprocess.PIPE
+    )
+    assert proc.stdin is not None
+    for chunk in _fast_import_stream(shape, target, gitlinks):
+        proc.stdin.write(chunk)
+    proc.stdin.close()
+    if proc.wait():
+        raise subprocess.CalledProcessError(proc.returncode, "git fast-import")
+
+    commits = git(root, "rev-list", "--reverse", "master").split()
+    tags = [f"v{i:06d}" for i in range(shape.tags)]
+    _write_config(root, shape)
+    _write_packed_refs(root, shape, commits, tags)
+    git(root, "reset", "--quiet", "--hard", "master")
+    for path in submodules:
+        # Check out from the sibling repository, as `git submodule
+        # update` would with the relative URL:
+        source = directory / Path(path).name
+        git(root, "clone", "--quiet", str(source), path)
+    if shape.commit_graph:
+        git(root, "commit-graph", "write", "--reachable")
+    worktrees = []
+    for k in range(shape.worktrees):
+        worktree = directory / f"worktree{k}"
+        git(root, "worktree", "add", "--quiet", "--no-checkout", str(worktree))
+        worktrees.append(worktree)
+
+    return Layout(
+        root=root,
+        target=target,
+        files=[file_path(i, shape.depth) for i in range(shape.files)],
+        tags=tags,
+        worktrees=worktrees,
+        submodules=submodules,
+    )
+
+
+def ensure(cache_dir: Path, name: str, shape: Shape, rebuild: bool = False) -> Layout:
+    """
+    Return the `Layout` of a cached repository of `shape`, generating
+    it first if needed.
+    """
+    directory = cache_dir / shape_key(name, shape)
+    manifest = directory / "layout.json"
+    if rebuild and directory.exists():
+        shutil.rmtree(str(directory))
+    if manifest.exists():
+        return Layout.from_json(json.loads(manifest.read_text()))
+    if directory.exists():
+        # Left over from an interrupted run:
+        shutil.rmtree(str(directory))
+    layout = generate(directory, shape)
+    tmp = manifest.with_suffix(".tmp")
+    tmp.write_text(json.dumps(layout.to_json()))
+    os.replace(str(tmp), str(manifest))
+    return layout
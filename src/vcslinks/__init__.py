@@ -58,6 +58,11 @@ opening relevant pages of GitHub/GitLab/Bitbucket in web browser.
    :target: http://mypy-lang.org/
 """
 
+import importlib
+
+# Not imported from `typing` to keep `import vcslinks` cheap:
+TYPE_CHECKING = False
+
 __version__ = "0.1.3.dev"
 __author__ = "Takafumi Arakaki"
 __license__ = "MIT"
@@ -65,15 +70,78 @@ __license__ = "MIT"
 __all__ = [
     "analyze",
     "blame",
+    "blames",
     "commit",
+    "commits",
     "diff",
     "file",
+    "files",
     "log",
     "pull_request",
     "root",
+    "scan",
+    "trace",
     "tree",
+    "trees",
+    "InvalidRevisionError",
+    "ScanResult",
     "WebURL",
 ]
 
-from .api import analyze, blame, commit, diff, file, log, pull_request, root, tree
-from .weburl import WebURL
+_LAZY_ATTRIBUTES = {
+    "analyze": "api",
+    "blame": "api",
+    "blames": "api",
+    "commit": "api",
+    "commits": "api",
+    "diff": "api",
+    "file": "api",
+    "files": "api",
+    "log": "api",
+    "pull_request": "api",
+    "root": "api",
+    "scan": "scanner",
+    "trace": "tracing",
+    "tree": "api",
+    "trees": "api",
+    "InvalidRevisionError": "base",
+    "ScanResult": "scanner",
+    "WebURL": "weburl",
+}
+
+if TYPE_CHECKING:
+    from .api import (  # noqa: F401
+        analyze,
+        blame,
+        blames,
+        commit,
+        commits,
+        diff,
+        file,
+        files,
+        log,
+        pull_request,
+        root,
+        tree,
+        trees,
+    )
+    from .base import InvalidRevisionError  # noqa: F401
+    from .scanner import ScanResult, scan  # noqa: F401
+    from .tracing import trace  # noqa: F401
+    from .weburl import WebURL  # noqa: F401
+
+
+def __getattr__(name):
+    # Import submodules on first access so that `import vcslinks` (and
+    # `vcsbrowse`) only pays for what is used.
+    try:
+        module = _LAZY_ATTRIBUTES[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
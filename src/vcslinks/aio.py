@@ -0,0 +1,381 @@
+"""
+Asynchronous API for `asyncio` applications.
+
+The coroutines mirror the high-level API (`vcslinks.file`, etc.) but
+never block the event loop on Git: repository metadata is read
+in-process when possible and otherwise by Git processes started with
+`asyncio.create_subprocess_exec`.  Independent lookups run
+concurrently and the number of Git processes in flight is capped by
+`MAX_PROCESSES` per event loop.  Links into submodules and the mapping
+of working tree lines use the synchronous analyzer in a thread of the
+default executor.
+
+..
+   >>> _ = getfixture("github_repository")
+
+>>> import asyncio
+>>> from vcslinks import aio
+>>> asyncio.run(aio.log())
+'https://github.com/USER/PROJECT/commits/master'
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import subprocess
+import time
+import weakref
+from pathlib import Path
+from typing import Callable, Optional, Tuple, TypeVar
+
+from . import tracing
+from .base import Pathish
+from .cache import default_cache
+from .discovery import RepoLocation, default_finder
+from .git import GitRepoAnalyzer, LocalBranch, is_supported_url
+from .gitconfig import GitConfig, UnsupportedConfigError, config_files
+from .refs import UnreadableRefsError
+from .weburl import LinesSpecifier, WebURL
+
+MAX_PROCESSES = 8
+
+T = TypeVar("T")
+
+# Semaphores limiting Git processes, per event loop:
+_semaphores: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(MAX_PROCESSES)
+    return semaphore
+
+
+async def git(cwd: Pathish, *args: str) -> str:
+    """
+    Run ``git`` with `args` and return its output.
+
+    Raises `subprocess.CalledProcessError` if it fails.
+    """
+    async with _semaphore():
+        tracer = tracing.active
+        start = time.perf_counter()
+        proc = await asyncio.create_subprocess_exec(
+            "git",
+            *args,
+            cwd=str(cwd),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        stdout, stderr = await proc.communicate()
+    if tracer is not None:
+        tracer.record_process(
+            ("git",) + args, str(cwd), start, proc.returncode, len(stdout), len(stderr)
+        )
+    out = stdout.decode("utf-8", "surrogateescape")
+    if proc.returncode:
+        err = stderr.decode("utf-8", "surrogateescape")
+        raise subprocess.CalledProcessError(proc.returncode, ("git",) + args, out, err)
+    return out
+
+
+async def _locate(cwd: Path) -> RepoLocation:
+    location = default_finder.find(cwd)
+    if location is not None:
+        return location
+    root, git_dir, common_dir = (
+        await git(
+            cwd,
+            "rev-parse",
+            "--show-toplevel",
+            "--absolute-git-dir",
+            "--git-common-dir",
+        )
+    ).splitlines()
+    return RepoLocation(
+        root=Path(root),
+        git_dir=Path(git_dir),
+        common_dir=Path(os.path.abspath(os.path.join(cwd, common_dir))),
+    )
+
+
+async def _snapshot_config(location: RepoLocation) -> GitConfig:
+    # Git prints origins relative to the top of the working tree:
+    root = location.root
+    output = await git(root, "config", "--list", "-z", "--show-origin")
+    try:
+        standard = [path for _, path in config_files(location.common_dir)]
+    except UnsupportedConfigError:
+        standard = []
+    return GitConfig.from_list_output(output, cwd=root, origins=standard)
+
+
+async def _current_branch(cwd: Path) -> str:
+    return (await git(cwd, "rev-parse", "--abbrev-ref", "HEAD")).rstrip()
+
+
+async def _analyze(path: Pathish, branch: Optional[str] = None) -> WebURL:
+    cwd = Path(path)
+    if not cwd.is_dir():
+        cwd = cwd.parent
+    location = await _locate(cwd)
+    config: Optional[GitConfig]
+    try:
+        config = GitConfig.load(location.git_dir, location.common_dir)
+    except UnsupportedConfigError:
+        config = None
+
+    if config is None:
+        # Git is needed for both; ask concurrently:
+        if branch is None:
+            config, current = await asyncio.gather(
+                _snapshot_config(location), _current_branch(cwd)
+            )
+        else:
+            config = await _snapshot_config(location)
+            current = branch
+        repo = GitRepoAnalyzer(cwd, location=location, config=config)
+    else:
+        repo = GitRepoAnalyzer(cwd, location=location, config=config)
+        head = None
+        if branch is None and repo.refs is not None:
+            try:
+                head = repo.refs.current_branch()
+            except UnreadableRefsError:
+                pass
+        current = branch or head or await _current_branch(cwd)
+
+    if branch is None and not is_supported_url(
+        repo.remote_url(branch=current), repo.host_rules
+    ):
+        current = "master"
+    return LocalBranch(repo, name=current).weburl()
+
+
+async def analyze(path: Pathish = ".", branch: Optional[str] = None) -> WebURL:
+    """
+    Asynchronous version of `vcslinks.analyze`.
+    """
+    weburl = default_cache.lookup(path, branch)
+    if weburl is not None:
+        return weburl
+    return default_cache.store(await _analyze(path, branch), branch)
+
+
+async def resolve_revision(weburl: WebURL, revision: str) -> str:
+    """
+    Resolve `revision` in the repository of `weburl`.
+    """
+    repo = weburl.repo
+    if not isinstance(repo, GitRepoAnalyzer):
+        return repo.resolve_revision(revision)
+    oid = repo.try_resolve_revision(revision)
+    if oid is not None:
+        return oid
+    return (await git(repo.cwd, "rev-parse", "--verify", revision)).strip()
+
+
+async def _resolved_revision(
+    weburl: WebURL, revision: Optional[str], permalink: bool
+) -> Optional[str]:
+    if permalink:
+        return await resolve_revision(weburl, revision or weburl.local_branch.name)
+    return None
+
+
+def _may_run_git(weburl: WebURL, slow: bool) -> bool:
+    # Whether building a link may need Git for looking up submodules
+    # or for mapping lines, abbreviating or checking reachability (if
+    # `slow`), which only the synchronous analyzer does.
+    repo = weburl.repo
+    if not isinstance(repo, GitRepoAnalyzer):
+        return False
+    return slow or (repo.root / ".gitmodules").exists()
+
+
+async def _run_sync(func: Callable[[], T], may_run_git: bool) -> T:
+    if not may_run_git:
+        return func()
+    loop = asyncio.get_running_loop()
+    # Keep the tracing context in the executor thread:
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(None, functools.partial(context.run, func))
+
+
+async def _file_url(
+    page: str,
+    file: Pathish,
+    lines: LinesSpecifier,
+    revision: Optional[str],
+    permalink: Optional[bool],
+    short: bool,
+    check_published: bool,
+    branch: Optional[str],
+) -> str:
+    weburl = await analyze(file, branch)
+    if permalink is None:
+        permalink = lines is not None
+    resolved = await _resolved_revision(weburl, revision, permalink)
+    url = functools.partial(
+        weburl._file_url,
+        page,
+        file,
+        lines,
+        revision,
+        permalink,
+        check_published=check_published,
+        short=short,
+        resolved=resolved,
+    )
+    mapped = bool(permalink and lines and not revision)
+    return await _run_sync(
+        url, _may_run_git(weburl, mapped or short or check_published)
+    )
+
+
+async def root(*, path: Pathish = ".", branch: Optional[str] = None) -> str:
+    """
+    Asynchronous version of `vcslinks.root`.
+    """
+    return (await analyze(path, branch)).rooturl
+
+
+async def pull_request(
+    path: Pathish = ".", *, branch: Optional[str] = None
+) -> Optional[str]:
+    """
+    Asynchronous version of `vcslinks.pull_request`.
+    """
+    return (await analyze(path, branch)).pull_request()
+
+
+async def commit(
+    revision: str = "HEAD",
+    *,
+    path: Pathish = ".",
+    short: bool = False,
+    check_published: bool = False,
+    branch: Optional[str] = None,
+) -> str:
+    """
+    Asynchronous version of `vcslinks.commit`.
+    """
+    weburl = await analyze(path, branch)
+    oid = await resolve_revision(weburl, revision)
+    if short or check_published:
+        # `oid` is a full object ID, resolved again in-process:
+        return await _run_sync(
+            functools.partial(
+                weburl.commit, oid, check_published=check_published, short=short
+            ),
+            _may_run_git(weburl, short or check_published),
+        )
+    return weburl._commit_url(oid)
+
+
+async def log(
+    commit: Optional[str] = None, *, path: Pathish = ".", branch: Optional[str] = None
+) -> str:
+    """
+    Asynchronous version of `vcslinks.log`.
+    """
+    return (await analyze(path, branch)).log(commit)
+
+
+async def file(
+    file: Pathish,
+    lines: LinesSpecifier = None,
+    revision: Optional[str] = None,
+    permalink: Optional[bool] = None,
+    short: bool = False,
+    check_published: bool = False,
+    *,
+    branch: Optional[str] = None,
+) -> str:
+    """
+    Asynchronous version of `vcslinks.file`.
+    """
+    return await _file_url(
+        "file", file, lines, revision, permalink, short, check_published, branch
+    )
+
+
+async def blame(
+    file: Pathish,
+    lines: LinesSpecifier = None,
+    revision: Optional[str] = None,
+    permalink: Optional[bool] = None,
+    short: bool = False,
+    check_published: bool = False,
+    *,
+    branch: Optional[str] = None,
+) -> str:
+    """
+    Asynchronous version of `vcslinks.blame`.
+    """
+    return await _file_url(
+        "blame", file, lines, revision, permalink, short, check_published, branch
+    )
+
+
+async def tree(
+    directory: Optional[Pathish] = None,
+    revision: Optional[str] = None,
+    permalink: bool = False,
+    short: bool = False,
+    check_published: bool = False,
+    *,
+    branch: Optional[str] = None,
+) -> str:
+    """
+    Asynchronous version of `vcslinks.tree`.
+    """
+    weburl = await analyze(directory or ".", branch)
+    resolved = await _resolved_revision(weburl, revision, permalink)
+    slow = short or check_published
+    url = functools.partial(
+        weburl.tree,
+        directory,
+        revision=resolved or revision,
+        # Only to abbreviate or check the already resolved commit (or
+        # to reject `check_published` without `permalink`):
+        permalink=permalink and slow,
+        check_published=check_published,
+        short=short,
+    )
+    return await _run_sync(url, bool(directory or slow) and _may_run_git(weburl, slow))
+
+
+async def diff(
+    revision1: Optional[str] = None,
+    revision2: Optional[str] = None,
+    permalink: bool = False,
+    path: Pathish = ".",
+    merge_base: bool = False,
+    *,
+    branch: Optional[str] = None,
+) -> str:
+    """
+    Asynchronous version of `vcslinks.diff`.
+    """
+    weburl = await analyze(path, branch)
+    if merge_base:
+        # The merge base may have to be computed by Git:
+        return await _run_sync(
+            functools.partial(weburl.diff, revision1, revision2, merge_base=True),
+            isinstance(weburl.repo, GitRepoAnalyzer),
+        )
+    if permalink:
+        revisions: Tuple[str, ...] = (revision1 or weburl.local_branch.remote_branch(),)
+        if revision2:
+            revisions += (revision2,)
+        resolved = await asyncio.gather(
+            *(resolve_revision(weburl, rev) for rev in revisions)
+        )
+        revision1 = resolved[0]
+        revision2 = resolved[1] if revision2 else None
+    return weburl.diff(revision1, revision2)
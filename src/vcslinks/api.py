@@ -1,19 +1,27 @@
-from typing import Optional
-
+import functools
+import os
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from . import tracing
+from .base import InvalidRevisionError
+from .cache import default_cache
+from .discovery import default_finder
 from .git import GitRepoAnalyzer, Pathish, choose_local_branch
 from .weburl import LinesSpecifier, WebURL
 
+FileItem = Union[Pathish, Tuple[Pathish, LinesSpecifier]]
+
 PATH_DOC = """
         Path to a Git repository.  It can be a path to any file or
         directory inside the repository.  The root of the Git
-        repository is found automatically by the ``git`` command.
-"""
+        repository is found automatically.
+""".strip()
 
 PERMALINK_DOC = """
         Resolve the revisions in the *local* repository to a full
         revision if `True`.  Use `revision` (e.g., ``master``) as-is
         if `False`.
-"""
+""".strip()
 
 DEFAULT_DOCS = """
     branch
@@ -25,6 +33,20 @@ DEFAULT_DOCS = """
 """.strip()
 
 
+def _traced(func):
+    # Record the call when tracing is enabled (see `vcslinks.tracing`).
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if tracing.active is None:
+            return func(*args, **kwargs)
+        return tracing.traced_api(name, func, args, kwargs)
+
+    return wrapper
+
+
+@_traced
 def analyze(path: Pathish = ".", **kwargs) -> WebURL:
     """
     Analyze a Git repository and return a `WebURL` instance.
@@ -50,12 +72,22 @@ def analyze(path: Pathish = ".", **kwargs) -> WebURL:
     path
         {PATH_DOC}
     {DEFAULT_DOCS}
+
+    Results are cached per repository (see `vcslinks.cache`) and
+    re-analyzed when the repository metadata changes.
     """
+    return default_cache.get(
+        path, kwargs.get("branch"), lambda: _analyze(path, **kwargs)
+    )
+
+
+def _analyze(path: Pathish, **kwargs) -> WebURL:
     repo = GitRepoAnalyzer.from_path(path)
     local_branch = choose_local_branch(repo, **kwargs)
     return local_branch.weburl()
 
 
+@_traced
 def root(*, path: Pathish = ".", **kwargs) -> str:
     """
     Get a URL to GitHub/GitLab/Bitbucket.
@@ -88,6 +120,7 @@ def root(*, path: Pathish = ".", **kwargs) -> str:
     return analyze(path, **kwargs).rooturl
 
 
+@_traced
 def pull_request(path: Pathish = ".", **kwargs) -> Optional[str]:
     """
     Get a URL to the web page for submitting a PR.
@@ -120,7 +153,15 @@ def pull_request(path: Pathish = ".", **kwargs) -> Optional[str]:
     return analyze(path, **kwargs).pull_request()
 
 
-def commit(revision: str = "HEAD", *, path: Pathish = ".", **kwargs) -> str:
+@_traced
+def commit(
+    revision: str = "HEAD",
+    *,
+    path: Pathish = ".",
+    short: bool = False,
+    check_published: bool = False,
+    **kwargs,
+) -> str:
     """
     Get a URL to commit page.
 
@@ -151,11 +192,50 @@ def commit(revision: str = "HEAD", *, path: Pathish = ".", **kwargs) -> str:
         Git commit-ish.  It is resolved in the *local* repository.
     path
         {PATH_DOC}
+    short
+        Abbreviate the resolved commit to the shortest unambiguous
+        object ID (but not shorter than ``core.abbrev``) if `True`.
+    check_published
+        Raise `UnpublishedCommitError` unless the resolved commit is
+        reachable from a remote-tracking branch.
     {DEFAULT_DOCS}
     """
-    return analyze(path, **kwargs).commit(revision)
+    return analyze(path, **kwargs).commit(
+        revision, check_published=check_published, short=short
+    )
+
+
+@_traced
+def commits(
+    revisions: Iterable[str], *, path: Pathish = ".", **kwargs
+) -> List[Union[str, InvalidRevisionError]]:
+    """
+    Get URLs to commit pages of many revisions at once.
 
+    All revisions are resolved with at most one ``git`` process.  An
+    invalid revision is reported in place as `InvalidRevisionError`
+    instead of aborting the whole batch.
 
+    ..
+       >>> getfixture("patch_analyze")
+
+    >>> import vcslinks
+    >>> vcslinks.commits(["master", "dev"])  # doctest: +NORMALIZE_WHITESPACE
+    ['https://github.com/USER/PROJECT/commit/55150afe539493d650889224db136bc8d9b7ecb8',
+     'https://github.com/USER/PROJECT/commit/40539486fdaf08a39b57519eb06e0e200c932cfd']
+
+    Parameters
+    ----------
+    revisions
+        Git commit-ishes.  They are resolved in the *local* repository.
+    path
+        {PATH_DOC}
+    {DEFAULT_DOCS}
+    """
+    return analyze(path, **kwargs).commits(revisions)
+
+
+@_traced
 def log(commit: Optional[str] = None, *, path: Pathish = ".", **kwargs) -> str:
     """
     Get a URL to history page.
@@ -193,11 +273,14 @@ def log(commit: Optional[str] = None, *, path: Pathish = ".", **kwargs) -> str:
     return analyze(path, **kwargs).log(commit)
 
 
+@_traced
 def file(
     file: Pathish,
     lines: LinesSpecifier = None,
     revision: Optional[str] = None,
     permalink: Optional[bool] = None,
+    short: bool = False,
+    check_published: bool = False,
     **kwargs,
 ) -> str:
     """
@@ -255,16 +338,31 @@ def file(
         revision if `True`.  Use `revision` (e.g., ``master``) as-is
         if `False`.  If `None` (default), resolve `revision` if
         non-`None` value is specified for `lines`.
+    short
+        Abbreviate the resolved revision to the shortest unambiguous
+        object ID (but not shorter than ``core.abbrev``) if `True`.
+    check_published
+        Raise `UnpublishedCommitError` unless the resolved revision is
+        reachable from a remote-tracking branch.  `ValueError` is
+        raised if `permalink` is (or defaults to) `False`.
     """
     return analyze(file, **kwargs).file(
-        file, lines=lines, revision=revision, permalink=permalink
+        file,
+        lines=lines,
+        revision=revision,
+        permalink=permalink,
+        check_published=check_published,
+        short=short,
     )
 
 
+@_traced
 def tree(
     directory: Optional[Pathish] = None,
     revision: Optional[str] = None,
     permalink: bool = False,
+    short: bool = False,
+    check_published: bool = False,
     **kwargs,
 ) -> str:
     """
@@ -305,17 +403,30 @@ def tree(
         Git commit-ish.
     permalink
         {PERMALINK_DOC}
+    short
+        Abbreviate the resolved commit to the shortest unambiguous
+        object ID (but not shorter than ``core.abbrev``) if `True`.
+    check_published
+        Raise `UnpublishedCommitError` unless the resolved revision is
+        reachable from a remote-tracking branch.  `ValueError` is
+        raised if `permalink` is `False`.
     """
     return analyze(directory or ".", **kwargs).tree(
-        directory, revision=revision, permalink=permalink
+        directory,
+        revision=revision,
+        permalink=permalink,
+        check_published=check_published,
+        short=short,
     )
 
 
+@_traced
 def diff(
     revision1: Optional[str] = None,
     revision2: Optional[str] = None,
     permalink: bool = False,
     path: Pathish = ".",
+    merge_base: bool = False,
     **kwargs,
 ) -> str:
     """
@@ -363,18 +474,28 @@ def diff(
         {PERMALINK_DOC}
     path
         {PATH_DOC}
+    merge_base
+        Compare the merge base of the source and the target with the
+        target, both resolved to commits in the *local* repository, if
+        `True`.
     {DEFAULT_DOCS}
     """
     return analyze(path, **kwargs).diff(
-        revision1=revision1, revision2=revision2, permalink=permalink
+        revision1=revision1,
+        revision2=revision2,
+        permalink=permalink,
+        merge_base=merge_base,
     )
 
 
+@_traced
 def blame(
     file: Pathish,
     lines: LinesSpecifier = None,
     revision: Optional[str] = None,
     permalink: Optional[bool] = None,
+    short: bool = False,
+    check_published: bool = False,
     **kwargs,
 ) -> str:
     """
@@ -402,12 +523,195 @@ def blame(
     'https://bitbucket.org/USER/PROJECT/annotate/master/README.md'
     """
     return analyze(file, **kwargs).blame(
-        file, lines=lines, revision=revision, permalink=permalink
+        file,
+        lines=lines,
+        revision=revision,
+        permalink=permalink,
+        check_published=check_published,
+        short=short,
     )
 
 
-for f in [analyze, root, pull_request, commit, log, tree, diff]:
-    f.__doc__ = f.__doc__.format(  # type: ignore
-        PATH_DOC=PATH_DOC, PERMALINK_DOC=PERMALINK_DOC, DEFAULT_DOCS=DEFAULT_DOCS
+def _split_item(item: FileItem) -> Tuple[Pathish, LinesSpecifier]:
+    if isinstance(item, tuple):
+        path, lines = item
+        return path, lines
+    return item, None
+
+
+def _batch(
+    items: Iterable[FileItem],
+    revision: Optional[str],
+    permalink: Optional[bool],
+    url: Callable[[WebURL, Pathish, LinesSpecifier, bool, Optional[str]], str],
+    kwargs: dict,
+) -> Iterator[str]:
+    # `url` is called with the commit `revision` resolves to in the
+    # repository if the item is to be linked permanently, else `None`.
+    # Both are looked up by the root of the repository.
+    weburls: Dict[object, WebURL] = {}
+    revisions: Dict[object, str] = {}
+    for item in items:
+        path, lines = _split_item(item)
+        directory = os.path.abspath(str(path))
+        if not os.path.isdir(directory):
+            directory = os.path.dirname(directory)
+        location = default_finder.find(directory)
+        key = directory if location is None else location.root
+        weburl = weburls.get(key)
+        if weburl is None:
+            weburl = weburls[key] = analyze(path, **kwargs)
+        resolve = lines is not None if permalink is None else permalink
+        resolved = None
+        if resolve:
+            resolved = revisions.get(key)
+            if resolved is None:
+                resolved = revisions[key] = weburl.repo.resolve_revision(
+                    revision or weburl.local_branch.name
+                )
+        yield url(weburl, path, lines, resolve, resolved)
+
+
+@_traced
+def files(
+    items: Iterable[FileItem],
+    revision: Optional[str] = None,
+    permalink: Optional[bool] = None,
+    short: bool = False,
+    check_published: bool = False,
+    **kwargs,
+) -> Iterator[str]:
+    """
+    Get URLs to many files at once.
+
+    Each repository is analyzed and each revision is resolved only
+    once.  Files may belong to different repositories.  URLs are
+    generated lazily, in the order of `items`.
+
+    ..
+       >>> getfixture("patch_analyze")
+
+    >>> import vcslinks
+    >>> urls = vcslinks.files(["README.md", ("setup.py", (1, 2))])
+    >>> next(urls)
+    'https://github.com/USER/PROJECT/blob/master/README.md'
+    >>> next(urls)
+    'https://github.com/USER/PROJECT/blob/55150afe539493d650889224db136bc8d9b7ecb8/setup.py#L1-L2'
+
+    Parameters
+    ----------
+    items
+        Paths or pairs of a path and lines specifier.  See `file` for
+        how lines are specified.
+    revision
+        Git commit-ish.
+    permalink
+        See `file`.
+    short
+    check_published
+        See `file`.
+    {DEFAULT_DOCS}
+    """
+    return _batch(
+        items,
+        revision,
+        permalink,
+        lambda weburl, path, lines, resolve, resolved: weburl._file_url(
+            "file",
+            path,
+            lines,
+            revision,
+            resolve,
+            check_published=check_published,
+            short=short,
+            resolved=resolved,
+        ),
+        kwargs,
+    )
+
+
+@_traced
+def blames(
+    items: Iterable[FileItem],
+    revision: Optional[str] = None,
+    permalink: Optional[bool] = None,
+    short: bool = False,
+    check_published: bool = False,
+    **kwargs,
+) -> Iterator[str]:
+    """
+    Get URLs to blame/annotate pages of many files at once.
+
+    See `files` for how the arguments are used.
+
+    ..
+       >>> getfixture("patch_analyze")
+
+    >>> import vcslinks
+    >>> list(vcslinks.blames(["README.md", "path/to/gitlab/clone/README.md"]))
+    ['https://github.com/USER/PROJECT/blame/master/README.md', 'https://gitlab.com/USER/PROJECT/blame/master/README.md']
+    """
+    return _batch(
+        items,
+        revision,
+        permalink,
+        lambda weburl, path, lines, resolve, resolved: weburl._file_url(
+            "blame",
+            path,
+            lines,
+            revision,
+            resolve,
+            check_published=check_published,
+            short=short,
+            resolved=resolved,
+        ),
+        kwargs,
+    )
+
+
+@_traced
+def trees(
+    directories: Iterable[Pathish],
+    revision: Optional[str] = None,
+    permalink: bool = False,
+    short: bool = False,
+    check_published: bool = False,
+    **kwargs,
+) -> Iterator[str]:
+    """
+    Get URLs to tree pages of many directories at once.
+
+    See `files` for how the arguments are used.
+
+    ..
+       >>> getfixture("patch_analyze")
+
+    >>> import vcslinks
+    >>> list(vcslinks.trees(["path/to/gitlab/clone/SUBDIRECTORY"], permalink=True))
+    ['https://gitlab.com/USER/PROJECT/tree/55150afe539493d650889224db136bc8d9b7ecb8/SUBDIRECTORY']
+    """
+    return _batch(
+        ((d, None) for d in directories),
+        revision,
+        permalink,
+        lambda weburl, path, _, resolve, resolved: weburl.tree(
+            path,
+            revision=resolved or revision,
+            # The resolved commit is only abbreviated or checked:
+            permalink=bool(resolve and (short or check_published)),
+            check_published=check_published,
+            short=short,
+        ),
+        kwargs,
     )
+
+
+# `import vcslinks` does not import this module (see
+# `vcslinks.__getattr__`), so the docstrings are filled in only when the
+# API is first used.
+for f in [analyze, root, pull_request, commit, commits, log, tree, diff, files]:
+    if f.__doc__:  # `None` under ``python -OO``
+        f.__doc__ = f.__doc__.format(
+            PATH_DOC=PATH_DOC, PERMALINK_DOC=PERMALINK_DOC, DEFAULT_DOCS=DEFAULT_DOCS
+        )
 del f
@@ -1,6 +1,12 @@
+import subprocess
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Union
+from typing import TYPE_CHECKING, Iterator, List, Optional, Sequence, Tuple, Union
+
+if TYPE_CHECKING:
+    from .gitblame import BlameRange
+    from .hostrules import HostRules
+    from .weburl import LinesSpecifier, WebURL
 
 Pathish = Union[str, Path]
 
@@ -9,6 +15,52 @@ class ApplicationError(Exception):
     returncode: int = 1
 
 
+class InvalidRevisionError(ApplicationError):
+    def __init__(self, revision: str):
+        self.revision = revision
+
+    def __str__(self) -> str:
+        return f"Invalid revision: {self.revision}"
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and self.revision == other.revision
+
+    def __hash__(self) -> int:
+        return hash((type(self), self.revision))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.revision!r})"
+
+
+class AmbiguousRevisionError(InvalidRevisionError):
+    def __init__(self, revision: str, candidates: Sequence[str] = ()):
+        super().__init__(revision)
+        self.candidates = list(candidates)
+
+    def __str__(self) -> str:
+        message = f"Short object ID {self.revision} is ambiguous"
+        if self.candidates:
+            message += " (candidates: {})".format(", ".join(self.candidates))
+        return message + "."
+
+
+class UnpublishedCommitError(ApplicationError):
+    def __init__(self, commit: str):
+        self.commit = commit
+
+    def __str__(self) -> str:
+        return f"Commit {self.commit} is not pushed to the remote repository."
+
+
+class NoMergeBaseError(ApplicationError):
+    def __init__(self, revision1: str, revision2: str):
+        self.revision1 = revision1
+        self.revision2 = revision2
+
+    def __str__(self) -> str:
+        return f"No common ancestor of {self.revision1} and {self.revision2}."
+
+
 class BaseRepoAnalyzer(ABC):
     @abstractmethod
     def current_branch(self):
@@ -33,3 +85,92 @@ class BaseRepoAnalyzer(ABC):
     @abstractmethod
     def relpath(self, path: Pathish) -> Path:
         ...
+
+    @property
+    def host_rules(self) -> "HostRules":
+        """
+        Rules used for finding the hosting service of remote URLs.
+        """
+        from .hostrules import default_table
+
+        return default_table.base()
+
+    def find_submodule(
+        self, path: Pathish, revision: Optional[str]
+    ) -> Optional[Tuple["WebURL", str]]:
+        """
+        If `path` is inside a submodule, return a `WebURL` for the
+        submodule and the submodule commit recorded at `revision`
+        (default to ``HEAD``).
+        """
+        return None
+
+    def map_lines(
+        self, path: Pathish, lines: "LinesSpecifier", revision: str
+    ) -> "LinesSpecifier":
+        """
+        Map `lines` of the file at `path` in the working tree to the
+        corresponding lines in the commit `revision`.
+        """
+        return lines
+
+    def blame_ranges(
+        self, path: Pathish, lines: "LinesSpecifier", revision: Optional[str]
+    ) -> Iterator["BlameRange"]:
+        """
+        Stream the commits last modifying `lines` of the file at `path`
+        in `revision` (default to the working tree).
+        """
+        raise ApplicationError(f"{type(self).__name__} does not support blame")
+
+    def tracking_revision(self, branch: str, name: str) -> str:
+        """
+        The remote-tracking branch `name` of the remote of the local
+        `branch`, falling back to `name` if it is not known.
+        """
+        return name
+
+    def merge_base(self, commit1: str, commit2: str) -> Optional[str]:
+        """
+        Return a best common ancestor of the commits or `None`.
+        """
+        raise ApplicationError(
+            f"{type(self).__name__} does not support finding merge bases"
+        )
+
+    def is_ancestor(self, ancestor: str, commit: str) -> bool:
+        """
+        Check if `ancestor` is reachable from `commit` (or is `commit`).
+        """
+        return self.merge_base(ancestor, commit) == ancestor
+
+    def abbreviate(self, oid: str) -> str:
+        """
+        Shorten the object ID `oid` to an unambiguous prefix, as
+        ``git rev-parse --short`` does.  Analyzers that cannot check
+        for ambiguity use the default length of ``core.abbrev``.
+        """
+        return oid[:7]
+
+    def is_published(self, commit: str, branch: str) -> bool:
+        """
+        Check if `commit` is reachable from a remote-tracking branch of
+        the remote of the local `branch`.  Analyzers that cannot tell
+        assume it is.
+        """
+        return True
+
+    def resolve_revisions(
+        self, revisions: Sequence[str]
+    ) -> List[Union[str, InvalidRevisionError]]:
+        """
+        Resolve many revisions.  Invalid revisions are reported as
+        `InvalidRevisionError` in place of the object ID.
+        """
+        results: List[Union[str, InvalidRevisionError]] = []
+        for revision in revisions:
+            try:
+                results.append(self.resolve_revision(revision))
+            except (subprocess.CalledProcessError, LookupError):
+                results.append(InvalidRevisionError(revision))
+        return results
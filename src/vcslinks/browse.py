@@ -2,29 +2,35 @@
 Open relevant pages in GitHub/GitLab/Bitbucket.
 """
 
+# Only cheap modules are imported here, as the daemon client
+# (`vcslinks.daemon.try_daemon`) runs before anything else.  The
+# analyzer is imported when a command has to be run in-process.
 import argparse
-import shlex
-import subprocess
 import sys
-import webbrowser
-from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, List
 
 from . import __version__
-from .api import analyze
-from .base import ApplicationError
-from .weburl import WebURL, parselines
+
+if TYPE_CHECKING:
+    from .weburl import WebURL
 
 
-@dataclass
 class Application:
-    dry_run: bool
-    browser: List[str]
+    def __init__(self, dry_run: bool, browser: List[str]):
+        self.dry_run = dry_run
+        self.browser = browser
 
     @classmethod
     def run(cls, dry_run, browser, func, **kwargs):
-        browser_cmd = shlex.split(browser) if browser else []
+        from .api import analyze
+
+        if browser:
+            import shlex
+
+            browser_cmd = shlex.split(browser)
+        else:
+            browser_cmd = []
         weburl = analyze()
         return func(cls(dry_run=dry_run, browser=browser_cmd), weburl=weburl, **kwargs)
 
@@ -32,33 +38,40 @@ class Application:
         if self.dry_run:
             print("Open:", url)
         elif self.browser:
+            import subprocess
+
             subprocess.check_call(self.browser + [url])
         else:
+            import webbrowser
+
             webbrowser.open(url)
 
 
-def cli_auto(app: Application, weburl: WebURL):
-    """
-    Open repository root or a PR submission page (if appropriate).
-    """
+def auto_url(weburl: "WebURL"):
     if weburl.local_branch.need_pull_request():
-        url = weburl.pull_request()
+        return weburl.pull_request()
     elif weburl.local_branch.remote_branch() == "master":
-        url = weburl.rooturl
+        return weburl.rooturl
     else:
-        url = weburl.tree()
-    app.open_url(url)
+        return weburl.tree()
 
 
-def cli_commit(app: Application, weburl: WebURL, revision):
+def cli_auto(app: Application, weburl: "WebURL"):
+    """
+    Open repository root or a PR submission page (if appropriate).
+    """
+    app.open_url(auto_url(weburl))
+
+
+def cli_commit(app: Application, weburl: "WebURL", revision, short):
     """
     Open commit page for a <revision>.
     """
-    url = weburl.commit(revision)
+    url = weburl.commit(revision, short=short)
     app.open_url(url)
 
 
-def cli_log(app: Application, weburl: WebURL, revision):
+def cli_log(app: Application, weburl: "WebURL", revision):
     """
     Open log page for a <revision>.
     """
@@ -66,34 +79,72 @@ def cli_log(app: Application, weburl: WebURL, revision):
     app.open_url(url)
 
 
-def cli_file(app: Application, weburl: WebURL, permalink, lines: str, **kwargs):
+def cli_file(app: Application, weburl: "WebURL", permalink, lines: str, **kwargs):
     """
     Open file page.
     """
+    from .weburl import parselines
+
     _permalink = {"auto": None, "yes": True, "no": False}[permalink]
     _lines = parselines(lines)
     url = weburl.file(permalink=_permalink, lines=_lines, **kwargs)
     app.open_url(url)
 
 
-def cli_diff(app: Application, weburl: WebURL, revision1, revision2):
+def cli_diff(app: Application, weburl: "WebURL", revision1, revision2, merge_base):
     """
     Open diff page.
     """
-    url = weburl.diff(revision1, revision2)
+    url = weburl.diff(revision1, revision2, merge_base=merge_base)
     app.open_url(url)
 
 
-def cli_blame(app: Application, weburl: WebURL, permalink, lines: str, **kwargs):
+def cli_blame(app: Application, weburl: "WebURL", permalink, lines: str, **kwargs):
     """
     Open blame/annotate page.
     """
+    from .weburl import parselines
+
     _permalink = {"auto": None, "yes": True, "no": False}[permalink]
     _lines = parselines(lines)
     url = weburl.blame(permalink=_permalink, lines=_lines, **kwargs)
     app.open_url(url)
 
 
+def cli_serve_stdio():
+    """
+    Answer newline-delimited JSON requests from stdin.
+
+    Each request is an object like ``{"command": "file", "file":
+    "README.md", "lines": "1-2"}`` with keys ``command`` (``auto``,
+    ``root``, ``pull_request``, ``commit``, ``log``, ``file``,
+    ``blame``, ``tree`` or ``diff``), ``file``, ``directory``,
+    ``lines``, ``revision``, ``revision1``, ``revision2``,
+    ``permalink``, ``short``, ``check_published``, ``merge_base``,
+    ``branch``, ``path`` and ``cwd``.  Each response is an object with
+    ``url`` or ``error``.
+    The repository analysis is kept across requests.
+    """
+    from .server import serve_stdio
+
+    serve_stdio()
+
+
+def cli_daemon(socket, idle_timeout):
+    """
+    Run a daemon answering `vcsbrowse` invocations.
+
+    The daemon listens on a per-user Unix domain socket (``--socket``)
+    and keeps repository analyses warm.  While it is running,
+    `vcsbrowse` forwards commands to it and falls back to running them
+    by itself if the daemon is not reachable.  The daemon exits after
+    ``--idle-timeout`` seconds without requests.
+    """
+    from .daemon import Daemon
+
+    Daemon(socket, idle_timeout).serve()
+
+
 class CustomFormatter(
     argparse.RawDescriptionHelpFormatter, argparse.ArgumentDefaultsHelpFormatter
 ):
@@ -126,6 +177,16 @@ def make_parser(doc=__doc__):
         p.set_defaults(func=func)
         return p
 
+    def add_short_argument(p):
+        p.add_argument(
+            "--short",
+            action="store_true",
+            help="""
+            Use the shortest unambiguous abbreviation of the resolved
+            commit (but not shorter than ``core.abbrev``).
+            """,
+        )
+
     def add_file_arguments(p):
         p.add_argument(
             "--permalink",
@@ -136,6 +197,7 @@ def make_parser(doc=__doc__):
             `auto` (default), resolve <revision> if <lines> are specified.
             """,
         )
+        add_short_argument(p)
         p.add_argument(
             "file",
             metavar="<file>",
@@ -165,6 +227,7 @@ def make_parser(doc=__doc__):
 
     p = subp("commit", cli_commit)
     p.add_argument("revision", metavar="<revision>", nargs="?", default="HEAD")
+    add_short_argument(p)
 
     p = subp("log", cli_log)
     p.add_argument("revision", metavar="<revision>", nargs="?")
@@ -175,10 +238,40 @@ def make_parser(doc=__doc__):
     p = subp("diff", cli_diff)
     p.add_argument("revision1", metavar="<revision1>", nargs="?")
     p.add_argument("revision2", metavar="<revision2>", nargs="?")
+    p.add_argument(
+        "--merge-base",
+        action="store_true",
+        help="""
+        Compare the merge base of <revision1> and <revision2> with
+        <revision2> (with <revision1> only: the merge base of the
+        remote master and <revision1> with <revision1>), pinned to
+        commits.
+        """,
+    )
 
     p = subp("blame", cli_blame)
     add_file_arguments(p)
 
+    subp("serve-stdio", cli_serve_stdio)
+
+    p = subp("daemon", cli_daemon)
+    p.add_argument(
+        "--socket",
+        help="""
+        Path to the Unix domain socket.  Default to
+        ``$XDG_RUNTIME_DIR/vcslinks/daemon.sock`` or
+        ``/tmp/vcslinks-$UID/daemon.sock``.
+        """,
+    )
+    p.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=600.0,
+        help="""
+        Exit after this many seconds without requests.
+        """,
+    )
+
     parser.set_defaults(func=cli_auto)
     return parser
 
@@ -193,8 +286,22 @@ def print_outputs(proc):
 
 
 def main(args=None):
+    if args is None:
+        from .daemon import try_daemon
+
+        returncode = try_daemon(sys.argv[1:])
+        if returncode is not None:
+            sys.exit(returncode)
     parser = make_parser()
     ns = parser.parse_args(args)
+    if ns.func is cli_serve_stdio:
+        return cli_serve_stdio()
+    if ns.func is cli_daemon:
+        return cli_daemon(ns.socket, ns.idle_timeout)
+    import subprocess
+
+    from .base import ApplicationError
+
     try:
         Application.run(**vars(ns))
     except ApplicationError as err:
@@ -0,0 +1,141 @@
+"""
+Process-wide cache of analyzed repositories used by `vcslinks.analyze`.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple
+
+from .base import Pathish
+from .discovery import default_finder
+from .git import GitRepoAnalyzer
+from .gitconfig import stat_token
+from .hostrules import default_table
+from .weburl import WebURL
+
+DEFAULT_MAXSIZE = 32
+
+
+def repo_signature(repo: GitRepoAnalyzer) -> Tuple:
+    """
+    Cheap fingerprint of the repository metadata a `WebURL` depends on.
+    """
+    config = repo.config
+    return (
+        stat_token(repo.git_dir / "HEAD"),
+        stat_token(repo.common_dir / "config"),
+        stat_token(repo.common_dir / "packed-refs"),
+        None if config is None else config.current_generation(),
+        default_table.current_token(),
+    )
+
+
+class CacheEntry:
+    __slots__ = ("weburl", "signature")
+
+    def __init__(self, weburl: WebURL, signature: Tuple):
+        self.weburl = weburl
+        self.signature = signature
+
+    def is_valid(self) -> bool:
+        repo = self.weburl.repo
+        assert isinstance(repo, GitRepoAnalyzer)
+        return repo_signature(repo) == self.signature
+
+
+class AnalyzerCache:
+    """
+    Bounded LRU cache of `WebURL` objects keyed by repository root and
+    requested branch.
+
+    An entry is discarded when ``HEAD``, ``config`` or ``packed-refs``
+    of the repository (or any configuration file it reads, including
+    the host rules of `vcslinks.hostrules`) changes.
+    A `maxsize` of 0 disables caching.
+
+    >>> cache = AnalyzerCache(maxsize=8)
+    >>> cache.resize(16)
+    >>> cache.maxsize
+    16
+    >>> cache.clear()
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def resize(self, maxsize: int) -> None:
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(
+        self, path: Pathish, branch: Optional[str], build: Callable[[], WebURL]
+    ) -> WebURL:
+        """
+        Return a cached `WebURL` for `path` or create one by `build`.
+        """
+        if self.maxsize <= 0:
+            return build()
+        weburl = self.lookup(path, branch)
+        if weburl is not None:
+            return weburl
+        return self.store(build(), branch)
+
+    def lookup(self, path: Pathish, branch: Optional[str]) -> Optional[WebURL]:
+        """
+        Return a valid cached `WebURL` for `path` or `None`.
+        """
+        if self.maxsize <= 0:
+            return None
+        directory = os.path.abspath(str(path))
+        if not os.path.isdir(directory):
+            directory = os.path.dirname(directory)
+        location = default_finder.find(directory)
+        if location is None:
+            return None
+        key = (location.root, branch)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None and entry.is_valid():
+            return entry.weburl
+        return None
+
+    def store(self, weburl: WebURL, branch: Optional[str]) -> WebURL:
+        """
+        Cache `weburl` created for `branch`.  Return the cached
+        instance, which may be an older equivalent one.
+        """
+        if self.maxsize <= 0:
+            return weburl
+        repo = weburl.repo
+        if not isinstance(repo, GitRepoAnalyzer):
+            return weburl
+        entry = CacheEntry(weburl, repo_signature(repo))
+        key = (repo.root, branch)
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None and old.signature == entry.signature:
+                entry = old
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._evict()
+        return entry.weburl
+
+
+default_cache = AnalyzerCache()
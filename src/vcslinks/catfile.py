@@ -0,0 +1,200 @@
+"""
+Long-lived ``git cat-file --batch-check`` and ``--batch`` coprocesses.
+"""
+
+import subprocess
+import threading
+import time
+from typing import IO, TYPE_CHECKING, List, NamedTuple, Optional, Sequence
+
+from . import tracing
+from .base import Pathish
+
+if TYPE_CHECKING:
+    from typing import Final
+
+# Number of requests written before reading back the responses.  Git
+# blocks once the stdout pipe is full, so writing unbounded batches
+# could deadlock.
+CHUNK_SIZE: "Final[int]" = 256
+
+OBJECT_TYPES: "Final[Sequence[bytes]]" = (b"commit", b"tree", b"blob", b"tag")
+
+
+class _Coprocess(NamedTuple):
+    proc: subprocess.Popen
+    stdin: IO[bytes]
+    stdout: IO[bytes]
+
+
+class CatFileBatch:
+    """
+    Resolve revisions through a single ``git cat-file --batch-check``
+    and read objects through a single ``git cat-file --batch``.
+
+    The processes are started lazily, restarted if they die, and shared
+    by threads (requests are serialized over their pipes).  Use it as a
+    context manager or call `close` to terminate the processes.
+    """
+
+    def __init__(self, cwd: Pathish):
+        self.cwd = str(cwd)
+        self._proc: Optional[_Coprocess] = None
+        # The ``--batch`` process, started by the first `read`:
+        self._reader: Optional[_Coprocess] = None
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "CatFileBatch":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def _start(self, option: str) -> _Coprocess:
+        tracer = tracing.active
+        start = time.perf_counter()
+        argv = ["git", "cat-file", option]
+        proc = subprocess.Popen(
+            argv,
+            cwd=self.cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        assert proc.stdin is not None and proc.stdout is not None
+        if tracer is not None:
+            # Long-lived; only the start-up is recorded:
+            tracer.record_process(argv, self.cwd, start, None)
+        return _Coprocess(proc, proc.stdin, proc.stdout)
+
+    def _ensure(self) -> _Coprocess:
+        proc = self._proc
+        if proc is None or proc.proc.poll() is not None:
+            proc = self._proc = self._start("--batch-check")
+        return proc
+
+    def _ensure_reader(self) -> _Coprocess:
+        proc = self._reader
+        if proc is None or proc.proc.poll() is not None:
+            proc = self._reader = self._start("--batch")
+        return proc
+
+    def _discard(self) -> None:
+        proc = self._proc
+        self._proc = None
+        _kill(proc)
+
+    def _discard_reader(self) -> None:
+        proc = self._reader
+        self._reader = None
+        _kill(proc)
+
+    def close(self) -> None:
+        with self._lock:
+            for proc in (self._proc, self._reader):
+                if proc is None:
+                    continue
+                try:
+                    proc.stdin.close()
+                    proc.proc.wait(timeout=5)
+                except (OSError, subprocess.TimeoutExpired):
+                    pass
+            self._discard()
+            self._discard_reader()
+
+    def resolve_many(self, revisions: Sequence[str]) -> List[Optional[str]]:
+        """
+        Resolve `revisions` to object IDs.
+
+        Revisions Git cannot resolve (missing or ambiguous) as well as
+        the ones that cannot be sent over the pipe are reported as
+        `None`.
+        """
+        results: List[Optional[str]] = [None] * len(revisions)
+        queries = [
+            (i, rev.encode("utf-8", "surrogateescape"))
+            for i, rev in enumerate(revisions)
+            if rev and "\n" not in rev
+        ]
+        with self._lock:
+            for start in range(0, len(queries), CHUNK_SIZE):
+                chunk = queries[start : start + CHUNK_SIZE]
+                for i, oid in zip((i for i, _ in chunk), self._query(chunk)):
+                    results[i] = oid
+        return results
+
+    def resolve(self, revision: str) -> Optional[str]:
+        return self.resolve_many([revision])[0]
+
+    def _query(self, chunk) -> List[Optional[str]]:
+        for attempt in (1, 2):
+            proc = self._ensure()
+            try:
+                proc.stdin.write(b"".join(rev + b"\n" for _, rev in chunk))
+                proc.stdin.flush()
+                return [parse_batch_check(proc.stdout.readline()) for _ in chunk]
+            except (OSError, EOFError):
+                self._discard()
+                if attempt == 2:
+                    raise
+        raise AssertionError("unreachable")
+
+    def read(self, revision: str) -> Optional[bytes]:
+        """
+        Contents of the object `revision` names, or `None` if there is
+        no such (unambiguous) object.
+        """
+        if not revision or "\n" in revision:
+            return None
+        query = revision.encode("utf-8", "surrogateescape") + b"\n"
+        with self._lock:
+            for attempt in (1, 2):
+                proc = self._ensure_reader()
+                try:
+                    proc.stdin.write(query)
+                    proc.stdin.flush()
+                    header = proc.stdout.readline()
+                    if parse_batch_check(header) is None:
+                        return None
+                    size = int(header.split()[2])
+                    # The contents are followed by a newline:
+                    data = proc.stdout.read(size + 1)
+                    if len(data) != size + 1:
+                        raise EOFError("git cat-file terminated")
+                    return data[:size]
+                except (OSError, EOFError):
+                    self._discard_reader()
+                    if attempt == 2:
+                        raise
+        raise AssertionError("unreachable")
+
+
+def _kill(coprocess: Optional[_Coprocess]) -> None:
+    if coprocess is None:
+        return
+    for stream in (coprocess.stdin, coprocess.stdout):
+        try:
+            stream.close()
+        except OSError:
+            pass
+    proc = coprocess.proc
+    if proc.poll() is None:
+        proc.kill()
+    proc.wait()
+
+
+def parse_batch_check(line: bytes) -> Optional[str]:
+    """
+    Parse a line of ``git cat-file --batch-check`` output.
+
+    >>> parse_batch_check(b"55150afe539493d650889224db136bc8d9b7ecb8 commit 245\\n")
+    '55150afe539493d650889224db136bc8d9b7ecb8'
+    >>> parse_batch_check(b"no-such-rev missing\\n") is None
+    True
+    """
+    if not line:
+        raise EOFError("git cat-file terminated")
+    parts = line.rstrip(b"\n").split(b" ")
+    if len(parts) == 3 and parts[1] in OBJECT_TYPES and parts[2].isdigit():
+        return parts[0].decode("ascii")
+    return None
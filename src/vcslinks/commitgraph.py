@@ -0,0 +1,397 @@
+"""
+Reader for Git's commit-graph files.
+
+Both a single ``objects/info/commit-graph`` file and split chains
+(``objects/info/commit-graphs/commit-graph-chain``) are read.  Only
+what ancestry queries need is read: the sorted object IDs, the parents,
+the commit dates and the generation numbers (topological levels) of the
+commits.  The files are memory-mapped; nothing is parsed upfront.
+"""
+
+import heapq
+import mmap
+import struct
+from bisect import bisect_right
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .base import Pathish
+from .gitconfig import stat_token
+
+if TYPE_CHECKING:
+    from typing import Final
+
+SIGNATURE: "Final[bytes]" = b"CGPH"
+# Parent position meaning "no parent":
+PARENT_NONE: "Final[int]" = 0x70000000
+# Parent position flag pointing into the EDGE chunk (octopus merges):
+PARENT_EXTRA: "Final[int]" = 0x80000000
+# Flag of the last parent in the EDGE chunk:
+EDGE_LAST: "Final[int]" = 0x80000000
+GENERATION_ZERO: "Final[int]" = 0
+
+_U32 = struct.Struct(">I")
+_U64 = struct.Struct(">Q")
+
+# Flags of `CommitGraph.merge_bases` (see `paint_down_to_common` in
+# Git's commit-reach.c):
+_PARENT1 = 1
+_PARENT2 = 2
+_STALE = 4
+
+
+class UnsupportedGraphError(Exception):
+    """
+    The commit-graph cannot answer the query without Git.
+    """
+
+
+class _Layer:
+    # A single commit-graph file.  Positions are local to the file.
+
+    def __init__(self, path: Path, hexsz: int):
+        self.path = path
+        with open(str(path), "rb") as file:
+            self.mmap = mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse_header(hexsz)
+        except Exception:
+            mm.close()
+            raise
+
+    def _parse_header(self, hexsz: int) -> None:
+        mm = self.mmap
+        if len(mm) < 8 or mm[:4] != SIGNATURE or mm[4] != 1:
+            raise UnsupportedGraphError(f"{self.path}: not a commit-graph v1 file")
+        hash_version, num_chunks, self.num_bases = mm[5], mm[6], mm[7]
+        self.hashsz = {1: 20, 2: 32}.get(hash_version, 0)
+        if self.hashsz * 2 != hexsz:
+            raise UnsupportedGraphError(f"{self.path}: unexpected hash version")
+        if len(mm) < 8 + 12 * num_chunks:
+            raise UnsupportedGraphError(f"{self.path}: truncated file")
+        chunks: Dict[bytes, int] = {}
+        for i in range(num_chunks):
+            start = 8 + 12 * i
+            chunk_id = mm[start : start + 4]
+            chunks[chunk_id] = _U64.unpack_from(mm, start + 4)[0]
+        try:
+            self.fanout = chunks[b"OIDF"]
+            self.oids = chunks[b"OIDL"]
+            self.data = chunks[b"CDAT"]
+        except KeyError:
+            raise UnsupportedGraphError(f"{self.path}: missing chunk") from None
+        self.edges = chunks.get(b"EDGE")
+        self.bases = chunks.get(b"BASE")
+        if self.num_bases and self.bases is None:
+            raise UnsupportedGraphError(f"{self.path}: missing chunk")
+        self.num_commits = self.u32(self.fanout + 255 * 4)
+
+    def u32(self, offset: int) -> int:
+        return _U32.unpack_from(self.mmap, offset)[0]
+
+    def base_hashes(self) -> List[str]:
+        if self.bases is None:
+            return []
+        return [
+            self.mmap[start : start + self.hashsz].hex()
+            for start in range(
+                self.bases, self.bases + self.num_bases * self.hashsz, self.hashsz
+            )
+        ]
+
+    def lookup(self, key: bytes) -> Optional[int]:
+        first = key[0]
+        lo = self.u32(self.fanout + (first - 1) * 4) if first else 0
+        hi = self.u32(self.fanout + first * 4)
+        mm = self.mmap
+        hashsz = self.hashsz
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self.oids + mid * hashsz
+            current = mm[start : start + hashsz]
+            if current == key:
+                return mid
+            elif current < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def record(self, position: int) -> int:
+        return self.data + position * (self.hashsz + 16)
+
+
+class CommitGraph:
+    """
+    Memory-mapped commit-graph file or chain of files.
+
+    Commits are addressed by their position: the position in the graph
+    order of their file plus the number of commits in the files below
+    it in the chain.  Raises `UnsupportedGraphError` for files it
+    cannot read.
+    """
+
+    def __init__(self, path: Pathish, hexsz: int = 40):
+        layer = _Layer(Path(path), hexsz)
+        if layer.num_bases:
+            layer.mmap.close()
+            raise UnsupportedGraphError(f"{path}: a layer of a split commit-graph")
+        self._init_layers([layer])
+
+    @classmethod
+    def from_chain(cls, chain: Pathish, hexsz: int = 40) -> "CommitGraph":
+        """
+        Open the layers listed in a ``commit-graph-chain`` file.
+        """
+        chain = Path(chain)
+        hashes = chain.read_text().split()
+        layers: List[_Layer] = []
+        try:
+            for i, hash_ in enumerate(hashes):
+                layer = _Layer(chain.parent / f"graph-{hash_}.graph", hexsz)
+                layers.append(layer)
+                if layer.num_bases != i or layer.base_hashes() != hashes[:i]:
+                    raise UnsupportedGraphError(f"{layer.path}: inconsistent chain")
+        except Exception:
+            for layer in layers:
+                layer.mmap.close()
+            raise
+        if not layers:
+            raise UnsupportedGraphError(f"{chain}: empty chain")
+        graph = cls.__new__(cls)
+        graph._init_layers(layers)
+        return graph
+
+    def _init_layers(self, layers: List[_Layer]) -> None:
+        self.path = layers[-1].path
+        self._layers = layers
+        self._offsets: List[int] = []
+        total = 0
+        for layer in layers:
+            self._offsets.append(total)
+            total += layer.num_commits
+        self.num_commits = total
+        # Generation numbers are used only if all the layers have them:
+        self._generations = True
+        for offset, layer in zip(self._offsets, layers):
+            if layer.num_commits and self._level(offset) == GENERATION_ZERO:
+                self._generations = False
+
+    def close(self) -> None:
+        for layer in self._layers:
+            layer.mmap.close()
+
+    def __len__(self) -> int:
+        return self.num_commits
+
+    def _locate(self, position: int) -> Tuple[_Layer, int]:
+        i = bisect_right(self._offsets, position) - 1
+        return self._layers[i], position - self._offsets[i]
+
+    def oid(self, position: int) -> str:
+        layer, local = self._locate(position)
+        start = layer.oids + local * layer.hashsz
+        return layer.mmap[start : start + layer.hashsz].hex()
+
+    def lookup(self, oid: str) -> Optional[int]:
+        """
+        Return the position of the commit `oid` or `None` if absent.
+        """
+        key = bytes.fromhex(oid)
+        for offset, layer in zip(self._offsets, self._layers):
+            position = layer.lookup(key)
+            if position is not None:
+                return offset + position
+        return None
+
+    def parents(self, position: int) -> List[int]:
+        layer, local = self._locate(position)
+        record = layer.record(local) + layer.hashsz
+        first, second = layer.u32(record), layer.u32(record + 4)
+        if first == PARENT_NONE:
+            return []
+        if second == PARENT_NONE:
+            return [first]
+        if not second & PARENT_EXTRA:
+            return [first, second]
+        if layer.edges is None:
+            raise UnsupportedGraphError(f"{layer.path}: missing EDGE chunk")
+        # Octopus merge: the other parents are listed in the EDGE chunk.
+        parents = [first]
+        offset = layer.edges + (second & ~PARENT_EXTRA) * 4
+        while True:
+            edge = layer.u32(offset)
+            parents.append(edge & ~EDGE_LAST)
+            if edge & EDGE_LAST:
+                return parents
+            offset += 4
+
+    def _level(self, position: int) -> int:
+        layer, local = self._locate(position)
+        return layer.u32(layer.record(local) + layer.hashsz + 8) >> 2
+
+    def generation(self, position: int) -> int:
+        """
+        Topological level of the commit (0 if not computed).
+        """
+        if not self._generations:
+            return GENERATION_ZERO
+        return self._level(position)
+
+    def commit_time(self, position: int) -> int:
+        """
+        Committer date of the commit in seconds since the epoch.
+        """
+        layer, local = self._locate(position)
+        record = layer.record(local) + layer.hashsz + 8
+        return ((layer.u32(record) & 0x3) << 32) | layer.u32(record + 4)
+
+    def _positions(self, oids: Iterable[str]) -> List[int]:
+        positions = []
+        for oid in oids:
+            position = self.lookup(oid)
+            if position is None:
+                raise LookupError(oid)
+            positions.append(position)
+        return positions
+
+    def can_reach(self, tips: Iterable[str], oid: str) -> bool:
+        """
+        Check if commit `oid` is reachable from any of the `tips`.
+
+        The walk never descends below the generation of `oid`.  Raises
+        `LookupError` if a tip is not in the graph.
+        """
+        positions = self._positions(tips)
+        target = self.lookup(oid)
+        if target is None:
+            # The graph is closed under reachability:
+            return False
+        return self._can_reach(positions, target)
+
+    def _can_reach(self, positions: Sequence[int], target: int) -> bool:
+        cutoff = self.generation(target)
+        stack = list(positions)
+        seen = set(stack)
+        while stack:
+            position = stack.pop()
+            if position == target:
+                return True
+            if cutoff != GENERATION_ZERO and self.generation(position) <= cutoff:
+                continue
+            for parent in self.parents(position):
+                if parent not in seen:
+                    seen.add(parent)
+                    stack.append(parent)
+        return False
+
+    def merge_bases(self, one: str, two: str) -> List[str]:
+        """
+        Best common ancestors of commits `one` and `two`, newest first,
+        like ``git merge-base --all``.  Raises `LookupError` if a commit
+        is not in the graph.
+
+        Commits are visited in decreasing generation order, so the walk
+        stops as soon as every commit left to visit is an ancestor of a
+        common ancestor already found.
+        """
+        a, b = self._positions([one, two])
+        if a == b:
+            return [one]
+        candidates = self._paint_down_to_common(a, b)
+        # Drop the candidates reachable from another candidate:
+        bases = [
+            c
+            for c in candidates
+            if not self._can_reach([o for o in candidates if o != c], c)
+        ]
+        bases.sort(key=lambda c: (-self.commit_time(c), c))
+        return [self.oid(c) for c in bases]
+
+    def _paint_down_to_common(self, a: int, b: int) -> List[int]:
+        flags = {a: _PARENT1, b: _PARENT2}
+        queue: List[Tuple[int, int, int]] = []
+        # Number of queue entries per commit and of the non-stale ones:
+        queued: Dict[int, int] = {}
+        nonstale = 0
+
+        def push(position: int) -> None:
+            nonlocal nonstale
+            key = (-self.generation(position), -self.commit_time(position), position)
+            heapq.heappush(queue, key)
+            queued[position] = queued.get(position, 0) + 1
+            if not flags[position] & _STALE:
+                nonstale += 1
+
+        def mark(position: int, new: int) -> None:
+            nonlocal nonstale
+            old = flags.get(position, 0)
+            if new & _STALE and not old & _STALE:
+                nonstale -= queued.get(position, 0)
+            flags[position] = old | new
+
+        push(a)
+        push(b)
+        result: List[int] = []
+        while nonstale:
+            position = heapq.heappop(queue)[2]
+            queued[position] -= 1
+            current = flags[position]
+            if not current & _STALE:
+                nonstale -= 1
+            current &= _PARENT1 | _PARENT2 | _STALE
+            if current == _PARENT1 | _PARENT2:
+                if position not in result:
+                    result.append(position)
+                # Ancestors of a common ancestor are not the best ones:
+                current |= _STALE
+            for parent in self.parents(position):
+                if flags.get(parent, 0) & current == current:
+                    continue
+                mark(parent, current)
+                push(parent)
+        return result
+
+
+def graph_path(common_dir: Pathish) -> Path:
+    return Path(common_dir) / "objects" / "info" / "commit-graph"
+
+
+def chain_path(common_dir: Pathish) -> Path:
+    info = Path(common_dir) / "objects" / "info"
+    return info / "commit-graphs" / "commit-graph-chain"
+
+
+class CommitGraphFile:
+    """
+    `CommitGraph` of a repository, reopened when the files change.
+
+    Like Git, a single commit-graph file is preferred over a chain.
+    """
+
+    def __init__(self, common_dir: Pathish, hexsz: int = 40):
+        self.path = graph_path(common_dir)
+        self.chain = chain_path(common_dir)
+        self.hexsz = hexsz
+        self._token: Optional[Tuple] = None
+        self._graph: Optional[CommitGraph] = None
+
+    def get(self) -> Optional[CommitGraph]:
+        """
+        Return the commit-graph or `None` if it is missing or unsupported.
+        """
+        # Layers are immutable (named by their hash), so the chain file
+        # changes whenever the set of layers does:
+        token = (stat_token(self.path), stat_token(self.chain))
+        if token != self._token:
+            # Not closed explicitly as other threads may still use it:
+            self._graph = None
+            self._token = token
+            try:
+                if token[0][1] is not None:
+                    self._graph = CommitGraph(self.path, self.hexsz)
+                elif token[1][1] is not None:
+                    self._graph = CommitGraph.from_chain(self.chain, self.hexsz)
+            except (OSError, ValueError, UnsupportedGraphError):
+                pass
+        return self._graph
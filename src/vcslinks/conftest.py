@@ -1,4 +1,5 @@
 import os
+import subprocess
 from contextlib import contextmanager
 from subprocess import run
 from typing import TYPE_CHECKING, Sequence
@@ -29,6 +30,49 @@ def chdir(path):
         os.chdir(orig_cwd)
 
 
+def git_at(path):
+    def git(*args):
+        return subprocess.run(
+            list(GIT_COMMAND_BASE) + ["-c", "protocol.file.allow=always"] + list(args),
+            cwd=str(path),
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        ).stdout.strip()
+
+    return git
+
+
+def init_repository(path, url="git@github.com:USER/PROJECT.git"):
+    """
+    Initialize a repository at `path` whose ``master`` tracks a remote
+    ``origin`` at `url`, and return its `git_at` helper.
+    """
+    git = git_at(path)
+    git("init", "--quiet")
+    git("remote", "add", "origin", url)
+    git("config", "branch.master.remote", "origin")
+    git("config", "branch.master.merge", "refs/heads/master")
+    return git
+
+
+def count_runs(monkeypatch):
+    """
+    Record the arguments of the following `subprocess.run` calls in the
+    returned list.  The processes still run.
+    """
+    calls = []
+    run = subprocess.run
+
+    def counting_run(args, **kwargs):
+        calls.append(args)
+        return run(args, **kwargs)
+
+    monkeypatch.setattr(subprocess, "run", counting_run)
+    return calls
+
+
 def dummy_file_content(fmt, nlines):
     return "\n".join(fmt.format(n=i + 1) for i in range(nlines))
 
@@ -82,6 +126,21 @@ def noremote_repository(prepare_noremote_repository):
         yield path
 
 
+@pytest.fixture
+def repository(tmp_path):
+    """
+    A fresh repository with one empty commit on ``master``, which tracks
+    ``origin`` on GitHub.  The analyzer cache is cleared around the test.
+    """
+    from .cache import default_cache
+
+    git = init_repository(tmp_path)
+    git("commit", "--quiet", "--allow-empty", "--message", "first")
+    default_cache.clear()
+    yield tmp_path
+    default_cache.clear()
+
+
 @pytest.fixture
 def patch_analyze():
     from . import api
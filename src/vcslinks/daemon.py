@@ -0,0 +1,342 @@
+"""
+Resident ``vcsbrowse`` daemon listening on a per-user Unix domain socket.
+
+The daemon keeps analyzed repositories warm (see `vcslinks.cache`) and
+answers ``vcsbrowse`` invocations forwarded by `try_daemon`.  Stale
+repository state is detected by the analyzer cache, which re-checks
+``.git`` metadata on every request.  The daemon exits after being idle
+for a while.
+
+This module is imported by the ``vcsbrowse`` client before anything
+else, so it must stay cheap to import.
+"""
+
+import os
+import stat
+import sys
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import socket
+
+DEFAULT_IDLE_TIMEOUT = 600.0
+CLIENT_TIMEOUT = 5.0
+MAX_MESSAGE_SIZE = 1 << 20
+
+# Environment variables changing what Git sees; the daemon does not
+# share the client's environment, so their presence disables it.
+GIT_ENV_VARS = (
+    "GIT_DIR",
+    "GIT_WORK_TREE",
+    "GIT_COMMON_DIR",
+    "GIT_OBJECT_DIRECTORY",
+    "GIT_ALTERNATE_OBJECT_DIRECTORIES",
+    "GIT_CEILING_DIRECTORIES",
+    "GIT_DISCOVERY_ACROSS_FILESYSTEM",
+    "GIT_NAMESPACE",
+    "GIT_CONFIG",
+    "GIT_CONFIG_GLOBAL",
+    "GIT_CONFIG_SYSTEM",
+    "GIT_CONFIG_NOSYSTEM",
+    "GIT_CONFIG_COUNT",
+    "GIT_CONFIG_PARAMETERS",
+)
+
+
+def socket_path() -> str:
+    """
+    Path to the per-user socket.  It can be overridden by the
+    ``VCSLINKS_SOCKET`` environment variable.
+    """
+    path = os.environ.get("VCSLINKS_SOCKET")
+    if path:
+        return path
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return os.path.join(runtime, "vcslinks", "daemon.sock")
+    import tempfile
+
+    return os.path.join(tempfile.gettempdir(), f"vcslinks-{os.getuid()}", "daemon.sock")
+
+
+def is_private(path: str, kind: int) -> bool:
+    """
+    Check that `path` is a file of type `kind` (e.g., `stat.S_IFSOCK`)
+    owned by the current user and accessible only by them (mode 0700).
+    """
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return (
+        stat.S_IFMT(st.st_mode) == kind
+        and st.st_uid == os.getuid()
+        and stat.S_IMODE(st.st_mode) == 0o700
+    )
+
+
+def is_private_socket(path: str) -> bool:
+    """
+    Check that the socket at `path` and its directory can only have
+    been created by the current user.  Otherwise another local user
+    could answer in place of the daemon.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    return is_private(directory, stat.S_IFDIR) and is_private(path, stat.S_IFSOCK)
+
+
+def _recv_line(sock: "socket.socket") -> bytes:
+    chunks = []
+    size = 0
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+        if chunk.endswith(b"\n"):
+            break
+        if size > MAX_MESSAGE_SIZE:
+            raise ValueError("message too large")
+    return b"".join(chunks)
+
+
+def client_options(argv: List[str]) -> Optional[Tuple[bool, Optional[str]]]:
+    """
+    Parse the ``--dry-run`` and ``--browser`` options of ``vcsbrowse``
+    preceding the subcommand.  Return `None` for anything else (e.g.,
+    ``--help`` or abbreviated options) to run the command in-process.
+
+    >>> client_options(["--dry-run", "--browser", "firefox -new-tab", "file"])
+    (True, 'firefox -new-tab')
+    >>> client_options(["--browser=w3m", "commit", "--short"])
+    (False, 'w3m')
+    >>> client_options(["--dry"]) is None
+    True
+    """
+    dry_run = False
+    browser = None
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg == "--dry-run":
+            dry_run = True
+        elif arg == "--browser" and i + 1 < len(argv):
+            i += 1
+            browser = argv[i]
+        elif arg.startswith("--browser="):
+            browser = arg[len("--browser=") :]
+        elif arg.startswith("-"):
+            return None
+        else:
+            break
+        i += 1
+    return dry_run, browser
+
+
+def try_daemon(argv: List[str], path: Optional[str] = None) -> Optional[int]:
+    """
+    Forward a ``vcsbrowse`` invocation to the daemon.
+
+    Return the exit code, or `None` if the command has to be run
+    in-process (no daemon, a socket that may not belong to the current
+    user, Git environment variables that the daemon would not see, or
+    arguments the daemon does not handle).  Only the URL is taken from
+    the daemon; how to open it is decided by the client's own `argv`.
+    """
+    if any(name in os.environ for name in GIT_ENV_VARS):
+        return None
+    options = client_options(argv)
+    if options is None:
+        return None
+    dry_run, browser = options
+    path = path or socket_path()
+    if not is_private_socket(path):
+        return None
+    import json
+    import socket
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CLIENT_TIMEOUT)
+            sock.connect(path)
+            request = {"argv": list(argv), "cwd": os.getcwd()}
+            sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            response = json.loads(_recv_line(sock).decode("utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(response, dict) or response.get("fallback"):
+        return None
+    if "error" in response:
+        print(response["error"], file=sys.stderr)
+        if response.get("stderr"):
+            print("STDERR:", file=sys.stderr)
+            print(response["stderr"], file=sys.stderr)
+        return 1
+    url = response.get("url")
+    if not isinstance(url, str):
+        return None
+    if dry_run:
+        print("Open:", url)
+    elif browser:
+        import shlex
+        import subprocess
+
+        subprocess.check_call(shlex.split(browser) + [url])
+    else:
+        import webbrowser
+
+        webbrowser.open(url)
+    return 0
+
+
+def argv_to_request(argv: List[str], cwd: str) -> Optional[Dict[str, Any]]:
+    """
+    Translate ``vcsbrowse`` arguments to a `vcslinks.server` request.
+    """
+    import io
+    from contextlib import redirect_stderr, redirect_stdout
+
+    from . import browse
+
+    parser = browse.make_parser()
+    output = io.StringIO()
+    try:
+        with redirect_stdout(output), redirect_stderr(output):
+            ns = parser.parse_args(argv)
+    except SystemExit:
+        # --help, --version or a usage error; let the client print it.
+        return None
+    commands = {
+        browse.cli_auto: "auto",
+        browse.cli_commit: "commit",
+        browse.cli_log: "log",
+        browse.cli_file: "file",
+        browse.cli_diff: "diff",
+        browse.cli_blame: "blame",
+    }
+    command = commands.get(ns.func)
+    if command is None:
+        return None
+    # Like in-process ``vcsbrowse``, analyze the current directory (not
+    # the repository of <file>):
+    request: Dict[str, Any] = {"command": command, "cwd": cwd, "path": "."}
+    for key in ("file", "lines", "revision", "revision1", "revision2"):
+        if getattr(ns, key, None) is not None:
+            request[key] = getattr(ns, key)
+    for key in ("short", "merge_base"):
+        if getattr(ns, key, False):
+            request[key] = True
+    if hasattr(ns, "permalink"):
+        request["permalink"] = {"auto": None, "yes": True, "no": False}[ns.permalink]
+    return request
+
+
+class Daemon:
+    """
+    Unix domain socket server answering forwarded ``vcsbrowse`` calls.
+
+    Requests are handled one at a time; each takes well below a
+    millisecond once the repository is analyzed.
+    """
+
+    def __init__(
+        self, path: Optional[str] = None, idle_timeout: float = DEFAULT_IDLE_TIMEOUT
+    ):
+        self.path = path or socket_path()
+        self.idle_timeout = idle_timeout
+        self.sock: "Optional[socket.socket]" = None
+
+    def bind(self) -> None:
+        import socket
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        if not is_private(directory, stat.S_IFDIR):
+            raise RuntimeError(
+                f"{directory} must be a directory owned by the current user"
+                " with mode 0700"
+            )
+        if os.path.lexists(self.path):
+            if not is_private(self.path, stat.S_IFSOCK):
+                raise RuntimeError(f"{self.path} is not a socket of the current user")
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except OSError:
+                os.unlink(self.path)  # stale socket
+            else:
+                raise RuntimeError(f"daemon already running at {self.path}")
+            finally:
+                probe.close()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o077)
+        try:
+            sock.bind(self.path)
+        finally:
+            os.umask(old_umask)
+        sock.listen(16)
+        self.sock = sock
+
+    def close(self) -> None:
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    def serve(self) -> None:
+        """
+        Serve until no request arrives for `idle_timeout` seconds.
+        """
+        import socket
+
+        if self.sock is None:
+            self.bind()
+        assert self.sock is not None
+        try:
+            while True:
+                self.sock.settimeout(self.idle_timeout)
+                try:
+                    conn, _ = self.sock.accept()
+                except socket.timeout:
+                    return
+                with conn:
+                    conn.settimeout(CLIENT_TIMEOUT)
+                    try:
+                        self.handle(conn)
+                    except OSError:
+                        pass
+        finally:
+            self.close()
+
+    def handle(self, conn: "socket.socket") -> None:
+        import json
+
+        try:
+            response = self.respond(_recv_line(conn))
+        except Exception:
+            # Neither a malformed message nor a bug may stop the
+            # daemon; the client runs the command by itself instead.
+            response = {"fallback": True}
+        conn.sendall(json.dumps(response).encode("utf-8") + b"\n")
+
+    def respond(self, data: bytes) -> Dict[str, Any]:
+        import json
+
+        from .server import handle_request
+
+        message = json.loads(data.decode("utf-8"))
+        if not (
+            isinstance(message, dict)
+            and isinstance(message.get("argv"), list)
+            and all(isinstance(arg, str) for arg in message["argv"])
+            and isinstance(message.get("cwd"), str)
+        ):
+            return {"fallback": True}
+        request = argv_to_request(message["argv"], message["cwd"])
+        if request is None:
+            return {"fallback": True}
+        return handle_request(request)
@@ -0,0 +1,293 @@
+"""
+Repository discovery without running ``git rev-parse``.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Tuple
+
+from .base import Pathish
+from .gitconfig import UnsupportedConfigError, parse_config, stat_token, to_bool
+
+if TYPE_CHECKING:
+    from typing import Final
+
+# Number of directories remembered by a `RepoFinder`:
+MEMO_SIZE: "Final[int]" = 4096
+
+ENV_VARS = (
+    "GIT_DIR",
+    "GIT_WORK_TREE",
+    "GIT_CEILING_DIRECTORIES",
+    "GIT_DISCOVERY_ACROSS_FILESYSTEM",
+    "GIT_COMMON_DIR",
+    "GIT_OBJECT_DIRECTORY",
+)
+
+
+class RepoLocation(NamedTuple):
+    # Top-level directory of the working tree:
+    root: Path
+    # Git directory of the working tree (`.git` or a worktree's):
+    git_dir: Path
+    # Git directory shared by all worktrees:
+    common_dir: Path
+
+
+class Unsupported(Exception):
+    pass
+
+
+class _Memo(NamedTuple):
+    location: RepoLocation
+    # Directory containing the `.git` entry, and the identity (device
+    # and inode) of the entry:
+    top: str
+    dotgit: Tuple[int, int]
+
+
+def read_gitfile(path: str) -> str:
+    """
+    Read a ``.git`` file of a worktree or submodule and return the
+    (absolute) Git directory it points to.
+    """
+    with open(path, "rb") as file:
+        content = file.read(4096).decode("utf-8", "surrogateescape")
+    if not content.startswith("gitdir: "):
+        raise Unsupported(f"invalid gitfile format: {path}")
+    target = content[len("gitdir: ") :].rstrip("\r\n")
+    return os.path.normpath(os.path.join(os.path.dirname(path), target))
+
+
+def is_git_directory(path: str) -> bool:
+    """
+    Mimic Git's check for a valid Git directory.
+    """
+    if not os.path.isfile(os.path.join(path, "HEAD")):
+        return False
+    common = path
+    commondir_file = os.path.join(path, "commondir")
+    if os.path.isfile(commondir_file):
+        common = read_commondir(path)
+    return os.path.isdir(os.path.join(common, "objects")) and os.path.isdir(
+        os.path.join(common, "refs")
+    )
+
+
+def read_commondir(git_dir: str) -> str:
+    try:
+        with open(os.path.join(git_dir, "commondir")) as file:
+            target = file.read().strip()
+    except FileNotFoundError:
+        return git_dir
+    return os.path.normpath(os.path.join(git_dir, target))
+
+
+def parse_ceilings(value: str) -> List[str]:
+    ceilings = []
+    for entry in value.split(os.pathsep):
+        if entry and os.path.isabs(entry):
+            ceilings.append(os.path.normpath(entry))
+            ceilings.append(os.path.realpath(entry))
+    return ceilings
+
+
+def is_current(directory: str, memo: _Memo) -> bool:
+    # Check that the repository found for `directory` has not been
+    # moved, deleted, or shadowed by a nested one.
+    current = directory
+    while current != memo.top:
+        if os.path.lexists(os.path.join(current, ".git")):
+            return False
+        parent = os.path.dirname(current)
+        if parent == current:
+            return False
+        current = parent
+    try:
+        st = os.stat(os.path.join(memo.top, ".git"))
+    except OSError:
+        return False
+    return (st.st_dev, st.st_ino) == memo.dotgit
+
+
+class RepoFinder:
+    """
+    Find the repository enclosing a directory by walking up the file
+    system like Git does.
+
+    Results are memoized per directory (least recently used ones are
+    dropped first), so looking up many paths in the same tree costs a
+    dictionary lookup and a few ``stat`` calls per path: a memoized
+    location is used only if its ``.git`` entry is still the same file
+    and no ``.git`` appeared in between (a nested repository).  `find`
+    returns `None` when the location cannot be determined without Git
+    (e.g., ``GIT_DIR`` without ``GIT_WORK_TREE``, bare repositories, or
+    directories outside of any repository).
+    """
+
+    def __init__(self, environ=os.environ, size: int = MEMO_SIZE):
+        self.environ = environ
+        self.size = size
+        self._env: Optional[Tuple] = None
+        self._memo: "OrderedDict[str, _Memo]" = OrderedDict()
+        # Keyed by Git directory; values are the stat tokens of the
+        # configuration files and the settings read from them:
+        self._worktrees: Dict[str, Tuple[Tuple, Tuple[Optional[str], bool]]] = {}
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memo.clear()
+            self._worktrees.clear()
+
+    def _check_env(self) -> Tuple:
+        env = tuple(self.environ.get(name) for name in ENV_VARS)
+        if env != self._env:
+            self.clear()
+            self._env = env
+        return env
+
+    def find(self, directory: Pathish) -> Optional[RepoLocation]:
+        git_dir, work_tree, ceilings, across_fs, common, objects = self._check_env()
+        if common or objects:
+            return None
+        if git_dir:
+            if not work_tree:
+                return None
+            git_dir = os.path.realpath(git_dir)
+            return RepoLocation(
+                root=Path(os.path.realpath(work_tree)),
+                git_dir=Path(git_dir),
+                common_dir=Path(read_commondir(git_dir)),
+            )
+
+        # Git walks up from the physical directory (`getcwd`), so a
+        # symlink into another repository finds that repository:
+        start = os.path.realpath(str(directory))
+        memo = self._recall(start)
+        if memo is not None:
+            return memo.location
+
+        ceiling_dirs = parse_ceilings(ceilings or "")
+        across = to_bool(across_fs) if across_fs else False
+        visited = []
+        current = start
+        try:
+            current_dev = os.stat(current).st_dev
+            while True:
+                memo = self._recall(current)
+                if memo is not None:
+                    break
+                visited.append(current)
+                location = self._probe(current, work_tree)
+                if location is not None:
+                    st = os.stat(os.path.join(current, ".git"))
+                    memo = _Memo(location, current, (st.st_dev, st.st_ino))
+                    break
+                parent = os.path.dirname(current)
+                if parent == current or parent in ceiling_dirs:
+                    break
+                parent_dev = os.stat(parent).st_dev
+                if parent_dev != current_dev and not across:
+                    break
+                current = parent
+                current_dev = parent_dev
+        except (Unsupported, UnsupportedConfigError, OSError):
+            return None
+        if memo is None:
+            # Not memoized, as a repository may be created later.
+            return None
+        with self._lock:
+            for path in visited:
+                self._memo[path] = memo
+            while len(self._memo) > self.size:
+                self._memo.popitem(last=False)
+        return memo.location
+
+    def _recall(self, directory: str) -> Optional[_Memo]:
+        with self._lock:
+            memo = self._memo.get(directory)
+            if memo is None:
+                return None
+            self._memo.move_to_end(directory)
+        if is_current(directory, memo):
+            return memo
+        with self._lock:
+            self._memo.pop(directory, None)
+        return None
+
+    def _probe(
+        self, directory: str, work_tree: Optional[str]
+    ) -> Optional[RepoLocation]:
+        if os.path.basename(directory) == ".git" or is_git_directory(directory):
+            # Inside a Git directory or a bare repository:
+            raise Unsupported(directory)
+        dotgit = os.path.join(directory, ".git")
+        if os.path.isdir(dotgit):
+            if not is_git_directory(dotgit):
+                return None
+            git_dir = dotgit
+        elif os.path.isfile(dotgit):
+            git_dir = read_gitfile(dotgit)
+            if not is_git_directory(git_dir):
+                raise Unsupported(f"not a git repository: {git_dir}")
+        else:
+            return None
+
+        git_dir = os.path.realpath(git_dir)
+        common_dir = read_commondir(git_dir)
+        if work_tree:
+            root = work_tree
+        else:
+            core_worktree, bare = self._core_worktree(git_dir, common_dir)
+            if core_worktree is not None:
+                root = os.path.join(git_dir, core_worktree)
+            elif bare:
+                raise Unsupported(f"bare repository: {git_dir}")
+            else:
+                root = directory
+        return RepoLocation(
+            root=Path(os.path.realpath(root)),
+            git_dir=Path(git_dir),
+            common_dir=Path(common_dir),
+        )
+
+    def _core_worktree(
+        self, git_dir: str, common_dir: str
+    ) -> Tuple[Optional[str], bool]:
+        paths = [
+            os.path.join(common_dir, "config"),
+            os.path.join(git_dir, "config.worktree"),
+        ]
+        token = tuple(stat_token(Path(path)) for path in paths)
+        cached = self._worktrees.get(git_dir)
+        if cached is not None and cached[0] == token:
+            return cached[1]
+        entries = []
+        for path in paths:
+            try:
+                with open(path, "rb") as file:
+                    text = file.read().decode("utf-8", "surrogateescape")
+            except FileNotFoundError:
+                continue
+            entries.extend(parse_config(text, os.path.basename(path)))
+        worktree = None
+        bare = False
+        for key, value in entries:
+            if key == "core.worktree":
+                if value is None:
+                    # Git rejects the bare key; let it report the error.
+                    raise Unsupported(f"core.worktree without a value: {git_dir}")
+                worktree = value
+            elif key == "core.bare":
+                bare = to_bool(value)
+        with self._lock:
+            if len(self._worktrees) >= self.size:
+                self._worktrees.clear()
+            self._worktrees[git_dir] = (token, (worktree, bare))
+        return worktree, bare
+
+
+default_finder = RepoFinder()
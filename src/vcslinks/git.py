@@ -1,14 +1,49 @@
+import os
 import subprocess
+from collections import OrderedDict
 from pathlib import Path
+from stat import S_ISREG
 from subprocess import CompletedProcess
-from typing import TYPE_CHECKING, List, Optional, Sequence
-
-from .base import ApplicationError, BaseRepoAnalyzer, Pathish
+from typing import (
+    TYPE_CHECKING,
+    Generator,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from .base import (
+    AmbiguousRevisionError,
+    ApplicationError,
+    BaseRepoAnalyzer,
+    InvalidRevisionError,
+    Pathish,
+)
+from .discovery import RepoLocation, default_finder
+from .gitconfig import GitConfig, UnsupportedConfigError, config_files
+from .refs import RefStore, UnreadableRefsError
 from .weburl import WebURL
 
+# The in-process backends (commit-graph, object database, reftable,
+# ...) are imported where they are first used, so that only what a
+# command needs is loaded.
 if TYPE_CHECKING:
     from typing import Final
 
+    from .commitgraph import CommitGraph, CommitGraphFile
+    from .gitblame import BlameRange
+    from .hostrules import HostRules
+    from .linemap import LineMap
+    from .objects import ObjectDatabase
+    from .submodules import SubmoduleIndex
+    from .weburl import LinesSpecifier
+
+# Number of publish-check answers remembered per repository:
+PUBLISHED_CACHE_SIZE: "Final[int]" = 256
+
 
 class NoRemoteError(ApplicationError):
     def __init__(self, branch: str):
@@ -20,16 +55,199 @@ class NoRemoteError(ApplicationError):
 
 class GitRepoAnalyzer(BaseRepoAnalyzer):
     @classmethod
-    def from_path(cls, path: Pathish) -> "GitRepoAnalyzer":
+    def from_path(cls, path: Pathish, **options) -> "GitRepoAnalyzer":
         cwd = Path(path)
         if not cwd.is_dir():
             cwd = cwd.parent
-        return cls(cwd=cwd)
-
-    def __init__(self, cwd: Pathish):
-        self.cwd: "Final[Path]" = Path(cwd)
-        self.root: "Final[Path]" = Path(
-            self.git("rev-parse", "--show-toplevel").stdout.strip()
+        return cls(cwd=cwd, **options)
+
+    def __init__(
+        self,
+        cwd: Pathish,
+        config_snapshot: bool = False,
+        batch: bool = False,
+        location: Optional[RepoLocation] = None,
+        config: Optional[GitConfig] = None,
+    ):
+        self.cwd: "Final[Path]" = Path(os.path.abspath(str(cwd)))
+        self.config_snapshot = config_snapshot
+        if location is None:
+            location = default_finder.find(self.cwd) or self.locate()
+        self.root: "Final[Path]" = location.root
+        self.git_dir: "Final[Path]" = location.git_dir
+        self.common_dir: "Final[Path]" = location.common_dir
+        self._config: Optional[GitConfig] = config
+        self._config_unsupported = False
+        self._refs: Optional[RefStore] = None
+        self._submodules: "Optional[SubmoduleIndex]" = None
+        self._commit_graph: "Optional[CommitGraphFile]" = None
+        self._objects: "Optional[ObjectDatabase]" = None
+        # Configuration and rule table generation the rules are for:
+        self._host_rules: "Optional[Tuple[Optional[GitConfig], int, HostRules]]" = None
+        self._published: "OrderedDict[Tuple, bool]" = OrderedDict()
+        self.batch: "Optional[CatFileBatch]" = None
+        if batch:
+            from .catfile import CatFileBatch
+
+            self.batch = CatFileBatch(self.root)
+
+    def __enter__(self) -> "GitRepoAnalyzer":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Terminate the ``git cat-file`` process started in `batch` mode.
+        """
+        if self.batch is not None:
+            self.batch.close()
+
+    @property
+    def config(self) -> Optional[GitConfig]:
+        """
+        Configuration served from memory or `None` if it is not available.
+
+        It is parsed in-process unless `config_snapshot` is true or the
+        parser does not support the configuration files, in which case
+        a snapshot is taken by `snapshot_config`.
+        """
+        if self._config is None and not self._config_unsupported:
+            if not self.config_snapshot:
+                try:
+                    self._config = GitConfig.load(self.git_dir, self.common_dir)
+                except UnsupportedConfigError:
+                    pass
+            if self._config is None:
+                try:
+                    self._config = self.snapshot_config()
+                except subprocess.CalledProcessError:
+                    self._config_unsupported = True
+        return self._config
+
+    def snapshot_config(self) -> GitConfig:
+        """
+        Take a snapshot of the effective configuration with a single
+        ``git config --list`` call.
+        """
+        # Git prints origins relative to the top of the working tree:
+        output = self.git(
+            "config", "--list", "-z", "--show-origin", cwd=str(self.root)
+        ).stdout
+        try:
+            standard = [path for _, path in config_files(self.common_dir)]
+        except UnsupportedConfigError:
+            standard = []
+        return GitConfig.from_list_output(output, cwd=self.root, origins=standard)
+
+    def reload_config(self) -> None:
+        """
+        Discard the configuration so that it is read again when needed.
+        """
+        self._config = None
+        self._config_unsupported = False
+
+    @property
+    def refs(self) -> Optional[RefStore]:
+        """
+        In-process reference reader or `None` if the repository uses a
+        layout it does not support.
+        """
+        if self._refs is None:
+            config = self.config
+            if config is None:
+                return None
+            storage = config.get("extensions.refStorage") or "files"
+            if storage == "files":
+                store = RefStore
+            elif storage == "reftable":
+                from .reftable import ReftableRefStore
+
+                store = ReftableRefStore
+            else:
+                return None
+            self._refs = store(self.git_dir, self.common_dir, hexsz=self.hexsz)
+        return self._refs
+
+    @property
+    def hexsz(self) -> int:
+        """
+        Length of the hexadecimal object IDs of the repository.
+        """
+        config = self.config
+        object_format = (config and config.get("extensions.objectFormat")) or "sha1"
+        return 64 if object_format.lower() == "sha256" else 40
+
+    @property
+    def commit_graph(self) -> "Optional[CommitGraph]":
+        """
+        The commit-graph of the repository or `None` if not available
+        or if Git would not use it.
+        """
+        if not self._commit_graph_compatible():
+            return None
+        if self._commit_graph is None:
+            from .commitgraph import CommitGraphFile
+
+            self._commit_graph = CommitGraphFile(self.common_dir, hexsz=self.hexsz)
+        return self._commit_graph.get()
+
+    def _commit_graph_compatible(self) -> bool:
+        # See `commit_graph_compatible` in Git's commit-graph.c: replace
+        # refs, grafts and shallow clones rewrite the parents of commits.
+        config = self.config
+        if config is None or not config.get_bool("core.commitGraph", True):
+            return False
+        if "GIT_GRAFT_FILE" in os.environ or "GIT_SHALLOW_FILE" in os.environ:
+            return False
+        for name in ["info/grafts", "shallow"]:
+            if os.path.lexists(str(self.common_dir / name)):
+                return False
+        if "GIT_NO_REPLACE_OBJECTS" in os.environ:
+            return True
+        if not config.get_bool("core.useReplaceRefs", True):
+            return True
+        refs = self.refs
+        if refs is None:
+            return False
+        base = os.environ.get("GIT_REPLACE_REF_BASE") or "refs/replace/"
+        if not base.endswith("/"):
+            base += "/"
+        try:
+            return next(refs.iter_refs(base), None) is None
+        except UnreadableRefsError:
+            return False
+
+    @property
+    def objects(self) -> "Optional[ObjectDatabase]":
+        """
+        In-process object ID lookup or `None` if the object directory
+        is not known without Git.
+        """
+        if self._objects is None:
+            if self.config is None:
+                return None
+            if "GIT_OBJECT_DIRECTORY" in os.environ:
+                return None
+            if "GIT_ALTERNATE_OBJECT_DIRECTORIES" in os.environ:
+                return None
+            from .objects import ObjectDatabase
+
+            self._objects = ObjectDatabase(self.common_dir / "objects", self.hexsz)
+        return self._objects
+
+    def locate(self) -> RepoLocation:
+        """
+        Ask ``git rev-parse`` for the location of the repository.
+        """
+        root, git_dir, common_dir = self.git(
+            "rev-parse", "--show-toplevel", "--absolute-git-dir", "--git-common-dir"
+        ).stdout.splitlines()
+        return RepoLocation(
+            root=Path(root),
+            git_dir=Path(git_dir),
+            common_dir=Path(os.path.abspath(os.path.join(self.cwd, common_dir))),
         )
 
     def run(self, *args: str, **options) -> CompletedProcess:
@@ -43,12 +261,72 @@ class GitRepoAnalyzer(BaseRepoAnalyzer):
             universal_newlines=True,
         )
         kwargs.update(options)
+        from . import tracing
+
+        tracer = tracing.active
+        if tracer is not None:
+            return tracer.run(args, kwargs)
         return subprocess.run(args, **kwargs)  # type: ignore
 
+    def stream(self, *args: str, **options) -> Generator[str, None, None]:
+        """
+        Run `args` like `run` but yield the lines of the output while
+        the process is running.  Closing the generator early terminates
+        the process.
+        """
+        import tempfile
+        import time
+
+        from . import tracing
+
+        kwargs = dict(cwd=str(self.cwd), encoding="utf-8", errors="surrogateescape")
+        kwargs.update(options)
+        tracer = tracing.active
+        start = time.perf_counter()
+        # Standard error goes to a file: a pipe read after the output
+        # would block Git once it is full.
+        with tempfile.TemporaryFile() as stderr:
+            proc = subprocess.Popen(
+                args,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=stderr,
+                **kwargs,  # type: ignore
+            )
+            size = 0
+            try:
+                for line in proc.stdout:  # type: ignore
+                    size += len(line)
+                    yield line
+                if proc.wait():
+                    stderr.seek(0)
+                    raise subprocess.CalledProcessError(
+                        proc.returncode,
+                        args,
+                        "",
+                        stderr.read().decode("utf-8", "surrogateescape"),
+                    )
+            finally:
+                if proc.poll() is None:
+                    proc.kill()
+                proc.stdout.close()  # type: ignore
+                proc.wait()
+                if tracer is not None:
+                    tracer.record_process(
+                        args, kwargs["cwd"], start, proc.returncode, size
+                    )
+
     def git(self, *args: str, **options) -> CompletedProcess:
         return self.run("git", *args, **options)
 
     def git_config(self, config: str) -> str:
+        if self.config is not None:
+            value = self.config.get(config)
+            if value is None:
+                raise subprocess.CalledProcessError(
+                    1, ("git", "config", "--get", config), "", ""
+                )
+            return value.rstrip()
         return self.git("config", "--get", config).stdout.rstrip()
 
     def try_git_config(self, config: str) -> Optional[str]:
@@ -57,16 +335,144 @@ class GitRepoAnalyzer(BaseRepoAnalyzer):
         except subprocess.CalledProcessError:
             return None
 
+    def try_resolve_revision(self, revision: str) -> Optional[str]:
+        """
+        Resolve `revision` in-process or return `None`.
+
+        Refs take precedence over abbreviated object IDs, as in Git.
+        Raises `AmbiguousRevisionError` if `revision` is an abbreviation
+        of more than one object.
+        """
+        refs = self.refs
+        if refs is None:
+            return None
+        try:
+            oid = refs.resolve(revision)
+        except UnreadableRefsError:
+            return None
+        if oid is None and self._is_abbrev(revision):
+            objects = self.objects
+            if objects is not None:
+                oid = objects.expand(revision)
+        return oid
+
+    def _is_abbrev(self, revision: str) -> bool:
+        from .objects import is_abbrev
+
+        return is_abbrev(revision, self.hexsz)
+
     def resolve_revision(self, revision: str) -> str:
+        oid = self.try_resolve_revision(revision)
+        if oid is not None:
+            return oid
+        if self.batch is not None:
+            oid = self.batch.resolve(revision)
+            if oid is not None:
+                return oid
         return self.git("rev-parse", "--verify", revision).stdout.strip()
 
+    def resolve_revisions(
+        self, revisions: Sequence[str]
+    ) -> List[Union[str, InvalidRevisionError]]:
+        """
+        Resolve `revisions` with at most one ``git cat-file`` call (or
+        none if they are all resolved in-process).
+        """
+        oids: List[Union[None, str, InvalidRevisionError]] = []
+        for rev in revisions:
+            try:
+                oids.append(self.try_resolve_revision(rev))
+            except AmbiguousRevisionError as err:
+                oids.append(err)
+        pending = [
+            i for i, (oid, rev) in enumerate(zip(oids, revisions)) if oid is None
+        ]
+        valid = [i for i in pending if revisions[i] and "\n" not in revisions[i]]
+        if self.batch is not None:
+            found = self.batch.resolve_many([revisions[i] for i in valid])
+        elif valid:
+            from .catfile import parse_batch_check
+
+            found = [
+                parse_batch_check(line.encode("utf-8", "surrogateescape"))
+                for line in self.git(
+                    "cat-file",
+                    "--batch-check",
+                    input="".join(revisions[i] + "\n" for i in valid),
+                ).stdout.splitlines(keepends=True)
+            ]
+        else:
+            found = []
+        for i, oid in zip(valid, found):
+            oids[i] = oid
+        return [
+            oid if oid is not None else InvalidRevisionError(rev)
+            for oid, rev in zip(oids, revisions)
+        ]
+
+    def abbreviate(self, oid: str) -> str:
+        """
+        Shorten `oid` like ``git rev-parse --short``: to ``core.abbrev``
+        digits, or more if needed to be unambiguous.
+        """
+        objects = self.objects
+        minimum = self._abbrev_length()
+        if objects is None or minimum is None:
+            return self.git("rev-parse", "--short", oid).stdout.strip()
+        return objects.abbreviate(oid, minimum if minimum > 0 else None)
+
+    def _abbrev_length(self) -> Optional[int]:
+        # Minimum length from ``core.abbrev`` (0 for ``auto``) or `None`
+        # if only Git can tell.
+        config = self.config
+        if config is None:
+            return None
+        values = config.raw_values("core.abbrev")
+        if not values:
+            return 0
+        value = values[-1]
+        if value is None:
+            return None
+        if value.lower() == "auto":
+            return 0
+        if value.lower() in ("false", "no", "off", ""):
+            return self.hexsz
+        try:
+            length = int(value)
+        except ValueError:
+            return None
+        from .objects import MIN_ABBREV
+
+        if not MIN_ABBREV <= length <= self.hexsz:
+            return None
+        return length
+
+    @property
+    def host_rules(self) -> "HostRules":
+        """
+        Rules from the user configuration combined with the
+        ``vcslinks.<host>.provider`` entries of this repository.
+
+        They are computed once per configuration, like the rest of the
+        configuration; `vcslinks.cache` discards the analyzer when the
+        user configuration file changes.
+        """
+        from .hostrules import default_table
+
+        config = self.config
+        memo = self._host_rules
+        if memo is None or memo[0] is not config or memo[1] != default_table.generation:
+            rules = default_table.for_config(config)
+            memo = self._host_rules = (config, default_table.generation, rules)
+        return memo[2]
+
     @staticmethod
-    def choose_url(url_list: Sequence[str]) -> str:
-        for host in ["gitlab", "github", "bitbucket"]:
-            for url in url_list:
-                if host in url:
-                    return url
-        return url_list[0]
+    def choose_url(url_list: Sequence[str], rules: "Optional[HostRules]" = None) -> str:
+        if rules is None:
+            from .hostrules import default_table
+
+            rules = default_table.base()
+        return rules.choose_url(url_list)
 
     def remote_of_branch(self, branch: str) -> Optional[str]:
         return (
@@ -77,6 +483,11 @@ class GitRepoAnalyzer(BaseRepoAnalyzer):
 
     def remote_all_urls(self, branch: str = "master") -> List[str]:
         remote: str = self.remote_of_branch(branch) or "origin"
+        if self.config is not None:
+            urls = self.config.get_all(f"remote.{remote}.url")
+            if not urls:
+                raise NoRemoteError(branch)
+            return urls
         try:
             return self.git(
                 "config", "--get-all", f"remote.{remote}.url"
@@ -85,7 +496,7 @@ class GitRepoAnalyzer(BaseRepoAnalyzer):
             raise NoRemoteError(branch)
 
     def remote_url(self, branch: str = "master") -> str:
-        return self.choose_url(self.remote_all_urls(branch))
+        return self.choose_url(self.remote_all_urls(branch), self.host_rules)
 
     def remote_branch(self, branch: str) -> str:
         ref = self.try_git_config(f"branch.{branch}.merge")
@@ -95,6 +506,13 @@ class GitRepoAnalyzer(BaseRepoAnalyzer):
         return ref[len("refs/heads/") :]
 
     def current_branch(self) -> str:
+        if self.refs is not None:
+            try:
+                branch = self.refs.current_branch()
+            except UnreadableRefsError:
+                branch = None
+            if branch is not None:
+                return branch
         return self.git("rev-parse", "--abbrev-ref", "HEAD").stdout.rstrip()
 
     def need_pull_request(self, branch: str) -> bool:
@@ -105,6 +523,213 @@ class GitRepoAnalyzer(BaseRepoAnalyzer):
         assert not str(relpath).startswith("..")
         return relpath
 
+    @property
+    def submodules(self) -> "SubmoduleIndex":
+        if self._submodules is None:
+            from .submodules import SubmoduleIndex
+
+            self._submodules = SubmoduleIndex(self)
+        return self._submodules
+
+    def find_submodule(
+        self, path: Pathish, revision: Optional[str]
+    ) -> Optional[Tuple[WebURL, str]]:
+        if not (self.root / ".gitmodules").exists():
+            return None
+        submodule = self.submodules.lookup(self.relpath(path).parts)
+        if submodule is None:
+            return None
+        commit = self.resolve_revision(revision or "HEAD")
+        oid = self.submodules.gitlink(submodule, commit)
+        if oid is None:
+            return None
+        return self.submodules.weburl(submodule), oid
+
+    def remote_tips(self, remote: str) -> List[str]:
+        """
+        Object IDs of the remote-tracking branches of `remote`.
+        """
+        prefix = f"refs/remotes/{remote}/"
+        if self.refs is not None:
+            try:
+                return [oid for _, oid in self.refs.iter_refs(prefix)]
+            except UnreadableRefsError:
+                pass
+        return self.git("for-each-ref", "--format=%(objectname)", prefix).stdout.split()
+
+    def is_published(self, commit: str, branch: str) -> bool:
+        """
+        Check if `commit` is reachable from a remote-tracking branch of
+        the remote of `branch` (default to ``origin``).
+
+        The commit-graph is walked in-process (pruned by generation
+        numbers) when it contains all the remote-tracking branches.
+        Otherwise ``git for-each-ref --contains`` is asked.  Answers
+        are cached until the remote-tracking branches move.
+        """
+        remote = self.remote_of_branch(branch) or "origin"
+        tips = tuple(sorted(set(self.remote_tips(remote))))
+        if commit in tips:
+            return True
+        if not tips:
+            return False
+        key = (commit, tips)
+        published = self._published.get(key)
+        if published is not None:
+            return published
+        graph = self.commit_graph
+        if graph is not None:
+            from .commitgraph import UnsupportedGraphError
+
+            try:
+                published = graph.can_reach(tips, commit)
+            except (LookupError, UnsupportedGraphError):
+                pass
+        if published is None:
+            published = bool(
+                self.git(
+                    "for-each-ref",
+                    "--count=1",
+                    "--format=%(refname)",
+                    "--contains",
+                    commit,
+                    f"refs/remotes/{remote}/",
+                ).stdout.strip()
+            )
+        self._published[key] = published
+        while len(self._published) > PUBLISHED_CACHE_SIZE:
+            self._published.popitem(last=False)
+        return published
+
+    def tracking_revision(self, branch: str, name: str) -> str:
+        remote = self.remote_of_branch(branch) or "origin"
+        refname = f"refs/remotes/{remote}/{name}"
+        if self.refs is not None:
+            try:
+                return refname if self.refs.exists(refname) else name
+            except UnreadableRefsError:
+                pass
+        proc = self.git("show-ref", "--verify", "--quiet", refname, check=False)
+        return refname if proc.returncode == 0 else name
+
+    def merge_bases(self, commit1: str, commit2: str) -> List[str]:
+        """
+        All best common ancestors of two commits (object IDs), newest
+        first, like ``git merge-base --all``.
+
+        The commit-graph is walked in-process if it contains both
+        commits.  Otherwise ``git merge-base`` is asked.
+        """
+        graph = self.commit_graph
+        if graph is not None:
+            from .commitgraph import UnsupportedGraphError
+
+            try:
+                return graph.merge_bases(commit1, commit2)
+            except (LookupError, UnsupportedGraphError):
+                pass
+        proc = self.git("merge-base", "--all", commit1, commit2, check=False)
+        if proc.returncode not in (0, 1):
+            raise subprocess.CalledProcessError(
+                proc.returncode, proc.args, proc.stdout, proc.stderr
+            )
+        return proc.stdout.split()
+
+    def merge_base(self, commit1: str, commit2: str) -> Optional[str]:
+        bases = self.merge_bases(commit1, commit2)
+        return bases[0] if bases else None
+
+    def is_ancestor(self, ancestor: str, commit: str) -> bool:
+        """
+        Check if `ancestor` is reachable from `commit` (object IDs), in
+        the commit-graph if possible.
+        """
+        if ancestor == commit:
+            return True
+        graph = self.commit_graph
+        if graph is not None:
+            from .commitgraph import UnsupportedGraphError
+
+            try:
+                return graph.can_reach([commit], ancestor)
+            except (LookupError, UnsupportedGraphError):
+                pass
+        proc = self.git("merge-base", "--is-ancestor", ancestor, commit, check=False)
+        if proc.returncode not in (0, 1):
+            raise subprocess.CalledProcessError(
+                proc.returncode, proc.args, proc.stdout, proc.stderr
+            )
+        return proc.returncode == 0
+
+    def map_lines(
+        self, path: Pathish, lines: "LinesSpecifier", revision: str
+    ) -> "LinesSpecifier":
+        """
+        Map `lines` through the changes of the working tree file at
+        `path` relative to its blob in `revision`.
+
+        The blob is looked up once per commit and path, and the diff is
+        computed in-process once per blob and file modification.
+        """
+        if not lines:
+            return lines
+        try:
+            stat = os.stat(str(path))
+        except OSError:
+            return lines
+        if not S_ISREG(stat.st_mode):
+            return lines
+        from .linemap import default_linemaps
+
+        relpath = "/".join(self.relpath(path).parts)
+        blob = default_linemaps.blob_id(
+            revision, relpath, lambda: self._blob_id(revision, relpath)
+        )
+        if blob is None:
+            return lines
+        key = (blob, os.path.realpath(str(path)), stat.st_mtime_ns, stat.st_size)
+        linemap = default_linemaps.linemap(key, lambda: self._linemap(path, blob))
+        if linemap is None:
+            return lines
+        return linemap.map_lines(lines, relpath, revision)
+
+    def _blob_id(self, revision: str, relpath: str) -> Optional[str]:
+        spec = f"{revision}:{relpath}"
+        if self.batch is not None:
+            return self.batch.resolve(spec)
+        proc = self.git("rev-parse", "--verify", "--quiet", spec, check=False)
+        return proc.stdout.strip() if proc.returncode == 0 else None
+
+    def _linemap(self, path: Pathish, blob: str) -> "Optional[LineMap]":
+        from .linemap import LineMap, blob_id, split_lines
+
+        try:
+            with open(str(path), "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+        if blob_id(data, len(blob)) == blob:
+            return None
+        return LineMap(split_lines(self._read_blob(blob)), split_lines(data))
+
+    def _read_blob(self, blob: str) -> bytes:
+        if self.batch is not None:
+            data = self.batch.read(blob)
+            if data is not None:
+                return data
+        return self.git("cat-file", "blob", blob, universal_newlines=False).stdout
+
+    def blame_ranges(
+        self, path: Pathish, lines: "LinesSpecifier", revision: Optional[str]
+    ) -> "Iterator[BlameRange]":
+        from .gitblame import blame_incremental, line_options
+
+        args = [*line_options(lines)]
+        if revision:
+            args.append(revision)
+        args += ["--", "/".join(self.relpath(path).parts)]
+        return blame_incremental(self, args)
+
 
 class LocalBranch:
     repo: BaseRepoAnalyzer
@@ -129,12 +754,12 @@ class LocalBranch:
         return WebURL(self)
 
 
-def is_supported_url(url: str) -> bool:
-    # TODO: improve!
-    for host in ["gitlab", "github", "bitbucket"]:
-        if host in url:
-            return True
-    return False
+def is_supported_url(url: str, rules: "Optional[HostRules]" = None) -> bool:
+    if rules is None:
+        from .hostrules import default_table
+
+        rules = default_table.base()
+    return rules.classify_url(url) is not None
 
 
 def choose_local_branch(
@@ -145,7 +770,7 @@ def choose_local_branch(
         return LocalBranch(repo, name=branch)
 
     branch = repo.current_branch()
-    if is_supported_url(repo.remote_url(branch=branch)):
+    if is_supported_url(repo.remote_url(branch=branch), repo.host_rules):
         return LocalBranch(repo, name=branch)
 
     return LocalBranch(repo, name="master")
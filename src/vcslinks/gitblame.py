@@ -0,0 +1,123 @@
+"""
+Streaming reader of ``git blame --incremental``.
+"""
+
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    from .git import GitRepoAnalyzer
+    from .weburl import LinesSpecifier
+
+
+class BlameRange(NamedTuple):
+    # First and last (inclusive) line numbers in the blamed file:
+    start: int
+    end: int
+    commit: str
+    # Header fields ("author", "summary", ...) of `commit`.  The same
+    # dictionary is shared by all ranges of the commit:
+    info: Dict[str, str]
+
+    @property
+    def committed(self) -> bool:
+        """
+        `False` if the lines are not committed yet.
+        """
+        return self.commit.strip("0") != ""
+
+
+def line_options(lines: "LinesSpecifier") -> Sequence[str]:
+    """
+    Convert `lines` to the ``-L`` option of ``git blame``.
+
+    >>> line_options(3)
+    ['-L3,3']
+    >>> line_options((3, 10))
+    ['-L3,10']
+    >>> line_options(None)
+    []
+    """
+    if not lines:
+        return []
+    if isinstance(lines, tuple):
+        start, end = lines
+    else:
+        start = end = lines
+    return [f"-L{start},{end}"]
+
+
+def parse_incremental(stream: Iterable[str]) -> Iterator[BlameRange]:
+    """
+    Parse the output of ``git blame --incremental``, yielding each
+    range as soon as its header is complete.
+
+    Git prints the details of a commit only the first time it appears;
+    they are kept (once per commit) and reused for the later ranges.
+
+    >>> output = '''\\
+    ... 1111111111111111111111111111111111111111 1 1 2
+    ... author Alice
+    ... summary first
+    ... filename README.md
+    ... 2222222222222222222222222222222222222222 3 3 1
+    ... author Bob
+    ... summary second
+    ... filename README.md
+    ... 1111111111111111111111111111111111111111 4 4 1
+    ... filename README.md
+    ... '''
+    >>> for r in parse_incremental(output.splitlines(keepends=True)):
+    ...     print(r.start, r.end, r.commit[:4], r.info["author"])
+    1 2 1111 Alice
+    3 3 2222 Bob
+    4 4 1111 Alice
+    """
+    commits: Dict[str, Dict[str, str]] = {}
+    # Commit, first and last line, and details of the current range:
+    header: Optional[Tuple[str, int, int, Dict[str, str]]] = None
+    for line in stream:
+        line = line.rstrip("\n")
+        if header is None:
+            fields = line.split(" ")
+            if len(fields) != 4:
+                raise ValueError(f"unexpected blame output: {line!r}")
+            commit = fields[0]
+            start = int(fields[2])
+            info = commits.setdefault(commit, {})
+            header = (commit, start, start + int(fields[3]) - 1, info)
+            continue
+        commit, start, end, info = header
+        key, _, value = line.partition(" ")
+        if key == "filename":
+            yield BlameRange(start=start, end=end, commit=commit, info=info)
+            header = None
+        elif key not in info:
+            info[key] = value
+    if header is not None:
+        raise ValueError("blame output ended in the middle of a range")
+
+
+def blame_incremental(
+    repo: "GitRepoAnalyzer", args: Sequence[str]
+) -> Iterator[BlameRange]:
+    """
+    Run ``git blame --incremental`` with `args` at the top of `repo`
+    and parse its output while it is running.
+
+    Closing the generator early terminates Git.  Raises
+    `subprocess.CalledProcessError` if Git fails.
+    """
+    lines = repo.stream("git", "blame", "--incremental", *args, cwd=str(repo.root))
+    try:
+        yield from parse_incremental(lines)
+    finally:
+        lines.close()
@@ -0,0 +1,590 @@
+"""
+In-process reader for Git configuration files.
+"""
+
+import os
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from .base import Pathish
+
+if TYPE_CHECKING:
+    from typing import Final
+
+MAX_INCLUDE_DEPTH: "Final[int]" = 10
+
+
+class UnsupportedConfigError(Exception):
+    """
+    Raised for configuration constructs that `GitConfig` cannot handle.
+
+    Callers are expected to fall back to the ``git config`` command.
+    """
+
+    def __init__(self, reason: str):
+        self.reason = reason
+
+    def __str__(self) -> str:
+        return f"Unsupported Git configuration: {self.reason}"
+
+
+def split_key(key: str) -> Tuple[str, Optional[str], str]:
+    """
+    Split a configuration `key` into section, subsection and name.
+
+    >>> split_key("core.bare")
+    ('core', None, 'bare')
+    >>> split_key("Branch.Feature.x.Remote")
+    ('branch', 'Feature.x', 'remote')
+    """
+    section, rest = key.split(".", 1)
+    if "." in rest:
+        subsection: Optional[str]
+        subsection, name = rest.rsplit(".", 1)
+    else:
+        subsection, name = None, rest
+    return section.lower(), subsection, name.lower()
+
+
+def canonical_key(key: str) -> str:
+    """
+    Normalize the case-insensitive parts of `key`.
+
+    >>> canonical_key("Remote.Origin.URL")
+    'remote.Origin.url'
+    """
+    section, subsection, name = split_key(key)
+    if subsection is None:
+        return f"{section}.{name}"
+    return f"{section}.{subsection}.{name}"
+
+
+def to_bool(value: Optional[str]) -> bool:
+    """
+    Interpret `value` the way ``git config --type=bool`` does.
+
+    `None` stands for a key given without ``=`` (implicit true).
+    """
+    if value is None:
+        return True
+    lowered = value.strip().lower()
+    if lowered in ("true", "yes", "on"):
+        return True
+    if lowered in ("", "false", "no", "off"):
+        return False
+    try:
+        return int(lowered) != 0
+    except ValueError:
+        raise UnsupportedConfigError(f"non-boolean value {value!r}")
+
+
+def wildmatch_regex(pattern: str, ignore_case: bool = False) -> "re.Pattern":
+    """
+    Compile a Git wildmatch `pattern` (with ``WM_PATHNAME``) to a regex.
+
+    >>> bool(wildmatch_regex("~/src/**").match("~/src/a/b"))
+    True
+    >>> bool(wildmatch_regex("**/work/*/.git").match("/home/u/work/x/.git"))
+    True
+    >>> bool(wildmatch_regex("/work/*/.git").match("/work/x/y/.git"))
+    False
+    """
+    out = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern.startswith("**", i):
+                j = i + 2
+                at_segment_start = i == 0 or pattern[i - 1] == "/"
+                if at_segment_start and pattern.startswith("/", j):
+                    out.append("(?:.*/)?")
+                    i = j + 1
+                    continue
+                if at_segment_start and j == n:
+                    out.append(".*")
+                    i = j
+                    continue
+                i = j
+            else:
+                i += 1
+            out.append("[^/]*")
+            continue
+        if c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end < 0:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1 : end]
+                if body[0] in "!^":
+                    body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return re.compile("".join(out) + r"\Z", re.IGNORECASE if ignore_case else 0)
+
+
+def git_prefix_config_path() -> Path:
+    """
+    Return the path of the system-wide configuration file.
+
+    Git uses ``$(sysconfdir)/gitconfig``, which is ``/etc/gitconfig``
+    for Git installed under ``/usr``.  Other installations (Homebrew,
+    builds with a custom ``--sysconfdir``, ...) cannot be told apart
+    from the location of the binary, so `UnsupportedConfigError` is
+    raised for them and Git is asked instead.
+    """
+    import shutil
+
+    git = shutil.which("git")
+    if git:
+        prefix = Path(os.path.realpath(git)).parent.parent
+        if str(prefix) not in ("/usr", "/"):
+            raise UnsupportedConfigError(f"unknown system config of {git}")
+    return Path("/etc/gitconfig")
+
+
+def config_files(
+    common_dir: Optional[Pathish] = None, environ=os.environ
+) -> List[Tuple[str, Path]]:
+    """
+    List configuration files read by Git as ``(scope, path)`` pairs.
+
+    The files are sorted from the lowest to the highest priority.
+    Files that do not exist are included as well so that callers can
+    notice when they are created.
+    """
+    if "GIT_CONFIG" in environ:
+        raise UnsupportedConfigError("GIT_CONFIG is set")
+    files: List[Tuple[str, Path]] = []
+    if not to_bool(environ.get("GIT_CONFIG_NOSYSTEM", "false")):
+        system = environ.get("GIT_CONFIG_SYSTEM")
+        path = Path(system) if system else git_prefix_config_path()
+        files.append(("system", path))
+    if "GIT_CONFIG_GLOBAL" in environ:
+        if environ["GIT_CONFIG_GLOBAL"]:
+            files.append(("global", Path(environ["GIT_CONFIG_GLOBAL"])))
+    else:
+        home = environ.get("HOME")
+        xdg = environ.get("XDG_CONFIG_HOME")
+        if xdg:
+            files.append(("global", Path(xdg) / "git" / "config"))
+        elif home:
+            files.append(("global", Path(home) / ".config" / "git" / "config"))
+        if home:
+            files.append(("global", Path(home) / ".gitconfig"))
+    if common_dir is not None:
+        files.append(("local", Path(common_dir) / "config"))
+    return files
+
+
+def stat_token(path: Path) -> Tuple[str, Optional[int], Optional[int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return (str(path), None, None)
+    return (str(path), st.st_mtime_ns, st.st_size)
+
+
+class GitConfig:
+    """
+    A multi-map from canonical configuration keys to values.
+
+    Values are stored in the order Git reads them, so the last value
+    of a key is its effective value.  A key given without ``=`` is
+    stored as `None` and reported as an empty string by `get`, as
+    ``git config --get`` does.
+    """
+
+    def __init__(self, origins: Iterable[Path] = ()):
+        self._values: Dict[str, List[Optional[str]]] = {}
+        self.origins: List[Path] = list(origins)
+        self.generation = self.current_generation()
+
+    def add(self, key: str, value: Optional[str]) -> None:
+        self._values.setdefault(canonical_key(key), []).append(value)
+
+    def raw_values(self, key: str) -> List[Optional[str]]:
+        return self._values.get(canonical_key(key), [])
+
+    def get_all(self, key: str) -> List[str]:
+        return ["" if v is None else v for v in self.raw_values(key)]
+
+    def get(self, key: str) -> Optional[str]:
+        values = self.raw_values(key)
+        if not values:
+            return None
+        return "" if values[-1] is None else values[-1]
+
+    def get_bool(self, key: str, default: bool = False) -> bool:
+        values = self.raw_values(key)
+        if not values:
+            return default
+        return to_bool(values[-1])
+
+    def __contains__(self, key: str) -> bool:
+        return bool(self.raw_values(key))
+
+    def keys(self) -> List[str]:
+        return list(self._values)
+
+    def subsection_values(self, section: str, name: str) -> Dict[str, str]:
+        """
+        Map subsections to the values of keys ``<section>.<subsection>.<name>``.
+
+        >>> config = GitConfig()
+        >>> config.add("remote.origin.url", "URL1")
+        >>> config.add("Remote.upstream.URL", "URL2")
+        >>> config.subsection_values("remote", "url")
+        {'origin': 'URL1', 'upstream': 'URL2'}
+        """
+        section = section.lower()
+        name = name.lower()
+        found = {}
+        for key in self._values:
+            sec, subsection, var = split_key(key)
+            if sec == section and var == name and subsection is not None:
+                value = self.get(key)
+                if value:  # skip bare keys, which have no value to map to
+                    found[subsection] = value
+        return found
+
+    def current_generation(self) -> Tuple:
+        return tuple(stat_token(p) for p in self.origins)
+
+    def is_stale(self) -> bool:
+        """
+        Check if any of the files this configuration was read from has
+        changed (or appeared) since it was loaded.
+        """
+        return self.current_generation() != self.generation
+
+    @classmethod
+    def load(
+        cls, git_dir: Pathish, common_dir: Optional[Pathish] = None, environ=os.environ
+    ) -> "GitConfig":
+        """
+        Read all configuration files effective in a repository.
+
+        Raises `UnsupportedConfigError` if Git may see a different
+        configuration than the one parsed here.
+        """
+        if "GIT_CONFIG_PARAMETERS" in environ:
+            raise UnsupportedConfigError("configuration given via `git -c`")
+        git_dir = Path(git_dir)
+        common_dir = Path(common_dir) if common_dir is not None else git_dir
+        files = config_files(common_dir, environ)
+        parser = ConfigParser(git_dir)
+        for _, path in files:
+            parser.read(path)
+        if parser.config.get_bool("extensions.worktreeConfig"):
+            parser.read(git_dir / "config.worktree")
+        for key, value in env_parameters(environ):
+            parser.config.add(key, value)
+        config = parser.config
+        config.origins = parser.origins
+        config.generation = config.current_generation()
+        return config
+
+    @classmethod
+    def from_list_output(
+        cls, output: str, cwd: Pathish = ".", origins: Iterable[Path] = ()
+    ) -> "GitConfig":
+        r"""
+        Build a configuration from ``git config --list -z --show-origin``.
+
+        Files named in the output (in addition to `origins`) are used
+        to compute `generation`.
+
+        >>> config = GitConfig.from_list_output(
+        ...     "file:.git/config\0remote.origin.url\nURL\0"
+        ...     "file:.git/config\0core.flag\0"
+        ... )
+        >>> config.get("remote.origin.url"), config.get("core.flag")
+        ('URL', '')
+        >>> config.origins
+        [PosixPath('.git/config')]
+        """
+        config = cls()
+        seen = list(origins)
+        fields = output.split("\0")
+        for origin, item in zip(fields[0::2], fields[1::2]):
+            key, sep, value = item.partition("\n")
+            config.add(key, value if sep else None)
+            if origin.startswith("file:"):
+                path = Path(cwd) / origin[len("file:") :]
+                if path not in seen:
+                    seen.append(path)
+        config.origins = seen
+        config.generation = config.current_generation()
+        return config
+
+
+def env_parameters(environ) -> List[Tuple[str, str]]:
+    """
+    Read ``GIT_CONFIG_COUNT``, ``GIT_CONFIG_KEY_<n>`` and
+    ``GIT_CONFIG_VALUE_<n>``.
+    """
+    count = environ.get("GIT_CONFIG_COUNT")
+    if not count:
+        return []
+    try:
+        return [
+            (environ[f"GIT_CONFIG_KEY_{i}"], environ[f"GIT_CONFIG_VALUE_{i}"])
+            for i in range(int(count))
+        ]
+    except (KeyError, ValueError):
+        raise UnsupportedConfigError("malformed GIT_CONFIG_COUNT parameters")
+
+
+SECTION_RE = re.compile(r"[A-Za-z0-9.-]+\Z")
+NAME_RE = re.compile(r"[A-Za-z][A-Za-z0-9-]*")
+
+
+class ConfigParser:
+    """
+    Parser for the Git configuration file syntax including
+    ``include.path`` and ``includeIf.<condition>.path``.
+    """
+
+    def __init__(self, git_dir: Optional[Path] = None):
+        self.git_dir = git_dir
+        self.config = GitConfig()
+        self.origins: List[Path] = []
+
+    def read(self, path: Path, depth: int = 0) -> None:
+        self.origins.append(path)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return
+        except (IsADirectoryError, NotADirectoryError):
+            return
+        except OSError as err:
+            raise UnsupportedConfigError(f"cannot read {path}: {err}")
+        text = data.decode("utf-8", "surrogateescape")
+        for key, value in parse_config(text, str(path)):
+            self.config.add(key, value)
+            self._maybe_include(path, key, value, depth)
+
+    def _maybe_include(
+        self, path: Path, key: str, value: Optional[str], depth: int
+    ) -> None:
+        section, subsection, name = split_key(key)
+        if name != "path":
+            return
+        if section == "include" and subsection is None:
+            pass
+        elif section == "includeif" and subsection is not None:
+            if not self._condition(subsection, path):
+                return
+        else:
+            return
+        if not value:
+            return
+        if depth + 1 > MAX_INCLUDE_DEPTH:
+            raise UnsupportedConfigError("exceeded maximum include depth")
+        target = Path(os.path.expanduser(value))
+        if not target.is_absolute():
+            target = path.parent / target
+        self.read(target, depth + 1)
+
+    def _condition(self, condition: str, path: Path) -> bool:
+        if condition.startswith("gitdir:"):
+            return self._match_gitdir(condition[len("gitdir:") :], path, False)
+        if condition.startswith("gitdir/i:"):
+            return self._match_gitdir(condition[len("gitdir/i:") :], path, True)
+        if condition.startswith("onbranch:"):
+            return self._match_branch(condition[len("onbranch:") :])
+        if condition.startswith("hasconfig:"):
+            raise UnsupportedConfigError(f"includeIf.{condition}")
+        return False
+
+    def _match_gitdir(self, pattern: str, path: Path, ignore_case: bool) -> bool:
+        if self.git_dir is None:
+            return False
+        if pattern.startswith("~/"):
+            pattern = os.path.expanduser(pattern)
+        elif pattern.startswith("./"):
+            pattern = str(path.parent) + pattern[1:]
+        if not os.path.isabs(pattern):
+            pattern = "**/" + pattern
+        if pattern.endswith("/"):
+            pattern += "**"
+        regex = wildmatch_regex(pattern, ignore_case)
+        candidates = {str(self.git_dir), os.path.realpath(str(self.git_dir))}
+        return any(regex.match(c) for c in candidates)
+
+    def _match_branch(self, pattern: str) -> bool:
+        if self.git_dir is None:
+            return False
+        try:
+            head = (self.git_dir / "HEAD").read_text().strip()
+        except OSError:
+            return False
+        if not head.startswith("ref: refs/heads/"):
+            return False
+        if pattern.endswith("/"):
+            pattern += "**"
+        return bool(wildmatch_regex(pattern).match(head[len("ref: refs/heads/") :]))
+
+
+def parse_config(
+    text: str, origin: str = "<string>"
+) -> List[Tuple[str, Optional[str]]]:
+    r"""
+    Parse configuration `text` into a list of ``(key, value)`` pairs.
+
+    >>> parse_config('''
+    ... [core]
+    ...     bare = false  ; comment
+    ... [remote "origin"]
+    ...     url = "git@github.com:USER/PROJECT.git"
+    ... [section.Sub] flag
+    ... ''')  # doctest: +NORMALIZE_WHITESPACE
+    [('core.bare', 'false'),
+     ('remote.origin.url', 'git@github.com:USER/PROJECT.git'),
+     ('section.sub.flag', None)]
+    """
+    entries: List[Tuple[str, Optional[str]]] = []
+    prefix: Optional[str] = None
+    n = len(text)
+    i = 0
+    lineno = 1
+
+    def error(msg: str) -> UnsupportedConfigError:
+        return UnsupportedConfigError(f"{origin}:{lineno}: {msg}")
+
+    while i < n:
+        c = text[i]
+        if c == "\n":
+            lineno += 1
+            i += 1
+        elif c in " \t\r\f\v" or (c == "\ufeff" and i == 0):
+            i += 1
+        elif c in "#;":
+            end = text.find("\n", i)
+            i = n if end < 0 else end
+        elif c == "[":
+            i, prefix = _parse_section(text, i + 1, error)
+        elif c.isascii() and c.isalpha():
+            if prefix is None:
+                raise error("variable outside of a section")
+            match = NAME_RE.match(text, i)
+            if not match:
+                raise error(f"bad variable name at {c!r}")
+            name = match.group(0)
+            i = match.end()
+            while i < n and text[i] in " \t":
+                i += 1
+            if i < n and text[i] == "=":
+                i, value, lines = _parse_value(text, i + 1, error)
+                lineno += lines
+                entries.append((_join_key(prefix, name), value))
+            elif i >= n or text[i] in "\n#;\r":
+                entries.append((_join_key(prefix, name), None))
+            else:
+                raise error(f"bad variable name {name!r}")
+        else:
+            raise error(f"unexpected character {c!r}")
+    return entries
+
+
+def _join_key(prefix: str, name: str) -> str:
+    return canonical_key(f"{prefix}.{name}")
+
+
+def _parse_section(text: str, i: int, error) -> Tuple[int, str]:
+    n = len(text)
+    start = i
+    while i < n and text[i] not in '] \t"':
+        i += 1
+    section = text[start:i]
+    if i < n and text[i] == "]":
+        if not SECTION_RE.match(section):
+            raise error(f"bad section name {section!r}")
+        if "." in section:
+            # Deprecated `[section.subsection]` syntax:
+            head, sub = section.split(".", 1)
+            return i + 1, f"{head.lower()}.{sub.lower()}"
+        return i + 1, section.lower()
+    while i < n and text[i] in " \t":
+        i += 1
+    if i >= n or text[i] != '"' or not SECTION_RE.match(section):
+        raise error("bad section header")
+    i += 1
+    parts = []
+    while True:
+        if i >= n or text[i] == "\n":
+            raise error("unterminated subsection name")
+        c = text[i]
+        if c == '"':
+            break
+        if c == "\\":
+            i += 1
+            if i >= n or text[i] == "\n":
+                raise error("unterminated subsection name")
+            c = text[i]
+        parts.append(c)
+        i += 1
+    i += 1
+    if i >= n or text[i] != "]":
+        raise error("bad section header")
+    return i + 1, f"{section.lower()}.{''.join(parts)}"
+
+
+ESCAPES = {"n": "\n", "t": "\t", "b": "\b", "\\": "\\", '"': '"'}
+
+
+def _parse_value(text: str, i: int, error) -> Tuple[int, str, int]:
+    n = len(text)
+    out: List[str] = []
+    quoted = False
+    pending_space = ""
+    lines = 0
+    while i < n:
+        c = text[i]
+        if c == "\n":
+            break
+        if not quoted and c in "#;":
+            end = text.find("\n", i)
+            i = n if end < 0 else end
+            break
+        if not quoted and c in " \t\r":
+            if out:
+                pending_space += c
+            i += 1
+            continue
+        if pending_space:
+            out.append(pending_space)
+            pending_space = ""
+        if c == '"':
+            quoted = not quoted
+        elif c == "\\":
+            i += 1
+            if i < n and text[i] == "\r" and text.startswith("\n", i + 1):
+                i += 1
+            if i >= n:
+                raise error("trailing backslash")
+            c = text[i]
+            if c == "\n":
+                lines += 1
+            elif c in ESCAPES:
+                out.append(ESCAPES[c])
+            else:
+                raise error(f"bad escape sequence \\{c}")
+        else:
+            out.append(c)
+        i += 1
+    if quoted:
+        raise error("unterminated quoted value")
+    return i, "".join(out), lines
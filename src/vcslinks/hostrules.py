@@ -0,0 +1,262 @@
+"""
+Rules mapping Git remote hosts to hosting service providers.
+
+Rules are read from ``vcslinks.<host>.provider`` entries in the Git
+configuration of a repository and in the user configuration file
+``$XDG_CONFIG_HOME/vcslinks/config`` (default to
+``~/.config/vcslinks/config``) which uses the Git configuration syntax::
+
+    [vcslinks "gitlab.example.com"]
+        provider = gitlab
+    [vcslinks ".corp.example.com"]
+        provider = github
+
+A host pattern starting with ``.`` (or ``*.``) matches all its
+subdomains.  Hosts without any rule fall back to the hosts registered
+by the providers (e.g., ``github.com``; see `vcslinks.providers`) and
+then to guessing from the host name (e.g., ``gitlab.example.org`` is a
+GitLab instance).
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Sequence, Tuple
+
+from .gitconfig import GitConfig, UnsupportedConfigError, parse_config, stat_token
+from .providers import GENERIC, provider_for_host
+
+if TYPE_CHECKING:
+    from typing import Final
+
+# Provider names guessed from host names when no rule matches, in
+# the order of preference:
+HEURISTIC_PROVIDERS: "Final[Sequence[str]]" = ("gitlab", "github", "bitbucket")
+
+# Providers whose remote URLs are preferred, in this order, when a
+# remote has several URLs; URLs of other known providers come next:
+URL_PREFERENCE: "Final[Sequence[str]]" = ("gitlab", "github", "bitbucket")
+
+Rule = Tuple[str, str]
+
+
+def normalize_host(host: str) -> str:
+    """
+    Strip user information and port from `host`.
+
+    >>> normalize_host("git@GitLab.Example.com:2222")
+    'gitlab.example.com'
+    """
+    host = host.rpartition("@")[2]
+    if host.startswith("["):
+        return host[1 : host.find("]")].lower()
+    return host.partition(":")[0].lower()
+
+
+def remote_host(url: str) -> Optional[str]:
+    """
+    Extract the host name from a Git remote `url`.
+
+    >>> remote_host("git@github.com:USER/PROJECT.git")
+    'github.com'
+    >>> remote_host("https://user@Example.com:8443/USER/PROJECT")
+    'example.com'
+    >>> remote_host("/local/path") is None
+    True
+    """
+    if "://" in url:
+        scheme, _, rest = url.partition("://")
+        if scheme == "file":
+            return None
+        return normalize_host(rest.split("/", 1)[0]) or None
+    host, sep, _ = url.partition(":")
+    if not sep or "/" in host:
+        return None  # local path
+    return normalize_host(host) or None
+
+
+class HostRules:
+    """
+    Index of host rules.
+
+    Exact hosts are looked up in a dictionary and subdomain rules in a
+    dictionary keyed by domain suffix, so classifying a host costs one
+    lookup per label of the host, independent of the number of rules.
+    Hosts not covered by the rules are classified by
+    `vcslinks.providers.provider_for_host` and then by `heuristic`
+    guessing.
+
+    >>> rules = HostRules([("git.example.com", "gitlab"), (".corp.com", "github")])
+    >>> rules.classify("git.example.com")
+    'gitlab'
+    >>> rules.classify("ghe.corp.com")
+    'github'
+    >>> rules.classify("bitbucket.org")
+    'bitbucket'
+    >>> rules.classify("gitlab.example.org")
+    'gitlab'
+    >>> rules.classify("example.org") is None
+    True
+    """
+
+    def __init__(self, rules: Iterable[Rule] = (), heuristic: bool = True):
+        self._exact: Dict[str, str] = {}
+        self._suffix: Dict[str, str] = {}
+        self.heuristic = heuristic
+        self.update(rules)
+
+    def update(self, rules: Iterable[Rule]) -> None:
+        """
+        Add `rules`; later rules take precedence.
+        """
+        for pattern, provider in rules:
+            pattern = pattern.lower()
+            if pattern.startswith("*."):
+                pattern = pattern[1:]
+            if pattern.startswith("."):
+                self._suffix[pattern] = provider
+            else:
+                self._exact[pattern] = provider
+
+    def copy(self) -> "HostRules":
+        new = HostRules(heuristic=self.heuristic)
+        new._exact = dict(self._exact)
+        new._suffix = dict(self._suffix)
+        return new
+
+    def __len__(self) -> int:
+        return len(self._exact) + len(self._suffix)
+
+    def classify(self, host: str) -> Optional[str]:
+        """
+        Return the provider name for `host` or `None` if unknown.
+        """
+        host = normalize_host(host)
+        try:
+            return self._exact[host]
+        except KeyError:
+            pass
+        if self._suffix:
+            i = host.find(".")
+            while i >= 0:
+                provider = self._suffix.get(host[i:])
+                if provider is not None:
+                    return provider
+                i = host.find(".", i + 1)
+        known = provider_for_host(host)
+        if known is not GENERIC:
+            return known.name
+        if self.heuristic:
+            for name in HEURISTIC_PROVIDERS:
+                if name in host:
+                    return name
+        return None
+
+    def classify_url(self, url: str) -> Optional[str]:
+        host = remote_host(url)
+        return None if host is None else self.classify(host)
+
+    def choose_url(self, urls: Sequence[str]) -> str:
+        """
+        Choose the URL of the preferred provider among `urls` (see
+        `URL_PREFERENCE`), or the first one if none is known.
+
+        >>> HostRules().choose_url(["https://example.org/x",
+        ...                         "git@github.com:x", "git@gitlab.com:x"])
+        'git@gitlab.com:x'
+        """
+        providers = [self.classify_url(url) for url in urls]
+        for name in URL_PREFERENCE:
+            for url, provider in zip(urls, providers):
+                if provider == name:
+                    return url
+        for url, provider in zip(urls, providers):
+            if provider is not None:
+                return url
+        return urls[0]
+
+
+def user_config_path(environ=os.environ) -> Optional[Path]:
+    xdg = environ.get("XDG_CONFIG_HOME")
+    if xdg:
+        return Path(xdg) / "vcslinks" / "config"
+    home = environ.get("HOME")
+    if home:
+        return Path(home) / ".config" / "vcslinks" / "config"
+    return None
+
+
+def config_rules(config: GitConfig) -> Tuple[Rule, ...]:
+    """
+    Extract ``vcslinks.<host>.provider`` entries from `config`.
+    """
+    return tuple(config.subsection_values("vcslinks", "provider").items())
+
+
+def read_rules_file(path: Path) -> Tuple[Rule, ...]:
+    try:
+        text = path.read_bytes().decode("utf-8", "surrogateescape")
+    except OSError:
+        return ()
+    config = GitConfig()
+    try:
+        for key, value in parse_config(text, str(path)):
+            config.add(key, value)
+    except UnsupportedConfigError:
+        return ()
+    return config_rules(config)
+
+
+class RuleTable:
+    """
+    Host rules shared by all repositories.
+
+    The user configuration file is re-read when it changes, which bumps
+    `generation`.  Rules of each repository's Git configuration are
+    layered on top of it and memoized, so repositories with the same
+    rules share an index.
+    """
+
+    def __init__(self, environ=os.environ):
+        self.environ = environ
+        self._lock = threading.Lock()
+        self._token: Optional[Tuple] = None
+        self._base = HostRules()
+        self._layers: Dict[Tuple[Rule, ...], HostRules] = {}
+        self.generation = 0
+
+    def current_token(self) -> Optional[Tuple]:
+        """
+        Fingerprint of the user configuration file.
+        """
+        path = user_config_path(self.environ)
+        return None if path is None else stat_token(path)
+
+    def base(self) -> HostRules:
+        path = user_config_path(self.environ)
+        token = None if path is None else stat_token(path)
+        with self._lock:
+            if token != self._token:
+                self._base = HostRules(() if path is None else read_rules_file(path))
+                self._layers.clear()
+                self._token = token
+                self.generation += 1
+            return self._base
+
+    def for_config(self, config: Optional[GitConfig]) -> HostRules:
+        """
+        Rules effective in a repository with `config`.
+        """
+        base = self.base()
+        extra = () if config is None else config_rules(config)
+        if not extra:
+            return base
+        with self._lock:
+            rules = self._layers.get(extra)
+            if rules is None:
+                rules = self._layers[extra] = base.copy()
+                rules.update(extra)
+            return rules
+
+
+default_table = RuleTable()
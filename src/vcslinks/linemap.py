@@ -0,0 +1,210 @@
+"""
+Map line numbers in a modified working tree file to a committed blob.
+
+Links pinned to a commit (permalinks) must point at the lines as they
+are in the commit, not as they are in a file with uncommitted edits.
+"""
+
+import difflib
+import hashlib
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Hashable, List, Optional, Tuple
+
+from .base import ApplicationError
+
+if TYPE_CHECKING:
+    from typing import Final
+
+    from .weburl import LinesSpecifier
+
+DEFAULT_MAXSIZE: "Final[int]" = 128
+
+
+class UncommittedLinesError(ApplicationError):
+    def __init__(self, path: str, lines: "LinesSpecifier", revision: str):
+        self.path = path
+        self.lines = lines
+        self.revision = revision
+
+    def __str__(self) -> str:
+        if isinstance(self.lines, tuple):
+            what = "Lines {}-{}".format(*self.lines)
+        else:
+            what = f"Line {self.lines}"
+        return (
+            f"{what} of {self.path} do not exist in {self.revision}"
+            " (they are changed in the working tree)."
+        )
+
+
+def blob_id(data: bytes, hexsz: int = 40) -> str:
+    """
+    Compute the object ID Git assigns to a blob with content `data`.
+
+    >>> blob_id(b"hello\\n")
+    'ce013625030ba8dba906f756967f9e9ca394464a'
+    """
+    digest = hashlib.sha256() if hexsz == 64 else hashlib.sha1()
+    digest.update(b"blob %d\0" % len(data))
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def split_lines(data: bytes) -> List[bytes]:
+    """
+    Split `data` into lines as Git counts them, ignoring CR of CRLF.
+
+    >>> split_lines(b"a\\r\\nb\\nc")
+    [b'a', b'b', b'c']
+    """
+    lines = data.split(b"\n")
+    if lines[-1] == b"":
+        lines.pop()
+    return [line[:-1] if line.endswith(b"\r") else line for line in lines]
+
+
+class LineMap:
+    """
+    Mapping from line numbers of `new` to line numbers of `old`.
+
+    Only the part between the common prefix and suffix is diffed, so
+    a few local edits in a large file are cheap.
+
+    >>> linemap = LineMap([b"a", b"b", b"c"], [b"a", b"new", b"b", b"c"])
+    >>> [linemap.map_line(n) for n in range(1, 5)]
+    [1, None, 2, 3]
+    """
+
+    def __init__(self, old: List[bytes], new: List[bytes]):
+        limit = min(len(old), len(new))
+        prefix = 0
+        while prefix < limit and old[prefix] == new[prefix]:
+            prefix += 1
+        suffix = 0
+        while (
+            suffix < limit - prefix
+            and old[len(old) - 1 - suffix] == new[len(new) - 1 - suffix]
+        ):
+            suffix += 1
+        matcher = difflib.SequenceMatcher(
+            None,
+            old[prefix : len(old) - suffix],
+            new[prefix : len(new) - suffix],
+            autojunk=False,
+        )
+        # Matching blocks (old start, new start, size), 0-based:
+        blocks: List[Tuple[int, int, int]] = []
+        if prefix:
+            blocks.append((0, 0, prefix))
+        for a, b, size in matcher.get_matching_blocks():
+            if size:
+                blocks.append((prefix + a, prefix + b, size))
+        if suffix:
+            blocks.append((len(old) - suffix, len(new) - suffix, suffix))
+        self._blocks = blocks
+        self._starts = [b for _, b, _ in blocks]
+
+    def map_line(self, line: int) -> Optional[int]:
+        """
+        Map 1-based `line` of the new file or return `None` if it does
+        not exist in the old file.
+        """
+        i = bisect_right(self._starts, line - 1) - 1
+        if i < 0:
+            return None
+        a, b, size = self._blocks[i]
+        if line - 1 >= b + size:
+            return None
+        return a + (line - 1 - b) + 1
+
+    def map_lines(
+        self, lines: "LinesSpecifier", path: str, revision: str
+    ) -> "LinesSpecifier":
+        """
+        Map `lines` or raise `UncommittedLinesError` if the first or
+        the last line does not exist in the old file.
+        """
+        if not lines:
+            return lines
+        if isinstance(lines, tuple):
+            start, end = map(self.map_line, lines)
+            if start is None or end is None:
+                raise UncommittedLinesError(path, lines, revision)
+            return (start, end)
+        line = self.map_line(lines)
+        if line is None:
+            raise UncommittedLinesError(path, lines, revision)
+        return line
+
+
+class _LRU:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Hashable, object]" = OrderedDict()
+
+    def get(self, key: Hashable, default: object) -> object:
+        try:
+            self._items.move_to_end(key)
+        except KeyError:
+            return default
+        return self._items[key]
+
+    def put(self, key: Hashable, value: object) -> None:
+        self._items[key] = value
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+
+_MISSING = object()
+
+
+class LineMapCache:
+    """
+    Bounded caches of the blob of a path in a commit and of the
+    `LineMap` of a working tree file against a blob.
+
+    Line maps are keyed by the blob ID, the file path and its
+    modification time and size, so repeated links to a file that has
+    not changed since the last link do not diff it again.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE):
+        self._lock = threading.Lock()
+        self._blob_ids = _LRU(maxsize)
+        self._linemaps = _LRU(maxsize)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._blob_ids = _LRU(self._blob_ids.maxsize)
+            self._linemaps = _LRU(self._linemaps.maxsize)
+
+    def blob_id(
+        self, commit: str, relpath: str, compute: Callable[[], Optional[str]]
+    ) -> Optional[str]:
+        key = (commit, relpath)
+        with self._lock:
+            value = self._blob_ids.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            with self._lock:
+                self._blob_ids.put(key, value)
+        return value  # type: ignore
+
+    def linemap(
+        self, key: Tuple, compute: Callable[[], Optional[LineMap]]
+    ) -> Optional[LineMap]:
+        """
+        Get the `LineMap` for `key` (``None`` if the file is unchanged).
+        """
+        with self._lock:
+            value = self._linemaps.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            with self._lock:
+                self._linemaps.put(key, value)
+        return value  # type: ignore
+
+
+default_linemaps = LineMapCache()
@@ -0,0 +1,363 @@
+"""
+In-process lookup of object IDs in Git's object database.
+
+Pack indexes (``objects/pack/*.idx``) are memory-mapped and searched
+through their fan-out table, loose objects are found by listing their
+fan-out directory and alternate object directories are followed.
+This is enough to expand abbreviated object IDs and to find the
+shortest unambiguous abbreviation of an object ID without Git.
+"""
+
+import codecs
+import mmap
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Set, Tuple
+
+from .base import AmbiguousRevisionError, Pathish
+from .gitconfig import stat_token
+from .refs import is_hex
+
+if TYPE_CHECKING:
+    from typing import Final
+
+IDX_SIGNATURE: "Final[bytes]" = b"\377tOc"
+# Shortest abbreviation Git expands:
+MIN_ABBREV: "Final[int]" = 4
+# Shortest abbreviation Git prints with ``core.abbrev=auto``:
+DEFAULT_ABBREV: "Final[int]" = 7
+# See `link_alt_odb_entry` in Git's object-file.c:
+MAX_ALTERNATE_DEPTH: "Final[int]" = 5
+
+_U32 = struct.Struct(">I")
+
+
+class UnsupportedIndexError(Exception):
+    """
+    The file is not a pack index this module can read.
+    """
+
+
+def is_abbrev(text: str, hexsz: int = 40) -> bool:
+    """
+    Check if `text` can be an abbreviated object ID.
+
+    >>> is_abbrev("55150af")
+    True
+    >>> is_abbrev("abc")
+    False
+    """
+    return MIN_ABBREV <= len(text) < hexsz and is_hex(text)
+
+
+def common_prefix(a: str, b: str) -> int:
+    """
+    Length of the common prefix of `a` and `b`.
+
+    >>> common_prefix("55150af", "5515d")
+    4
+    """
+    n = min(len(a), len(b))
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+
+class PackIndex:
+    """
+    Memory-mapped pack index file (version 2 or the legacy version 1).
+
+    Object IDs are sorted, so looking up a prefix is a binary search
+    in the range given by the fan-out table for its first byte.
+    """
+
+    def __init__(self, path: Pathish, hexsz: int = 40):
+        self.path = Path(path)
+        self.hashsz = hexsz // 2
+        with open(str(self.path), "rb") as file:
+            self._mmap = mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse_header()
+        except Exception:
+            mm.close()
+            raise
+
+    def _parse_header(self) -> None:
+        mm = self._mmap
+        if mm[:4] == IDX_SIGNATURE:
+            if len(mm) < 8 or _U32.unpack_from(mm, 4)[0] != 2:
+                raise UnsupportedIndexError(f"{self.path}: unknown index version")
+            self._fanout = 8
+            self._oids = self._fanout + 256 * 4
+            self._stride = self.hashsz
+        else:
+            # Version 1: fan-out table, then (offset, object ID) pairs.
+            self._fanout = 0
+            self._oids = 256 * 4 + 4
+            self._stride = self.hashsz + 4
+        if len(mm) < self._oids:
+            raise UnsupportedIndexError(f"{self.path}: truncated index")
+        self.num_objects = self._u32(self._fanout + 255 * 4)
+        if len(mm) < self._oids + self.num_objects * self._stride:
+            raise UnsupportedIndexError(f"{self.path}: truncated index")
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __len__(self) -> int:
+        return self.num_objects
+
+    def _u32(self, offset: int) -> int:
+        return _U32.unpack_from(self._mmap, offset)[0]
+
+    def oid(self, position: int) -> str:
+        start = self._oids + position * self._stride
+        return self._mmap[start : start + self.hashsz].hex()
+
+    def _raw(self, position: int) -> bytes:
+        start = self._oids + position * self._stride
+        return self._mmap[start : start + self.hashsz]
+
+    def lower_bound(self, prefix: str) -> int:
+        """
+        Position of the first object ID not less than the hexadecimal
+        `prefix` (of at least two digits).
+        """
+        key = bytes.fromhex(prefix if len(prefix) % 2 == 0 else prefix + "0")
+        first = key[0]
+        lo = self._u32(self._fanout + (first - 1) * 4) if first else 0
+        hi = self._u32(self._fanout + first * 4)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._raw(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def iter_prefix(self, prefix: str) -> Iterator[str]:
+        """
+        Yield the object IDs starting with the lowercase `prefix`.
+        """
+        position = self.lower_bound(prefix)
+        while position < self.num_objects:
+            oid = self.oid(position)
+            if not oid.startswith(prefix):
+                break
+            yield oid
+            position += 1
+
+    def neighbors(self, oid: str) -> Iterator[str]:
+        """
+        Yield the object IDs sorted right before and after `oid`.
+        """
+        position = self.lower_bound(oid)
+        if position > 0:
+            yield self.oid(position - 1)
+        if position < self.num_objects and self.oid(position) == oid:
+            position += 1
+        if position < self.num_objects:
+            yield self.oid(position)
+
+
+def read_alternates(objects_dir: Path) -> List[Path]:
+    """
+    Read the alternate object directories listed in
+    ``info/alternates`` of `objects_dir`.
+    """
+    try:
+        with open(str(objects_dir / "info" / "alternates"), "rb") as file:
+            data = file.read()
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+    alternates = []
+    for line in data.splitlines():
+        if not line.strip() or line.startswith(b"#"):
+            continue
+        if line.startswith(b'"') and line.endswith(b'"'):
+            line = codecs.escape_decode(line[1:-1])[0]  # type: ignore
+        path = Path(os.fsdecode(line))
+        alternates.append(path if path.is_absolute() else objects_dir / path)
+    return alternates
+
+
+class ObjectDirectory:
+    """
+    Packed and loose objects of a single object directory.
+    """
+
+    def __init__(self, path: Pathish, hexsz: int = 40):
+        self.path = Path(path)
+        self.hexsz = hexsz
+        self._lock = threading.Lock()
+        self._token: Optional[Tuple] = None
+        self._packs: Dict[str, PackIndex] = {}
+
+    def packs(self) -> List[PackIndex]:
+        """
+        Indexes of the packs, rescanned when the pack directory changes.
+        """
+        pack_dir = self.path / "pack"
+        token = stat_token(pack_dir)
+        with self._lock:
+            if token != self._token:
+                self._token = token
+                self._packs = self._scan(pack_dir, self._packs)
+            return list(self._packs.values())
+
+    def _scan(self, pack_dir: Path, old: Dict[str, PackIndex]) -> Dict[str, PackIndex]:
+        try:
+            names = set(os.listdir(str(pack_dir)))
+        except OSError:
+            return {}
+        packs = {}
+        for name in sorted(names):
+            # Like Git, ignore indexes of packs that are gone:
+            if not (name.startswith("pack-") and name.endswith(".idx")):
+                continue
+            if name[: -len(".idx")] + ".pack" not in names:
+                continue
+            index = old.get(name)
+            if index is None:
+                try:
+                    index = PackIndex(pack_dir / name, self.hexsz)
+                except (OSError, ValueError, UnsupportedIndexError):
+                    continue
+            packs[name] = index
+        return packs
+
+    def loose(self, prefix: str) -> List[str]:
+        """
+        Object IDs of the loose objects starting with the lowercase
+        `prefix` (of at least two digits).
+        """
+        try:
+            names = os.listdir(str(self.path / prefix[:2]))
+        except OSError:
+            return []
+        rest = prefix[2:]
+        size = self.hexsz - 2
+        return [
+            prefix[:2] + name
+            for name in names
+            if len(name) == size and name.startswith(rest) and is_hex(name)
+        ]
+
+
+class ObjectDatabase:
+    """
+    Object IDs of a repository: its object directory and the alternates.
+    """
+
+    def __init__(self, objects_dir: Pathish, hexsz: int = 40):
+        self.path = Path(objects_dir)
+        self.hexsz = hexsz
+        self._lock = threading.Lock()
+        self._token: Optional[Tuple] = None
+        self._directories: List[ObjectDirectory] = []
+
+    def directories(self) -> List[ObjectDirectory]:
+        """
+        The object directory followed by its alternates, reread when
+        an ``info/alternates`` file changes.
+        """
+        with self._lock:
+            if self._token is None or self._alternates_token() != self._token:
+                old = {str(d.path): d for d in self._directories}
+                self._directories = [
+                    old.get(str(path)) or ObjectDirectory(path, self.hexsz)
+                    for path in self._walk_alternates()
+                ]
+                self._token = self._alternates_token()
+            return self._directories
+
+    def _alternates_token(self) -> Tuple:
+        paths = [d.path for d in self._directories] or [self.path]
+        return tuple(stat_token(path / "info" / "alternates") for path in paths)
+
+    def _walk_alternates(self) -> List[Path]:
+        paths: List[Path] = []
+        seen: Set[str] = set()
+
+        def visit(path: Path, depth: int) -> None:
+            key = os.path.realpath(str(path))
+            if key in seen or not path.is_dir():
+                return
+            seen.add(key)
+            paths.append(path)
+            if depth < MAX_ALTERNATE_DEPTH:
+                for alternate in read_alternates(path):
+                    visit(alternate, depth + 1)
+
+        visit(self.path, 0)
+        return paths
+
+    def find(self, prefix: str, limit: Optional[int] = 2) -> List[str]:
+        """
+        Sorted object IDs starting with `prefix` (at most `limit`).
+        """
+        prefix = prefix.lower()
+        found: Set[str] = set()
+        for directory in self.directories():
+            for index in directory.packs():
+                for oid in index.iter_prefix(prefix):
+                    found.add(oid)
+                    if limit is not None and len(found) >= limit:
+                        return sorted(found)
+            found.update(directory.loose(prefix))
+            if limit is not None and len(found) >= limit:
+                return sorted(found)[:limit]
+        return sorted(found)
+
+    def contains(self, oid: str) -> bool:
+        return bool(self.find(oid, limit=1))
+
+    def expand(self, abbrev: str) -> Optional[str]:
+        """
+        Expand an abbreviated object ID or return `None` if no object
+        matches.  Raise `AmbiguousRevisionError` if more than one does.
+        """
+        if not is_abbrev(abbrev, self.hexsz):
+            raise ValueError(f"not an abbreviated object ID: {abbrev!r}")
+        found = self.find(abbrev)
+        if len(found) > 1:
+            raise AmbiguousRevisionError(abbrev, self.find(abbrev, limit=None))
+        return found[0] if found else None
+
+    def approximate_count(self) -> int:
+        """
+        Number of packed objects, as Git estimates the object count.
+        """
+        directories = self.directories()
+        return sum(len(index) for d in directories for index in d.packs())
+
+    def auto_abbrev(self) -> int:
+        """
+        Abbreviation length of ``core.abbrev=auto``: enough digits to
+        expect no collision among the objects, but at least 7.
+        """
+        bits = self.approximate_count().bit_length()
+        return max(DEFAULT_ABBREV, (bits + 1) // 2)
+
+    def abbreviate(self, oid: str, minimum: Optional[int] = None) -> str:
+        """
+        Shorten `oid` to the shortest prefix, not shorter than `minimum`
+        (default to `auto_abbrev`), that no other object starts with.
+        """
+        oid = oid.lower()
+        if minimum is None:
+            minimum = self.auto_abbrev()
+        if minimum >= self.hexsz:
+            return oid
+        longest = 0
+        for directory in self.directories():
+            for index in directory.packs():
+                for other in index.neighbors(oid):
+                    longest = max(longest, common_prefix(oid, other))
+            for other in directory.loose(oid[:2]):
+                if other != oid:
+                    longest = max(longest, common_prefix(oid, other))
+        return oid[: max(minimum, longest + 1)]
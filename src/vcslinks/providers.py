@@ -0,0 +1,311 @@
+"""
+URL layouts of the hosting services.
+
+A `Provider` builds URLs of the web pages from the root URL of a
+repository.  `WebURL` chooses its provider once (see `get_provider`)
+so that building a link does not re-inspect the root URL.
+
+Third-party providers can be added by `register_provider` or through
+the ``vcslinks.providers`` entry point group.  An entry point refers to
+a `Provider` subclass (or instance) whose `Provider.hosts` lists the
+host names it serves::
+
+    [options.entry_points]
+    vcslinks.providers =
+        gitea = vcslinks_gitea:GiteaProvider
+"""
+
+import re
+import warnings
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    from typing import Final
+
+    from .hostrules import HostRules
+    from .weburl import LinesSpecifier
+
+ENTRY_POINT_GROUP: "Final[str]" = "vcslinks.providers"
+
+
+def _nums(lines: "LinesSpecifier") -> Union[Tuple[int], Tuple[int, int]]:
+    assert lines
+    return lines if isinstance(lines, tuple) else (lines,)
+
+
+class Provider:
+    """
+    URL layout shared by GitHub and the services mimicking it.
+
+    This base class is used as-is for unknown hosts.
+    """
+
+    name = "generic"
+    hosts: Tuple[str, ...] = ()
+
+    def specialize(self, rooturl: str) -> "Provider":
+        """
+        Return the provider for a particular `rooturl` of this host.
+        """
+        return self
+
+    def webroot(self, rooturl: str) -> str:
+        """
+        Map `rooturl` derived from the remote URL to the web page root.
+        """
+        return rooturl
+
+    def pull_request(self, rooturl: str, branch: str) -> Optional[str]:
+        return None
+
+    def commit(self, rooturl: str, oid: str) -> str:
+        return f"{rooturl}/commit/{oid}"
+
+    def log(self, rooturl: str, branch: str) -> str:
+        return f"{rooturl}/commits/{branch}"
+
+    def lines(self, lines: "LinesSpecifier", relurl: str, blame: bool) -> str:
+        """
+        Format the fragment part (including ``#``) for `lines`.
+        """
+        if not lines:
+            return ""
+        return "#" + "-".join(f"L{x}" for x in _nums(lines))
+
+    def file(
+        self, rooturl: str, revision: str, relurl: str, lines: "LinesSpecifier"
+    ) -> str:
+        fragment = self.lines(lines, relurl, blame=False)
+        return f"{rooturl}/blob/{revision}/{relurl}{fragment}"
+
+    def tree(self, rooturl: str, revision: str, relurl: Optional[str]) -> str:
+        baseurl = f"{rooturl}/tree/{revision}"
+        return f"{baseurl}/{relurl}" if relurl else baseurl
+
+    def diff(self, rooturl: str, revision1: str, revision2: str) -> str:
+        return f"{rooturl}/compare/{revision1}...{revision2}"
+
+    def blame(
+        self, rooturl: str, revision: str, relurl: str, lines: "LinesSpecifier"
+    ) -> str:
+        fragment = self.lines(lines, relurl, blame=True)
+        return f"{rooturl}/blame/{revision}/{relurl}{fragment}"
+
+
+class GitHub(Provider):
+    name = "github"
+    hosts: Tuple[str, ...] = ("github.com",)
+
+    def pull_request(self, rooturl: str, branch: str) -> Optional[str]:
+        # https://github.com/{user}/{repo}/pull/new/{branch}
+        return f"{rooturl}/pull/new/{branch}"
+
+
+class GitLab(Provider):
+    name = "gitlab"
+    hosts: Tuple[str, ...] = ("gitlab.com",)
+
+    def specialize(self, rooturl: str) -> Provider:
+        if WIKI_RE.search(rooturl):
+            return GITLAB_WIKI
+        return self
+
+    def webroot(self, rooturl: str) -> str:
+        # A wiki is cloned from `{repo}.wiki.git` but browsed at `{repo}/wikis`:
+        if rooturl.endswith(".wiki"):
+            return rooturl[: -len(".wiki")] + "/wikis"
+        return rooturl
+
+    def pull_request(self, rooturl: str, branch: str) -> Optional[str]:
+        # https://gitlab.com/{user}/{repo}/merge_requests/new?merge_request%5Bsource_branch%5D={dev}
+        query = f"merge_request%5Bsource_branch%5D={branch}"
+        return f"{rooturl}/merge_requests/new?{query}"
+
+    def lines(self, lines: "LinesSpecifier", relurl: str, blame: bool) -> str:
+        if not lines:
+            return ""
+        return "#L" + "-".join(map(str, _nums(lines)))
+
+
+WIKI_RE = re.compile(r"//[^/]+/[^/]+/[^/]+/wikis")
+
+
+class GitLabWiki(GitLab):
+    name = "gitlab-wiki"
+    hosts: Tuple[str, ...] = ()
+
+    def specialize(self, rooturl: str) -> Provider:
+        return self
+
+    def file(
+        self, rooturl: str, revision: str, relurl: str, lines: "LinesSpecifier"
+    ) -> str:
+        # TODO: handle `lines`?
+        if relurl.endswith(".md"):
+            relurl = relurl[: -len(".md")]
+        if revision == "master":
+            return f"{rooturl}/{relurl}"
+        else:
+            return f"{rooturl}/{relurl}?version_id={revision}"
+
+
+class Bitbucket(Provider):
+    name = "bitbucket"
+    hosts: Tuple[str, ...] = ("bitbucket.org",)
+
+    def pull_request(self, rooturl: str, branch: str) -> Optional[str]:
+        # https://bitbucket.org/{user}/{repo}/pull-requests/new?source={branch}
+        return f"{rooturl}/pull-requests/new?source={branch}"
+
+    def commit(self, rooturl: str, oid: str) -> str:
+        return f"{rooturl}/commits/{oid}"
+
+    def log(self, rooturl: str, branch: str) -> str:
+        return f"{rooturl}/commits/branch/{branch}"
+
+    def lines(self, lines: "LinesSpecifier", relurl: str, blame: bool) -> str:
+        if not lines:
+            return ""
+        prefix = relurl if blame else "lines"
+        return f"#{prefix}-" + ":".join(map(str, _nums(lines)))
+
+    def file(
+        self, rooturl: str, revision: str, relurl: str, lines: "LinesSpecifier"
+    ) -> str:
+        fragment = self.lines(lines, relurl, blame=False)
+        return f"{rooturl}/src/{revision}/{relurl}{fragment}"
+
+    def tree(self, rooturl: str, revision: str, relurl: Optional[str]) -> str:
+        baseurl = f"{rooturl}/src/{revision}"
+        return f"{baseurl}/{relurl}" if relurl else baseurl
+
+    def diff(self, rooturl: str, revision1: str, revision2: str) -> str:
+        return f"{rooturl}/branches/compare/{revision2}%0D{revision1}#diff"
+
+    def blame(
+        self, rooturl: str, revision: str, relurl: str, lines: "LinesSpecifier"
+    ) -> str:
+        fragment = self.lines(lines, relurl, blame=True)
+        return f"{rooturl}/annotate/{revision}/{relurl}{fragment}"
+
+
+GENERIC = Provider()
+GITLAB_WIKI = GitLabWiki()
+
+_by_name: Dict[str, Provider] = {}
+_by_host: Dict[str, Provider] = {}
+_entry_points_loaded = False
+
+
+def register_provider(
+    provider: Union[Provider, type], hosts: Optional[Iterable[str]] = None
+) -> Provider:
+    """
+    Register `provider` under its name and for `hosts` (default to
+    `Provider.hosts`).  A `Provider` subclass is instantiated.
+    """
+    if isinstance(provider, type):
+        provider = provider()
+    assert isinstance(provider, Provider)
+    _by_name[provider.name] = provider
+    for host in provider.hosts if hosts is None else hosts:
+        _by_host[host.lower()] = provider
+    return provider
+
+
+for _provider in (GENERIC, GitHub, GitLab, GITLAB_WIKI, Bitbucket):
+    register_provider(_provider)
+del _provider
+
+
+def _iter_entry_points():
+    try:
+        from importlib import metadata  # type: ignore
+    except ImportError:  # Python < 3.8
+        try:
+            import importlib_metadata as metadata  # type: ignore
+        except ImportError:
+            return
+    eps = metadata.entry_points()
+    if hasattr(eps, "select"):
+        yield from eps.select(group=ENTRY_POINT_GROUP)
+    else:
+        yield from eps.get(ENTRY_POINT_GROUP, ())
+
+
+def load_entry_points() -> bool:
+    """
+    Register providers from the entry points (only once).  Return
+    `True` if this call loaded them.
+    """
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return False
+    _entry_points_loaded = True
+    for entry_point in _iter_entry_points():
+        try:
+            provider = entry_point.load()
+        except Exception as err:
+            # A broken plugin must not break links to the other hosts:
+            warnings.warn(
+                f"Failed to load provider {entry_point.name!r}: {err}", stacklevel=2
+            )
+            continue
+        register_provider(provider)
+    return True
+
+
+def provider_by_name(name: str) -> Optional[Provider]:
+    try:
+        return _by_name[name]
+    except KeyError:
+        if load_entry_points():
+            return _by_name.get(name)
+        return None
+
+
+def provider_for_host(host: str) -> Provider:
+    """
+    Look up the provider of `host`; `GENERIC` if unknown.
+
+    >>> provider_for_host("github.com").name
+    'github'
+    >>> provider_for_host("example.com").name
+    'generic'
+    """
+    host = host.lower()
+    try:
+        return _by_host[host]
+    except KeyError:
+        if load_entry_points():
+            return _by_host.get(host, GENERIC)
+        return GENERIC
+
+
+def urlhost(rooturl: str) -> str:
+    """
+    >>> urlhost("https://github.com/USER/PROJECT")
+    'github.com'
+    """
+    return rooturl.split("://", 1)[-1].split("/", 1)[0]
+
+
+def get_provider(rooturl: str, rules: "Optional[HostRules]" = None) -> Provider:
+    """
+    Choose the provider for `rooturl`, consulting host `rules` (see
+    `vcslinks.hostrules`) if given.
+
+    >>> get_provider("https://gitlab.com/USER/PROJECT").name
+    'gitlab'
+    >>> get_provider("https://gitlab.com/USER/PROJECT/wikis").name
+    'gitlab-wiki'
+    """
+    host = urlhost(rooturl)
+    provider = None
+    if rules is not None:
+        name = rules.classify(host)
+        if name is not None:
+            provider = provider_by_name(name)
+    if provider is None:
+        provider = provider_for_host(host)
+    return provider.specialize(rooturl)
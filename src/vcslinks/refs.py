@@ -0,0 +1,408 @@
+"""
+In-process resolution of Git references.
+"""
+
+import mmap
+import os
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, Optional, Sequence, Tuple
+
+from .base import Pathish
+
+if TYPE_CHECKING:
+    from typing import Final
+
+# See `ref_rev_parse_rules` in Git's refs.c:
+DWIM_RULES: "Final[Sequence[str]]" = (
+    "{}",
+    "refs/{}",
+    "refs/tags/{}",
+    "refs/heads/{}",
+    "refs/remotes/{}",
+    "refs/remotes/{}/HEAD",
+)
+
+MAX_SYMREF_DEPTH: "Final[int]" = 5
+
+PER_WORKTREE_PREFIXES: "Final[Tuple[str, ...]]" = (
+    "refs/bisect/",
+    "refs/worktree/",
+    "refs/rewritten/",
+)
+
+PSEUDOREF_RE = re.compile(r"[A-Z_]+\Z")
+SIMPLE_REFNAME_RE = re.compile(r"[^\x00-\x20\x7f~^:?*\[\\]+\Z")
+HEX_RE = re.compile(r"[0-9a-fA-F]+\Z")
+
+
+def is_simple_refname(name: str) -> bool:
+    """
+    Check if `name` can be looked up without Git's revision syntax.
+
+    >>> is_simple_refname("feature/x")
+    True
+    >>> is_simple_refname("HEAD~2")
+    False
+    >>> is_simple_refname("@{u}")
+    False
+    """
+    return bool(
+        SIMPLE_REFNAME_RE.match(name)
+        and ".." not in name
+        and "@{" not in name
+        and "//" not in name
+        and name != "@"
+        and not name.startswith(("/", "-", "."))
+        and not name.endswith(("/", ".", ".lock"))
+    )
+
+
+def is_toplevel_refname(name: str) -> bool:
+    return name.startswith("refs/") or bool(PSEUDOREF_RE.match(name))
+
+
+def is_per_worktree(name: str) -> bool:
+    """
+    Check if the ref `name` is stored per worktree rather than shared.
+
+    >>> is_per_worktree("HEAD"), is_per_worktree("refs/bisect/bad")
+    (True, True)
+    >>> is_per_worktree("refs/heads/master")
+    False
+    """
+    return "/" not in name or name.startswith(PER_WORKTREE_PREFIXES)
+
+
+def is_hex(text: str, length: Optional[int] = None) -> bool:
+    return bool(HEX_RE.match(text)) and (length is None or len(text) == length)
+
+
+class PackedRefs:
+    """
+    Lookup table backed by a memory-mapped ``packed-refs`` file.
+
+    Files written by ``git pack-refs`` are sorted by refname so that a
+    lookup is a binary search over the mapped bytes.  Files without
+    the ``sorted`` trait are parsed into a dictionary instead.
+    """
+
+    def __init__(self, path: Pathish, hexsz: int = 40):
+        self.path = Path(path)
+        self.hexsz = hexsz
+        self._stat: Optional[Tuple[int, int, int]] = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._start = 0
+        self._table: Optional[Dict[bytes, Tuple[bytes, Optional[bytes]]]] = None
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+        self._mmap = None
+        self._table = None
+        self._stat = None
+
+    def _refresh(self) -> None:
+        try:
+            st = os.stat(str(self.path))
+        except FileNotFoundError:
+            self.close()
+            return
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if key == self._stat:
+            return
+        self.close()
+        self._stat = key
+        if st.st_size == 0:
+            self._table = {}
+            return
+        with open(str(self.path), "rb") as file:
+            mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._start = 0
+        sorted_ = False
+        if mm[:1] == b"#":
+            end = mm.find(b"\n")
+            header = mm[: len(mm) if end < 0 else end]
+            sorted_ = b"sorted" in header.split(b":", 1)[-1].split()
+            self._start = len(mm) if end < 0 else end + 1
+        if sorted_:
+            self._mmap = mm
+        else:
+            self._table = self._parse(mm[self._start :])
+            mm.close()
+
+    def _parse(self, data: bytes) -> Dict[bytes, Tuple[bytes, Optional[bytes]]]:
+        table: Dict[bytes, Tuple[bytes, Optional[bytes]]] = {}
+        last: Optional[bytes] = None
+        for line in data.splitlines():
+            if line.startswith(b"^"):
+                if last is not None:
+                    table[last] = (table[last][0], line[1:])
+            elif line and not line.startswith(b"#"):
+                oid, name = line.split(b" ", 1)
+                table[name] = (oid, None)
+                last = name
+        return table
+
+    def _search(self, name: bytes) -> Optional[Tuple[bytes, Optional[bytes]]]:
+        mm = self._mmap
+        assert mm is not None
+        hexsz = self.hexsz
+        size = len(mm)
+        lo = self._start
+        hi = size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            line_start = max(lo, mm.rfind(b"\n", lo, mid) + 1)
+            if mm[line_start : line_start + 1] == b"^":
+                # A peeled line always follows its record:
+                line_start = max(lo, mm.rfind(b"\n", lo, line_start - 1) + 1)
+            line_end = mm.find(b"\n", line_start)
+            if line_end < 0:
+                line_end = size
+            current = mm[line_start + hexsz + 1 : line_end]
+            next_start = line_end + 1
+            peeled = None
+            if mm[next_start : next_start + 1] == b"^":
+                peeled_end = mm.find(b"\n", next_start)
+                if peeled_end < 0:
+                    peeled_end = size
+                peeled = mm[next_start + 1 : peeled_end]
+                next_start = peeled_end + 1
+            if current == name:
+                return (mm[line_start : line_start + hexsz], peeled)
+            elif current < name:
+                lo = next_start
+            else:
+                hi = line_start
+        return None
+
+    def _lower_bound(self, name: bytes) -> int:
+        # Offset of the first record whose refname is not less than `name`.
+        mm = self._mmap
+        assert mm is not None
+        hexsz = self.hexsz
+        size = len(mm)
+        lo = self._start
+        hi = size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            line_start = max(lo, mm.rfind(b"\n", lo, mid) + 1)
+            if mm[line_start : line_start + 1] == b"^":
+                line_start = max(lo, mm.rfind(b"\n", lo, line_start - 1) + 1)
+            line_end = mm.find(b"\n", line_start)
+            if line_end < 0:
+                line_end = size
+            if mm[line_start + hexsz + 1 : line_end] < name:
+                lo = line_end + 1
+                if mm[lo : lo + 1] == b"^":
+                    peeled_end = mm.find(b"\n", lo)
+                    lo = size if peeled_end < 0 else peeled_end + 1
+            else:
+                hi = line_start
+        return lo
+
+    def iter_prefix(self, prefix: str) -> Iterator[Tuple[str, str]]:
+        """
+        Yield pairs of refname and object ID of the refs starting with
+        `prefix`, in refname order.
+        """
+        self._refresh()
+        key = prefix.encode("utf-8", "surrogateescape")
+        if self._mmap is not None:
+            mm = self._mmap
+            hexsz = self.hexsz
+            size = len(mm)
+            pos = self._lower_bound(key)
+            records = []
+            while pos < size:
+                line_end = mm.find(b"\n", pos)
+                if line_end < 0:
+                    line_end = size
+                if mm[pos : pos + 1] != b"^":
+                    name = mm[pos + hexsz + 1 : line_end]
+                    if not name.startswith(key):
+                        break
+                    records.append((name, mm[pos : pos + hexsz]))
+                pos = line_end + 1
+        elif self._table is not None:
+            records = sorted(
+                (name, oid)
+                for name, (oid, _) in self._table.items()
+                if name.startswith(key)
+            )
+        else:
+            records = []
+        for name, oid in records:
+            yield (name.decode("utf-8", "surrogateescape"), oid.decode("ascii"))
+
+    def lookup(self, name: str) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Find `name` and return a pair of its object ID and the peeled
+        object ID (if recorded).
+        """
+        self._refresh()
+        key = name.encode("utf-8", "surrogateescape")
+        if self._mmap is not None:
+            found = self._search(key)
+        elif self._table is not None:
+            found = self._table.get(key)
+        else:
+            found = None
+        if found is None:
+            return None
+        oid, peeled = found
+        return (oid.decode("ascii"), peeled.decode("ascii") if peeled else None)
+
+
+class UnreadableRefsError(Exception):
+    """
+    The refs cannot be read without Git (e.g., a corrupt table).
+    """
+
+
+class RefStore:
+    """
+    Reader for the "files" reference backend: ``HEAD``, symbolic refs,
+    loose refs and ``packed-refs``.
+
+    Methods return `None` whenever the answer cannot be determined
+    without running Git.  Backends which cannot tell a missing ref from
+    an unreadable one raise `UnreadableRefsError` instead.
+    """
+
+    def __init__(
+        self, git_dir: Pathish, common_dir: Optional[Pathish] = None, hexsz: int = 40
+    ):
+        self.git_dir = Path(git_dir)
+        self.common_dir = Path(common_dir or git_dir)
+        self.hexsz = hexsz
+        self.packed = PackedRefs(self.common_dir / "packed-refs", hexsz=hexsz)
+
+    def _ref_path(self, name: str) -> Path:
+        if is_per_worktree(name):
+            return self.git_dir / name
+        return self.common_dir / name
+
+    def read_raw(self, name: str) -> Optional[str]:
+        """
+        Read the raw content of a ref: an object ID or ``ref: <target>``.
+        """
+        try:
+            with open(str(self._ref_path(name)), "rb") as file:
+                content = file.read(4096)
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            content = None
+        if content is not None:
+            text = content.decode("utf-8", "surrogateescape")
+            if text.startswith("ref:"):
+                return "ref: " + text[len("ref:") :].strip()
+            oid = text[: self.hexsz]
+            if is_hex(oid, self.hexsz):
+                return oid.lower()
+            return None
+        if name.startswith("refs/"):
+            found = self.packed.lookup(name)
+            if found is not None:
+                return found[0]
+        return None
+
+    def read_ref(self, name: str) -> Optional[str]:
+        """
+        Resolve a full refname (following symbolic refs) to an object ID.
+        """
+        for _ in range(MAX_SYMREF_DEPTH):
+            raw = self.read_raw(name)
+            if raw is None or not raw.startswith("ref: "):
+                return raw
+            name = raw[len("ref: ") :]
+        return None
+
+    def peel(self, name: str) -> Optional[str]:
+        """
+        Return the peeled object ID of an annotated tag recorded in
+        ``packed-refs`` or `None`.
+        """
+        found = self.packed.lookup(name)
+        if found is None:
+            return None
+        return found[1]
+
+    def symbolic_target(self, name: str = "HEAD") -> Optional[str]:
+        raw = self.read_raw(name)
+        if raw is None or not raw.startswith("ref: "):
+            return None
+        return raw[len("ref: ") :]
+
+    def exists(self, name: str) -> bool:
+        return self.read_ref(name) is not None
+
+    def dwim(self, name: str) -> Optional[Tuple[str, str]]:
+        """
+        Expand a short `name` like Git does and return a pair of the
+        full refname and its object ID.
+        """
+        for rule in DWIM_RULES:
+            refname = rule.format(name)
+            if rule == "{}" and not is_toplevel_refname(name):
+                continue
+            oid = self.read_ref(refname)
+            if oid is not None:
+                return (refname, oid)
+        return None
+
+    def resolve(self, revision: str) -> Optional[str]:
+        """
+        Resolve a branch, tag, full refname or full object ID.
+        """
+        if is_hex(revision, self.hexsz):
+            return revision.lower()
+        if not is_simple_refname(revision):
+            return None
+        found = self.dwim(revision)
+        if found is None:
+            return None
+        return found[1]
+
+    def iter_refs(self, prefix: str) -> Iterator[Tuple[str, str]]:
+        """
+        Yield pairs of refname and object ID of the refs under the
+        directory `prefix` (e.g., ``refs/remotes/origin/``), loose refs
+        taking precedence over packed ones.  Symbolic refs are skipped.
+        """
+        assert prefix.endswith("/")
+        refs = dict(self.packed.iter_prefix(prefix))
+        root = self._ref_path(prefix + "x").parent
+        for dirpath, _, filenames in os.walk(str(root)):
+            for filename in filenames:
+                path = Path(dirpath) / filename
+                name = prefix + path.relative_to(root).as_posix()
+                raw = self.read_raw(name)
+                if raw is None:
+                    continue
+                if raw.startswith("ref: "):
+                    refs.pop(name, None)
+                else:
+                    refs[name] = raw
+        return iter(sorted(refs.items()))
+
+    def current_branch(self) -> Optional[str]:
+        """
+        Emulate ``git rev-parse --abbrev-ref HEAD``.
+        """
+        target = self.symbolic_target("HEAD")
+        if target is None:
+            return "HEAD" if self.read_ref("HEAD") is not None else None
+        if not target.startswith("refs/heads/") or self.read_ref(target) is None:
+            return None
+        branch = target[len("refs/heads/") :]
+        for rule in DWIM_RULES:
+            refname = rule.format(branch)
+            if refname == target:
+                continue
+            if rule == "{}" and not is_toplevel_refname(branch):
+                continue
+            if self.exists(refname):
+                # Git would print an unambiguous form like `heads/x`.
+                return None
+        return branch
@@ -0,0 +1,451 @@
+"""
+In-process reader for the "reftable" reference backend.
+
+A repository with ``extensions.refStorage = reftable`` keeps its refs
+in a stack of immutable tables listed, oldest first, in
+``reftable/tables.list``.  Each table is memory-mapped.  Its ref
+blocks are located through the ref index (when the table has one) and
+searched by bisecting their restart points, so that a lookup costs
+O(log n) per table.  Newer tables shadow older ones, including with
+deletion records.
+
+See Git's ``Documentation/technical/reftable.txt`` for the format.
+"""
+
+import heapq
+import mmap
+import os
+import zlib
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .base import Pathish
+from .refs import RefStore, UnreadableRefsError, is_per_worktree
+
+if TYPE_CHECKING:
+    from typing import Final
+
+MAGIC: "Final[bytes]" = b"REFT"
+
+HEADER_SIZE: "Final[Dict[int, int]]" = {1: 24, 2: 28}
+FOOTER_SIZE: "Final[Dict[int, int]]" = {1: 68, 2: 72}
+HASH_IDS: "Final[Dict[bytes, int]]" = {b"sha1": 20, b"s256": 32}
+
+BLOCK_REF: "Final[int]" = ord("r")
+BLOCK_INDEX: "Final[int]" = ord("i")
+
+VALUE_DELETION: "Final[int]" = 0
+VALUE_OID: "Final[int]" = 1
+VALUE_PEELED: "Final[int]" = 2
+VALUE_SYMREF: "Final[int]" = 3
+
+# Levels of a multi-level index followed before giving up:
+MAX_INDEX_DEPTH: "Final[int]" = 8
+
+# Times ``tables.list`` is re-read when a table it lists has already
+# been removed by a concurrent compaction:
+MAX_RELOAD_ATTEMPTS: "Final[int]" = 5
+
+# Refs that Git keeps in files next to a reftable stack:
+FILE_PSEUDOREFS: "Final[Sequence[str]]" = ("FETCH_HEAD", "MERGE_HEAD")
+
+
+class ReftableError(UnreadableRefsError):
+    """
+    The table is malformed or uses a feature the reader does not support.
+    """
+
+
+class RefRecord(NamedTuple):
+    name: str
+    # `None` for symbolic refs and deletions:
+    oid: Optional[str]
+    # Object an annotated tag points to, if recorded:
+    peeled: Optional[str]
+    # Target of a symbolic ref:
+    target: Optional[str]
+
+    @property
+    def deleted(self) -> bool:
+        return self.oid is None and self.target is None
+
+
+class _Block(NamedTuple):
+    type: int
+    # File offset of the block (0 for the first one, which also holds
+    # the file header):
+    offset: int
+    records: int
+    restarts: int
+    restart_count: int
+    # File offset of the following block:
+    next: int
+
+
+def read_varint(data, pos: int) -> Tuple[int, int]:
+    """
+    Decode the varint at `pos` and return it with the position after it.
+
+    >>> read_varint(b"\\x7f", 0)
+    (127, 1)
+    >>> read_varint(b"\\x80\\x00", 0)
+    (128, 2)
+    >>> read_varint(b"\\x81\\x7f", 0)
+    (383, 2)
+    """
+    byte = data[pos]
+    value = byte & 0x7F
+    while byte & 0x80:
+        pos += 1
+        byte = data[pos]
+        value = ((value + 1) << 7) | (byte & 0x7F)
+    return value, pos + 1
+
+
+def _decode(name: bytes) -> str:
+    return name.decode("utf-8", "surrogateescape")
+
+
+class Reftable:
+    """
+    A memory-mapped reftable file.
+    """
+
+    def __init__(self, path: Pathish, hexsz: int = 40):
+        self.path = Path(path)
+        with open(str(self.path), "rb") as file:
+            self.mmap = mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse(hexsz)
+        except Exception:
+            mm.close()
+            raise
+
+    def _parse(self, hexsz: int) -> None:
+        mm = self.mmap
+        if len(mm) < 8 or mm[:4] != MAGIC or mm[4] not in HEADER_SIZE:
+            raise ReftableError(f"{self.path}: not a reftable v1 or v2 file")
+        version = mm[4]
+        self.header_size = HEADER_SIZE[version]
+        footer_size = FOOTER_SIZE[version]
+        if len(mm) < self.header_size + footer_size:
+            raise ReftableError(f"{self.path}: truncated file")
+        self.block_size = int.from_bytes(mm[5:8], "big")
+        self.min_update_index = int.from_bytes(mm[8:16], "big")
+        hashsz = 20
+        if version == 2:
+            hashsz = HASH_IDS.get(mm[24:28], 0)
+        if hashsz * 2 != hexsz:
+            raise ReftableError(f"{self.path}: unexpected hash function")
+        self.hashsz = hashsz
+
+        self.end = footer = len(mm) - footer_size
+        if mm[footer : footer + self.header_size] != mm[: self.header_size]:
+            raise ReftableError(f"{self.path}: footer does not match header")
+        crc = int.from_bytes(mm[len(mm) - 4 :], "big")
+        if zlib.crc32(mm[footer : len(mm) - 4]) != crc:
+            raise ReftableError(f"{self.path}: footer checksum mismatch")
+        start = footer + self.header_size
+        self.ref_index = int.from_bytes(mm[start : start + 8], "big")
+
+    def close(self) -> None:
+        self.mmap.close()
+
+    def _block(self, offset: int) -> Optional[_Block]:
+        if offset >= self.end:
+            return None
+        mm = self.mmap
+        # The first block starts with the file header:
+        header = self.header_size if offset == 0 else 0
+        start = offset + header
+        block_type = mm[start]
+        if block_type not in (BLOCK_REF, BLOCK_INDEX):
+            # Object and log blocks (the latter compressed) are not read.
+            return _Block(block_type, offset, 0, 0, 0, self.end)
+        length = int.from_bytes(mm[start + 1 : start + 4], "big")
+        end = offset + length
+        if end > self.end or length < header + 6:
+            raise ReftableError(f"{self.path}: bad block at {offset}")
+        restart_count = int.from_bytes(mm[end - 2 : end], "big")
+        restarts = end - 2 - 3 * restart_count
+        if restart_count == 0 or restarts < start + 4:
+            raise ReftableError(f"{self.path}: bad block at {offset}")
+        # Blocks are padded with zeros to the block size, unless the
+        # table is written unaligned:
+        if length < self.block_size and end < self.end and mm[end] == 0:
+            next_offset = offset + self.block_size
+        else:
+            next_offset = end
+        return _Block(
+            block_type, offset, start + 4, restarts, restart_count, next_offset
+        )
+
+    def _read_key(self, pos: int, previous: bytes) -> Tuple[bytes, int, int]:
+        # Return the key of the record at `pos`, its value type, and the
+        # position of the value.
+        mm = self.mmap
+        prefix_length, pos = read_varint(mm, pos)
+        packed, pos = read_varint(mm, pos)
+        if prefix_length > len(previous):
+            raise ReftableError(f"{self.path}: bad prefix length at {pos}")
+        end = pos + (packed >> 3)
+        return previous[:prefix_length] + mm[pos:end], packed & 7, end
+
+    def _read_ref(
+        self, pos: int, value_type: int
+    ) -> Tuple[Optional[bytes], Optional[bytes], Optional[bytes], int]:
+        # Return the object ID, peeled object ID and symref target of
+        # the ref record value at `pos`, and the position after it.
+        mm = self.mmap
+        hashsz = self.hashsz
+        _, pos = read_varint(mm, pos)  # update_index_delta
+        if value_type == VALUE_DELETION:
+            return None, None, None, pos
+        elif value_type == VALUE_OID:
+            return mm[pos : pos + hashsz], None, None, pos + hashsz
+        elif value_type == VALUE_PEELED:
+            end = pos + 2 * hashsz
+            return mm[pos : pos + hashsz], mm[pos + hashsz : end], None, end
+        elif value_type == VALUE_SYMREF:
+            length, pos = read_varint(mm, pos)
+            return None, None, mm[pos : pos + length], pos + length
+        raise ReftableError(f"{self.path}: unknown ref value type {value_type}")
+
+    def _skip_value(self, block: _Block, pos: int, value_type: int) -> int:
+        if block.type == BLOCK_REF:
+            return self._read_ref(pos, value_type)[3]
+        return read_varint(self.mmap, pos)[1]
+
+    def _restart_key(self, block: _Block, i: int) -> Tuple[bytes, int]:
+        start = block.restarts + 3 * i
+        pos = block.offset + int.from_bytes(self.mmap[start : start + 3], "big")
+        return self._read_key(pos, b"")[0], pos
+
+    def _seek(self, block: _Block, key: bytes) -> Iterator[Tuple[bytes, int, int]]:
+        # Yield the key, value type and value position of the records
+        # of `block` from the first one not less than `key`.
+        lo, hi = 0, block.restart_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._restart_key(block, mid)[0] <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        pos = self._restart_key(block, lo - 1)[1] if lo else block.records
+        previous = b""
+        while pos < block.restarts:
+            current, value_type, value = self._read_key(pos, previous)
+            if current >= key:
+                yield current, value_type, value
+            pos = self._skip_value(block, value, value_type)
+            previous = current
+
+    def _first_ref_block(self, key: bytes) -> Optional[_Block]:
+        # The ref block which may contain `key`, found through the
+        # (possibly multi-level) index if there is one.
+        if not self.ref_index:
+            block = self._block(0)
+            if block is None or block.type != BLOCK_REF:
+                return None
+            return block
+        offset = self.ref_index
+        for _ in range(MAX_INDEX_DEPTH):
+            block = self._block(offset)
+            if block is None:
+                return None
+            if block.type == BLOCK_REF:
+                return block
+            if block.type != BLOCK_INDEX:
+                raise ReftableError(f"{self.path}: bad index block at {offset}")
+            # Index keys are the last refnames of the blocks they point to:
+            for _, _, value in self._seek(block, key):
+                offset = read_varint(self.mmap, value)[0]
+                break
+            else:
+                return None
+        raise ReftableError(f"{self.path}: index is too deep")
+
+    def seek(self, name: str) -> Iterator[RefRecord]:
+        """
+        Yield the ref records from the first one whose name is not less
+        than `name`, in refname order.
+        """
+        key = name.encode("utf-8", "surrogateescape")
+        block = self._first_ref_block(key)
+        while block is not None and block.type == BLOCK_REF:
+            for current, value_type, pos in self._seek(block, key):
+                oid, peeled, target, _ = self._read_ref(pos, value_type)
+                yield RefRecord(
+                    _decode(current),
+                    None if oid is None else oid.hex(),
+                    None if peeled is None else peeled.hex(),
+                    None if target is None else _decode(target),
+                )
+            block = self._block(block.next)
+
+    def lookup(self, name: str) -> Optional[RefRecord]:
+        """
+        Find the record of `name` (possibly a deletion) in this table.
+        """
+        for record in self.seek(name):
+            return record if record.name == name else None
+        return None
+
+    def iter_prefix(self, prefix: str) -> Iterator[RefRecord]:
+        for record in self.seek(prefix):
+            if not record.name.startswith(prefix):
+                break
+            yield record
+
+
+def _aged(
+    records: Iterator[RefRecord], age: int
+) -> Iterator[Tuple[str, int, RefRecord]]:
+    for record in records:
+        yield record.name, age, record
+
+
+class ReftableStack:
+    """
+    The tables listed in ``tables.list`` of a reftable directory,
+    reloaded when the list changes.
+    """
+
+    def __init__(self, path: Pathish, hexsz: int = 40):
+        self.path = Path(path)
+        self.hexsz = hexsz
+        self._stat: Optional[Tuple[int, int, int]] = None
+        # Tables are immutable, so they are kept open across reloads
+        # for as long as they are listed:
+        self._opened: Dict[str, Reftable] = {}
+        # Newest first:
+        self._tables: List[Reftable] = []
+
+    def _refresh(self) -> None:
+        list_path = self.path / "tables.list"
+        for _ in range(MAX_RELOAD_ATTEMPTS):
+            try:
+                st = os.stat(str(list_path))
+                key = (st.st_ino, st.st_mtime_ns, st.st_size)
+                if key == self._stat:
+                    return
+                names = list_path.read_text().split()
+                opened = {name: self._open(name) for name in names}
+            except FileNotFoundError:
+                # The stack was compacted while it was read:
+                continue
+            # Dropped tables are not closed explicitly as other threads
+            # may still use them.
+            self._opened = opened
+            self._tables = [opened[name] for name in reversed(names)]
+            self._stat = key
+            return
+        raise ReftableError(f"{self.path}: cannot read a consistent stack")
+
+    def _open(self, name: str) -> Reftable:
+        table = self._opened.get(name)
+        if table is None:
+            table = Reftable(self.path / name, self.hexsz)
+        return table
+
+    def tables(self) -> List[Reftable]:
+        """
+        The tables of the stack, newest first.
+        """
+        self._refresh()
+        return self._tables
+
+    def lookup(self, name: str) -> Optional[RefRecord]:
+        """
+        Find the newest record of `name` or `None` if it is deleted or
+        missing.
+        """
+        for table in self.tables():
+            record = table.lookup(name)
+            if record is not None:
+                return None if record.deleted else record
+        return None
+
+    def iter_prefix(self, prefix: str) -> Iterator[RefRecord]:
+        """
+        Yield the live records starting with `prefix` in refname order,
+        merging the tables of the stack.
+        """
+        merged = heapq.merge(
+            *(
+                _aged(table.iter_prefix(prefix), age)
+                for age, table in enumerate(self.tables())
+            )
+        )
+        last = None
+        for name, _, record in merged:
+            # The newest record comes first:
+            if name == last:
+                continue
+            last = name
+            if not record.deleted:
+                yield record
+
+
+class ReftableRefStore(RefStore):
+    """
+    Reader for the "reftable" reference backend.
+
+    Per-worktree refs (``HEAD``, ``refs/bisect/`` etc.) live in the
+    stack of the worktree's ``$GIT_DIR`` and the others in the stack of
+    the common directory.  ``FETCH_HEAD`` and ``MERGE_HEAD`` remain
+    files.
+    """
+
+    def __init__(
+        self, git_dir: Pathish, common_dir: Optional[Pathish] = None, hexsz: int = 40
+    ):
+        super().__init__(git_dir, common_dir, hexsz=hexsz)
+        self.stack = ReftableStack(self.common_dir / "reftable", hexsz=hexsz)
+        self.worktree_stack = self.stack
+        if self.git_dir != self.common_dir:
+            self.worktree_stack = ReftableStack(self.git_dir / "reftable", hexsz=hexsz)
+
+    def _stack(self, name: str) -> ReftableStack:
+        if is_per_worktree(name):
+            return self.worktree_stack
+        return self.stack
+
+    def _lookup(self, name: str) -> Optional[RefRecord]:
+        try:
+            return self._stack(name).lookup(name)
+        except OSError as err:
+            raise ReftableError(str(err)) from err
+
+    def read_raw(self, name: str) -> Optional[str]:
+        if name in FILE_PSEUDOREFS:
+            return super().read_raw(name)
+        record = self._lookup(name)
+        if record is None:
+            return None
+        if record.target is not None:
+            return "ref: " + record.target
+        return record.oid
+
+    def peel(self, name: str) -> Optional[str]:
+        record = self._lookup(name)
+        if record is None:
+            return None
+        return record.peeled
+
+    def iter_refs(self, prefix: str) -> Iterator[Tuple[str, str]]:
+        assert prefix.endswith("/")
+        try:
+            records = list(self._stack(prefix).iter_prefix(prefix))
+        except OSError as err:
+            raise ReftableError(str(err)) from err
+        return iter([(r.name, r.oid) for r in records if r.oid is not None])
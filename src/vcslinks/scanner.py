@@ -0,0 +1,173 @@
+"""
+Analyze all repositories under a directory.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Deque, Iterator, List, NamedTuple, Optional
+
+from .base import Pathish
+
+# Directories never descended into:
+SKIP_DIRECTORIES = frozenset([".git", "node_modules", "__pycache__", ".tox"])
+
+# Analyses submitted ahead of the results consumed, per worker thread:
+IN_FLIGHT_PER_WORKER = 2
+
+
+class ScanResult(NamedTuple):
+    # Top-level directory of the working tree:
+    path: Path
+    rooturl: Optional[str] = None
+    # Local branch used for the links:
+    branch: Optional[str] = None
+    # Branch in the remote repository:
+    upstream: Optional[str] = None
+    pull_request: Optional[str] = None
+    # Exception raised while analyzing the repository:
+    error: Optional[BaseException] = None
+
+
+def nested_working_trees(directory: str) -> List[str]:
+    """
+    Submodules and linked worktrees checked out inside the working tree
+    at `directory`.  Other nested repositories (e.g., untracked clones)
+    are not included.
+    """
+    from .discovery import Unsupported, read_commondir, read_gitfile
+    from .submodules import read_gitmodules
+
+    paths = [
+        os.path.join(directory, *subpath.split("/"))
+        for subpath in read_gitmodules(Path(directory, ".gitmodules"), None)
+    ]
+    dotgit = os.path.join(directory, ".git")
+    try:
+        git_dir = dotgit if os.path.isdir(dotgit) else read_gitfile(dotgit)
+        worktrees = os.path.join(read_commondir(git_dir), "worktrees")
+        names = os.listdir(worktrees)
+    except (OSError, Unsupported):
+        names = []
+    prefix = os.path.join(directory, "")
+    for name in names:
+        try:
+            with open(os.path.join(worktrees, name, "gitdir")) as file:
+                path = os.path.dirname(file.read().strip())
+        except OSError:
+            continue
+        if path.startswith(prefix):
+            paths.append(path)
+    return sorted(set(paths))
+
+
+def find_repositories(root_dir: Pathish) -> Iterator[Path]:
+    """
+    Find working trees under `root_dir`, in depth-first order.
+
+    Inside a working tree, only its submodules and linked worktrees are
+    looked for (see `nested_working_trees`).  Symbolic links are not
+    followed.
+    """
+    stack = [os.path.abspath(str(root_dir))]
+    while stack:
+        directory = stack.pop()
+        if os.path.lexists(os.path.join(directory, ".git")):
+            yield Path(directory)
+            stack.extend(reversed(nested_working_trees(directory)))
+            continue
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs: List[str] = []
+        for entry in entries:
+            try:
+                if entry.name not in SKIP_DIRECTORIES and entry.is_dir(
+                    follow_symlinks=False
+                ):
+                    subdirs.append(entry.path)
+            except OSError:
+                continue
+        stack.extend(reversed(subdirs))
+
+
+def analyze_repository(path: Path) -> ScanResult:
+    """
+    Analyze the repository at `path`, capturing any error in
+    `ScanResult.error`.
+    """
+    from .api import _analyze
+
+    try:
+        weburl = _analyze(path)
+        local_branch = weburl.local_branch
+        return ScanResult(
+            path=path,
+            rooturl=weburl.rooturl,
+            branch=local_branch.name,
+            upstream=local_branch.remote_branch(),
+            pull_request=weburl.pull_request(),
+        )
+    except Exception as err:
+        return ScanResult(path=path, error=err)
+
+
+def scan(
+    root_dir: Pathish = ".", ordered: bool = False, max_workers: Optional[int] = None
+) -> Iterator[ScanResult]:
+    """
+    Analyze all repositories, worktrees and submodules under `root_dir`.
+
+    Repositories are analyzed in a pool of `max_workers` threads while
+    the directory tree is walked, and the results are yielded as they
+    become available or, if `ordered` is true, in the order of
+    `find_repositories`.  Failures are
+    reported through `ScanResult.error` instead of raising.
+
+    ..
+       >>> root_dir = getfixture("github_repository").parent
+
+    >>> from vcslinks import scan
+    >>> for result in scan(root_dir, ordered=True):
+    ...     if result.path.name.startswith("vcslinks-github"):
+    ...         print(result.rooturl, result.branch, result.upstream)
+    https://github.com/USER/PROJECT master master
+    """
+    if max_workers is None:
+        # The default of `ThreadPoolExecutor` as of Python 3.8:
+        max_workers = min(32, (os.cpu_count() or 1) + 4)
+    limit = IN_FLIGHT_PER_WORKER * max_workers
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Analyses are submitted while the tree is walked, with at most
+        # `limit` of them unfinished or not yet yielded:
+        pending: Deque["Future[ScanResult]"] = deque()
+        try:
+            for path in find_repositories(root_dir):
+                pending.append(executor.submit(analyze_repository, path))
+                yield from _finished(pending, ordered, len(pending) >= limit)
+            while pending:
+                yield from _finished(pending, ordered, True)
+        finally:
+            # Do not wait for the remaining work if the caller stops early:
+            for future in pending:
+                future.cancel()
+
+
+def _finished(
+    pending: Deque["Future[ScanResult]"], ordered: bool, block: bool
+) -> Iterator[ScanResult]:
+    # Pop and yield the results available now; if `block`, wait for at
+    # least one.
+    if ordered:
+        while pending and (block or pending[0].done()):
+            yield pending.popleft().result()
+            block = False
+        return
+    if block:
+        wait(pending, return_when=FIRST_COMPLETED)
+    for future in [f for f in pending if f.done()]:
+        pending.remove(future)
+        yield future.result()
@@ -0,0 +1,165 @@
+"""
+Line-delimited JSON request handling shared by ``vcsbrowse serve-stdio``.
+
+Each request is a JSON object with a ``command`` (one of `COMMANDS`)
+and its arguments::
+
+    {"id": 1, "command": "file", "file": "setup.py", "lines": "5-10"}
+
+and each response is a JSON object with either ``url`` or ``error``
+(and ``id`` copied from the request)::
+
+    {"id": 1, "url": "https://github.com/USER/PROJECT/blob/.../setup.py#L5-L10"}
+"""
+
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Callable, Dict, Optional, TextIO, Tuple
+
+from . import api
+from .base import ApplicationError
+from .weburl import LinesSpecifier, parselines
+
+Request = Dict[str, Any]
+
+
+def _lines(value) -> LinesSpecifier:
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        return parselines(value)
+    beg, end = value
+    return (int(beg), int(end))
+
+
+def _path(request: Request, key: str, default: Optional[str] = ".") -> Optional[str]:
+    value = request.get(key, default)
+    if value is None:
+        return None
+    return os.path.join(request.get("cwd") or "", value)
+
+
+def _kwargs(request: Request) -> Dict[str, Any]:
+    return {"branch": request["branch"]} if request.get("branch") else {}
+
+
+def _auto(request: Request) -> Optional[str]:
+    from .browse import auto_url
+
+    return auto_url(api.analyze(_path(request, "path"), **_kwargs(request)))
+
+
+def _file_page(request: Request, page: str) -> str:
+    # The repository at ``path`` is analyzed if given, as ``vcsbrowse``
+    # does for the current directory; otherwise the file's repository.
+    file = _path(request, "file", None)
+    weburl = api.analyze(_path(request, "path", None) or file, **_kwargs(request))
+    return getattr(weburl, page)(
+        file,
+        lines=_lines(request.get("lines")),
+        revision=request.get("revision"),
+        permalink=request.get("permalink"),
+        short=bool(request.get("short")),
+        check_published=bool(request.get("check_published")),
+    )
+
+
+COMMANDS: Dict[str, Callable[[Request], Optional[str]]] = {
+    "auto": _auto,
+    "root": lambda r: api.root(path=_path(r, "path"), **_kwargs(r)),
+    "pull_request": lambda r: api.pull_request(_path(r, "path"), **_kwargs(r)),
+    "commit": lambda r: api.commit(
+        r.get("revision") or "HEAD",
+        path=_path(r, "path"),
+        short=bool(r.get("short")),
+        check_published=bool(r.get("check_published")),
+        **_kwargs(r),
+    ),
+    "log": lambda r: api.log(r.get("revision"), path=_path(r, "path"), **_kwargs(r)),
+    "file": lambda r: _file_page(r, "file"),
+    "blame": lambda r: _file_page(r, "blame"),
+    "tree": lambda r: api.analyze(
+        _path(r, "directory", None) or _path(r, "path"), **_kwargs(r)
+    ).tree(
+        _path(r, "directory", None),
+        revision=r.get("revision"),
+        permalink=bool(r.get("permalink")),
+        check_published=bool(r.get("check_published")),
+        short=bool(r.get("short")),
+    ),
+    "diff": lambda r: api.diff(
+        r.get("revision1"),
+        r.get("revision2"),
+        permalink=bool(r.get("permalink")),
+        path=_path(r, "path"),
+        merge_base=bool(r.get("merge_base")),
+        **_kwargs(r),
+    ),
+}
+
+
+# Arguments without which a command cannot be run:
+REQUIRED: Dict[str, Tuple[str, ...]] = {"file": ("file",), "blame": ("file",)}
+
+
+def handle_request(request: Request) -> Dict[str, Any]:
+    """
+    Compute a response for a decoded `request`.
+    """
+    response: Dict[str, Any] = {}
+    if "id" in request:
+        response["id"] = request["id"]
+    name = request.get("command") or "auto"
+    try:
+        command = COMMANDS[name]
+    except (KeyError, TypeError):
+        response["error"] = f"Unknown command: {request.get('command')}"
+        return response
+    missing = [key for key in REQUIRED.get(name, ()) if request.get(key) is None]
+    if missing:
+        response["error"] = f"Invalid request: missing {', '.join(missing)}"
+        return response
+    try:
+        response["url"] = command(request)
+    except ApplicationError as err:
+        response["error"] = str(err)
+    except subprocess.CalledProcessError as err:
+        response["error"] = str(err)
+        if err.stderr:
+            response["stderr"] = err.stderr
+    except (TypeError, ValueError) as err:
+        response["error"] = f"Invalid request: {err}"
+    except OSError as err:
+        # E.g., a nonexistent ``cwd`` or ``file``.
+        response["error"] = str(err)
+    except Exception as err:
+        # A bug or an unsupported configuration must not end the session.
+        response["error"] = f"{type(err).__name__}: {err}"
+    return response
+
+
+def handle_line(line: str) -> Dict[str, Any]:
+    try:
+        request = json.loads(line)
+    except ValueError as err:
+        return {"error": f"Invalid JSON: {err}"}
+    if not isinstance(request, dict):
+        return {"error": "Request must be a JSON object"}
+    return handle_request(request)
+
+
+def serve_stdio(
+    stdin: Optional[TextIO] = None, stdout: Optional[TextIO] = None
+) -> None:
+    """
+    Answer line-delimited JSON requests from `stdin` until EOF.
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    for line in stdin:
+        if not line.strip():
+            continue
+        stdout.write(json.dumps(handle_line(line)) + "\n")
+        stdout.flush()
@@ -0,0 +1,313 @@
+"""
+Links to files in submodules.
+
+A path inside a submodule is linked through the submodule's own
+remote at the commit recorded (as a "gitlink") in the superproject.
+"""
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, NamedTuple, Optional, Sequence, Tuple
+
+from .base import ApplicationError, BaseRepoAnalyzer, Pathish
+from .gitconfig import GitConfig, UnsupportedConfigError, parse_config, stat_token
+from .refs import is_hex
+
+if TYPE_CHECKING:
+    from typing import Final
+
+    from .git import GitRepoAnalyzer
+    from .gitblame import BlameRange
+    from .hostrules import HostRules
+    from .weburl import LinesSpecifier, WebURL
+
+# Number of superproject commits whose gitlinks are remembered:
+GITLINKS_CACHE_SIZE: "Final[int]" = 64
+
+
+class SubmoduleNotCheckedOutError(ApplicationError, LookupError):
+    def __init__(self, path: str):
+        self.path = path
+
+    def __str__(self) -> str:
+        return f"submodule {self.path} is not checked out"
+
+
+class Submodule(NamedTuple):
+    name: str
+    # Path relative to the superproject root, separated by "/":
+    path: str
+    # URL configured in the superproject (may be relative):
+    url: str
+
+
+def resolve_relative_url(url: str, base: str) -> str:
+    """
+    Resolve a submodule `url` relative to the superproject's remote
+    URL `base`, as Git does for URLs starting with ``./`` or ``../``.
+
+    >>> resolve_relative_url("../lib.git", "git@github.com:USER/app.git")
+    'git@github.com:USER/lib.git'
+    >>> resolve_relative_url("./lib", "https://example.com/USER/app/")
+    'https://example.com/USER/app/lib'
+    >>> resolve_relative_url("../../OTHER/lib", "git@example.com:USER/app")
+    'git@example.com:OTHER/lib'
+    >>> resolve_relative_url("https://example.com/lib", "git@github.com:USER/app")
+    'https://example.com/lib'
+    """
+    if not url.startswith(("./", "../")):
+        return url
+    base = base.rstrip("/")
+    while True:
+        if url.startswith("./"):
+            url = url[len("./") :]
+        elif url.startswith("../"):
+            url = url[len("../") :]
+            i = max(base.rfind("/"), base.rfind(":"))
+            if i < 0:
+                base = ""
+            elif base[i] == ":" and not base[i:].startswith("://"):
+                base = base[: i + 1]
+            else:
+                base = base[:i]
+        else:
+            break
+    if not base or base.endswith(":"):
+        return base + url
+    return f"{base}/{url}"
+
+
+class SubmoduleRepoAnalyzer(BaseRepoAnalyzer):
+    """
+    Analyzer of a submodule seen from its superproject.
+
+    The remote URL is the one configured in the superproject; the
+    submodule does not have to be checked out.
+    """
+
+    def __init__(self, superproject: "GitRepoAnalyzer", submodule: Submodule):
+        self.superproject = superproject
+        self.submodule = submodule
+        self.root = superproject.root.joinpath(*submodule.path.split("/"))
+        self._checkout: Optional["GitRepoAnalyzer"] = None
+
+    @property
+    def checkout(self) -> Optional["GitRepoAnalyzer"]:
+        """
+        Analyzer of the checked out submodule, if any.
+        """
+        if self._checkout is None and (self.root / ".git").exists():
+            from .git import GitRepoAnalyzer
+
+            self._checkout = GitRepoAnalyzer(self.root)
+        return self._checkout
+
+    @property
+    def host_rules(self) -> "HostRules":
+        return self.superproject.host_rules
+
+    def current_branch(self) -> str:
+        return "HEAD"
+
+    def remote_url(self, branch: str = "master") -> str:
+        url = self.submodule.url
+        if url.startswith(("./", "../")):
+            base = self.superproject.remote_url(self.superproject.current_branch())
+            url = resolve_relative_url(url, base)
+        return url
+
+    def remote_branch(self, branch: str) -> str:
+        return branch
+
+    def need_pull_request(self, branch: str) -> bool:
+        return False
+
+    def resolve_revision(self, revision: str) -> str:
+        checkout = self.checkout
+        if checkout is not None:
+            return checkout.resolve_revision(revision)
+        if is_hex(revision) and len(revision) in (40, 64):
+            return revision
+        raise SubmoduleNotCheckedOutError(self.submodule.path)
+
+    def abbreviate(self, oid: str) -> str:
+        checkout = self.checkout
+        if checkout is not None:
+            return checkout.abbreviate(oid)
+        # Only the full object ID is known to be unambiguous:
+        return oid
+
+    def is_published(self, commit: str, branch: str) -> bool:
+        checkout = self.checkout
+        if checkout is None:
+            raise SubmoduleNotCheckedOutError(self.submodule.path)
+        return checkout.is_published(commit, checkout.current_branch())
+
+    def merge_base(self, commit1: str, commit2: str) -> Optional[str]:
+        checkout = self.checkout
+        if checkout is None:
+            raise SubmoduleNotCheckedOutError(self.submodule.path)
+        return checkout.merge_base(commit1, commit2)
+
+    def is_ancestor(self, ancestor: str, commit: str) -> bool:
+        checkout = self.checkout
+        if checkout is None:
+            raise SubmoduleNotCheckedOutError(self.submodule.path)
+        return checkout.is_ancestor(ancestor, commit)
+
+    def relpath(self, path: Pathish) -> Path:
+        return Path(path).resolve().relative_to(self.root)
+
+    def map_lines(
+        self, path: Pathish, lines: "LinesSpecifier", revision: str
+    ) -> "LinesSpecifier":
+        checkout = self.checkout
+        if checkout is None:
+            return lines
+        return checkout.map_lines(path, lines, revision)
+
+    def blame_ranges(
+        self, path: Pathish, lines: "LinesSpecifier", revision: Optional[str]
+    ) -> Iterator["BlameRange"]:
+        checkout = self.checkout
+        if checkout is None:
+            raise SubmoduleNotCheckedOutError(self.submodule.path)
+        return checkout.blame_ranges(path, lines, revision)
+
+    def find_submodule(
+        self, path: Pathish, revision: Optional[str]
+    ) -> Optional[Tuple["WebURL", str]]:
+        checkout = self.checkout
+        if checkout is None:
+            return None
+        return checkout.find_submodule(path, revision)
+
+
+class SubmoduleIndex:
+    """
+    Submodules of a repository indexed by path.
+
+    ``.gitmodules`` is parsed once (and again only when it changes),
+    and the gitlinks of all submodules are read with a single
+    ``git ls-tree`` per superproject commit.  Finding the submodule
+    containing a path costs one dictionary lookup per path component.
+    """
+
+    def __init__(self, repo: "GitRepoAnalyzer"):
+        self.repo = repo
+        self._lock = threading.Lock()
+        self._token: Optional[Tuple] = None
+        self._by_path: Dict[str, Submodule] = {}
+        self._gitlinks: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+        self._weburls: Dict[str, "WebURL"] = {}
+
+    def _refresh(self) -> None:
+        gitmodules = self.repo.root / ".gitmodules"
+        config = self.repo.config
+        token = (
+            stat_token(gitmodules),
+            None if config is None else config.current_generation(),
+        )
+        if token == self._token:
+            return
+        self._by_path = read_gitmodules(gitmodules, config)
+        self._gitlinks.clear()
+        self._weburls.clear()
+        self._token = token
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._by_path)
+
+    def lookup(self, parts: Sequence[str]) -> Optional[Submodule]:
+        """
+        Find the submodule containing the relative path `parts`.
+        """
+        with self._lock:
+            self._refresh()
+            by_path = self._by_path
+        if not by_path:
+            return None
+        key = ""
+        for part in parts:
+            key = f"{key}/{part}" if key else part
+            submodule = by_path.get(key)
+            if submodule is not None:
+                return submodule
+        return None
+
+    def gitlink(self, submodule: Submodule, commit: str) -> Optional[str]:
+        """
+        Commit of `submodule` recorded in the superproject `commit`.
+        """
+        with self._lock:
+            gitlinks = self._gitlinks.get(commit)
+            if gitlinks is not None:
+                self._gitlinks.move_to_end(commit)
+            paths = list(self._by_path)
+        if gitlinks is None:
+            gitlinks = read_gitlinks(self.repo, commit, paths)
+            with self._lock:
+                self._gitlinks[commit] = gitlinks
+                while len(self._gitlinks) > GITLINKS_CACHE_SIZE:
+                    self._gitlinks.popitem(last=False)
+        return gitlinks.get(submodule.path)
+
+    def weburl(self, submodule: Submodule) -> "WebURL":
+        with self._lock:
+            weburl = self._weburls.get(submodule.path)
+        if weburl is None:
+            from .git import LocalBranch
+
+            repo = SubmoduleRepoAnalyzer(self.repo, submodule)
+            weburl = LocalBranch(repo, name="HEAD").weburl()
+            with self._lock:
+                self._weburls[submodule.path] = weburl
+        return weburl
+
+
+def read_gitmodules(path: Path, config: Optional[GitConfig]) -> Dict[str, Submodule]:
+    """
+    Parse ``.gitmodules`` at `path`.  URLs configured in the
+    repository's `config` (``git submodule init``) take precedence.
+    """
+    try:
+        text = path.read_bytes().decode("utf-8", "surrogateescape")
+    except OSError:
+        return {}
+    gitmodules = GitConfig()
+    try:
+        for key, value in parse_config(text, str(path)):
+            gitmodules.add(key, value)
+    except UnsupportedConfigError:
+        return {}
+    urls = gitmodules.subsection_values("submodule", "url")
+    by_path = {}
+    for name, subpath in gitmodules.subsection_values("submodule", "path").items():
+        url = config.get(f"submodule.{name}.url") if config is not None else None
+        url = url or urls.get(name)
+        if subpath and url:
+            subpath = subpath.strip("/")
+            by_path[subpath] = Submodule(name=name, path=subpath, url=url)
+    return by_path
+
+
+def read_gitlinks(
+    repo: "GitRepoAnalyzer", commit: str, paths: Sequence[str]
+) -> Dict[str, str]:
+    """
+    Read the gitlinks at `paths` in `commit` with one ``git ls-tree``.
+    """
+    if not paths:
+        return {}
+    proc = repo.git("ls-tree", "-z", commit, "--", *paths, cwd=str(repo.root))
+    output = proc.stdout
+    gitlinks = {}
+    for entry in output.split("\0"):
+        info, _, path = entry.partition("\t")
+        fields = info.split()
+        if len(fields) == 3 and fields[1] == "commit":
+            gitlinks[path] = fields[2]
+    return gitlinks
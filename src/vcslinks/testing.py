@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Optional
 from unittest.mock import Mock
 
 from .base import BaseRepoAnalyzer
@@ -13,6 +14,9 @@ class DummyRepoAnalyzer(BaseRepoAnalyzer):
         self.mock.remote_url.return_value = "git@github.com:USER/PROJECT.git"
         self.mock.remote_branch.return_value = "master"
         self.mock.need_pull_request.return_value = False
+        self.mock.blame_ranges.return_value = []
+        self.mock.merge_base.return_value = "55150afe539493d650889224db136bc8d9b7ecb8"
+        self.mock.is_ancestor.return_value = True
 
     def current_branch(self):
         return self.mock.current_branch()
@@ -35,6 +39,15 @@ class DummyRepoAnalyzer(BaseRepoAnalyzer):
             "dev": "40539486fdaf08a39b57519eb06e0e200c932cfd",
         }[revision]
 
+    def merge_base(self, commit1: str, commit2: str) -> Optional[str]:
+        return self.mock.merge_base(commit1, commit2)
+
+    def is_ancestor(self, ancestor: str, commit: str) -> bool:
+        return self.mock.is_ancestor(ancestor, commit)
+
+    def blame_ranges(self, path, lines, revision):
+        return iter(self.mock.blame_ranges(path, lines, revision))
+
     def relpath(self, path):
         # Use mock to record invocations:
         self.mock.relpath(path)
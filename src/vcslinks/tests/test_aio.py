@@ -0,0 +1,172 @@
+import asyncio
+import subprocess
+
+import pytest  # type: ignore
+
+from .. import aio, api
+from ..base import UnpublishedCommitError
+from ..cache import default_cache
+from ..conftest import git_at, init_repository
+from ..discovery import default_finder
+from ..gitconfig import GitConfig, UnsupportedConfigError
+
+
+@pytest.fixture
+def no_blocking_git(monkeypatch):
+    def run(*args, **kwargs):
+        raise AssertionError(f"blocking subprocess.run: {args}")
+
+    monkeypatch.setattr(subprocess, "run", run)
+    default_cache.clear()
+    yield
+    default_cache.clear()
+
+
+def test_same_as_api(github_repository):
+    expected = [
+        api.root(),
+        api.pull_request(),
+        api.commit(),
+        api.commit(short=True),
+        api.log(),
+        api.file("README.md", lines=(1, 2)),
+        api.blame("README.md", lines=1),
+        api.file("README.md", lines=1, short=True),
+        api.tree(revision="HEAD", permalink=True),
+        api.tree(short=True),
+        api.tree(permalink=True, short=True),
+        api.diff("HEAD", permalink=True),
+        api.diff("master", merge_base=True),
+    ]
+    default_cache.clear()
+
+    async def main():
+        return await asyncio.gather(
+            aio.root(),
+            aio.pull_request(),
+            aio.commit(),
+            aio.commit(short=True),
+            aio.log(),
+            aio.file("README.md", lines=(1, 2)),
+            aio.blame("README.md", lines=1),
+            aio.file("README.md", lines=1, short=True),
+            aio.tree(revision="HEAD", permalink=True),
+            aio.tree(short=True),
+            aio.tree(permalink=True, short=True),
+            aio.diff("HEAD", permalink=True),
+            aio.diff("master", merge_base=True),
+        )
+
+    assert asyncio.run(main()) == expected
+
+
+def test_check_published(github_repository):
+    # Nothing is pushed in this repository:
+    with pytest.raises(UnpublishedCommitError):
+        asyncio.run(aio.blame("README.md", lines=1, check_published=True))
+    with pytest.raises(ValueError):
+        asyncio.run(aio.file("README.md", check_published=True))
+    with pytest.raises(UnpublishedCommitError):
+        asyncio.run(aio.commit(check_published=True))
+    with pytest.raises(UnpublishedCommitError):
+        asyncio.run(aio.tree(permalink=True, check_published=True))
+    with pytest.raises(ValueError):
+        asyncio.run(aio.tree(check_published=True))
+
+
+def test_branch(github_repository):
+    expected = api.root(branch="master")
+    for _ in range(2):  # cache miss and hit
+        assert asyncio.run(aio.root(branch="master")) == expected
+        with pytest.raises(TypeError):
+            asyncio.run(aio.root(brnach="master"))
+
+
+def test_git_fallback(github_repository, no_blocking_git, monkeypatch):
+    def unsupported(*args, **kwargs):
+        raise UnsupportedConfigError("test")
+
+    monkeypatch.setattr(default_finder, "find", lambda _: None)
+    monkeypatch.setattr(GitConfig, "load", unsupported)
+
+    async def main():
+        weburl = await aio.analyze()
+        return weburl, await aio.commit("master")
+
+    weburl, url = asyncio.run(main())
+    assert weburl.rooturl == "https://github.com/USER/PROJECT"
+    assert weburl.local_branch.name == "master"
+    assert url.startswith("https://github.com/USER/PROJECT/commit/")
+
+
+def test_snapshot_from_subdirectory(tmp_path):
+    git_at(tmp_path)("init", "--quiet")
+    (tmp_path / "sub").mkdir()
+    location = default_finder.find(tmp_path / "sub")
+    config = asyncio.run(aio._snapshot_config(location))
+    assert location.common_dir / "config" in config.origins
+    assert tmp_path / "sub" / ".git" / "config" not in config.origins
+
+
+def test_lookups_off_event_loop(tmp_path, monkeypatch):
+    git = init_repository(tmp_path)
+    (tmp_path / "file.txt").write_text("a\nb\nc\n")
+    git("add", "file.txt")
+    git("commit", "--quiet", "--message", "first")
+    head = git("rev-parse", "HEAD")
+    (tmp_path / "file.txt").write_text("new\na\nb\nc\n")
+    calls = []
+    run = subprocess.run
+
+    def checked_run(args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            calls.append(args)
+            return run(args, **kwargs)
+        raise AssertionError(f"blocking subprocess.run: {args}")
+
+    monkeypatch.setattr(subprocess, "run", checked_run)
+    default_cache.clear()
+    url = asyncio.run(aio.file(tmp_path / "file.txt", lines=3))
+    assert url == f"https://github.com/USER/PROJECT/blob/{head}/file.txt#L2"
+    assert calls
+    default_cache.clear()
+
+
+def test_max_processes(github_repository, monkeypatch):
+    monkeypatch.setattr(aio, "MAX_PROCESSES", 2)
+    running = []
+    peak = []
+    create = asyncio.create_subprocess_exec
+
+    async def counting_create(*args, **kwargs):
+        running.append(None)
+        peak.append(len(running))
+        proc = await create(*args, **kwargs)
+        communicate = proc.communicate
+
+        async def wrapped():
+            try:
+                return await communicate()
+            finally:
+                running.pop()
+
+        proc.communicate = wrapped
+        return proc
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", counting_create)
+
+    async def main():
+        return await asyncio.gather(
+            *(aio.git(github_repository, "rev-parse", "HEAD") for _ in range(10))
+        )
+
+    assert len(set(asyncio.run(main()))) == 1
+    assert max(peak) == 2
+
+
+def test_git_error(github_repository):
+    with pytest.raises(subprocess.CalledProcessError) as exc_info:
+        asyncio.run(aio.git(github_repository, "rev-parse", "--verify", "no-such"))
+    assert exc_info.value.returncode != 0
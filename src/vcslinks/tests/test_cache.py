@@ -0,0 +1,60 @@
+from ..api import _analyze, analyze, commit
+from ..cache import AnalyzerCache
+from ..conftest import count_runs, git_at, init_repository
+
+
+def test_cached(repository, monkeypatch):
+    path = repository
+    (path / "sub").mkdir()
+    weburl = analyze(path)
+    assert analyze(path / "sub") is weburl
+    calls = count_runs(monkeypatch)
+    for _ in range(100):
+        assert analyze(path) is weburl
+        assert analyze(path / "sub") is weburl
+    assert weburl.file(path / "sub", lines=1).endswith("/sub#L1")
+    assert calls == []
+    assert analyze(path, branch="dev") is not weburl
+
+
+def test_invalidation(repository):
+    path = repository
+    git = git_at(path)
+    weburl = analyze(path)
+    git("remote", "set-url", "origin", "git@gitlab.com:USER/PROJECT.git")
+    assert analyze(path).rooturl == "https://gitlab.com/USER/PROJECT"
+
+    weburl = analyze(path)
+    git("checkout", "--quiet", "-b", "dev")
+    assert analyze(path) is not weburl
+    assert analyze(path).local_branch.name == "dev"
+
+
+def test_eviction(repository):
+    path = repository
+    cache = AnalyzerCache(maxsize=1)
+    first = cache.get(path, None, lambda: _analyze(path))
+    assert cache.get(path, None, lambda: _analyze(path)) is first
+    cache.get(path, "dev", lambda: _analyze(path, branch="dev"))
+    assert len(cache) == 1
+    assert cache.get(path, None, lambda: _analyze(path)) is not first
+
+    cache.clear()
+    assert len(cache) == 0
+    cache.resize(0)
+    cache.get(path, None, lambda: _analyze(path))
+    assert len(cache) == 0
+
+
+def test_chdir(repository, tmp_path_factory, monkeypatch):
+    a = repository
+    git_at(a)("commit", "--quiet", "--allow-empty", "--message", "second")
+    b = tmp_path_factory.mktemp("other")
+    git = init_repository(b)
+    for message in ["other first", "other second"]:
+        git("commit", "--quiet", "--allow-empty", "--message", message)
+    monkeypatch.chdir(str(a))
+    expected = commit("HEAD~1")
+    assert expected.endswith(git_at(a)("rev-parse", "HEAD~1"))
+    monkeypatch.chdir(str(b))
+    assert commit("HEAD~1", path=a) == expected
@@ -0,0 +1,71 @@
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from ..catfile import CatFileBatch
+from ..git import GitRepoAnalyzer
+
+
+def rev_parse(cwd, revision):
+    return subprocess.run(
+        ["git", "rev-parse", "--verify", revision],
+        cwd=str(cwd),
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout.strip()
+
+
+def test_resolve(github_repository):
+    head = rev_parse(github_repository, "HEAD")
+    blob = rev_parse(github_repository, "HEAD:README.md")
+    with CatFileBatch(github_repository) as batch:
+        assert batch.resolve("HEAD") == head
+        revisions = ["HEAD", "no-such-rev", "a\nb", "", "master:README.md"]
+        assert batch.resolve_many(revisions) == [head, None, None, None, blob]
+        assert batch.resolve_many(["HEAD"] * 1000) == [head] * 1000
+    assert batch._proc is None
+
+
+def test_restart(github_repository):
+    head = rev_parse(github_repository, "HEAD")
+    with CatFileBatch(github_repository) as batch:
+        assert batch.resolve("HEAD") == head
+        batch._proc.proc.kill()
+        batch._proc.proc.wait()
+        assert batch.resolve("HEAD") == head
+
+
+def test_threads(github_repository):
+    head = rev_parse(github_repository, "HEAD")
+    with CatFileBatch(github_repository) as batch:
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(batch.resolve, ["HEAD^{commit}"] * 200))
+    assert results == [head] * 200
+
+
+def test_analyzer_batch(github_repository, monkeypatch):
+    head = rev_parse(github_repository, "HEAD")
+    with GitRepoAnalyzer(github_repository, batch=True) as repo:
+
+        def fail(*args, **kwargs):
+            raise AssertionError(f"unexpected subprocess: {args}")
+
+        monkeypatch.setattr(subprocess, "run", fail)
+        assert repo.resolve_revision("HEAD^{commit}") == head
+        assert repo.batch is not None
+        assert repo.batch._proc is not None
+    assert repo.batch._proc is None
+
+
+def test_read(github_repository):
+    blob = rev_parse(github_repository, "HEAD:README.md")
+    readme = (github_repository / "README.md").read_bytes()
+    with CatFileBatch(github_repository) as batch:
+        assert batch.read(blob) == readme
+        batch._reader.proc.kill()
+        batch._reader.proc.wait()
+        assert batch.read("HEAD:README.md") == readme
+        assert batch.read("no-such-rev") is None
+        assert batch.read("") is None
+        assert batch._proc is None
+    assert batch._reader is None
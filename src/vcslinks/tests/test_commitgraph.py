@@ -0,0 +1,255 @@
+import pytest  # type: ignore
+
+from ..base import NoMergeBaseError, UnpublishedCommitError
+from ..commitgraph import CommitGraph, CommitGraphFile, chain_path, graph_path
+from ..conftest import count_runs, init_repository
+from ..git import GitRepoAnalyzer, LocalBranch
+from ..refs import RefStore
+
+
+def commit(git, message):
+    git("commit", "--quiet", "--allow-empty", "--message", message)
+    return git("rev-parse", "HEAD")
+
+
+@pytest.fixture
+def repository(tmp_path):
+    git = init_repository(tmp_path)
+    commits = {"a": commit(git, "a"), "b": commit(git, "b")}
+    git("checkout", "--quiet", "-b", "topic")
+    commits["t"] = commit(git, "t")
+    git("checkout", "--quiet", "master")
+    commits["c"] = commit(git, "c")
+    git("merge", "--quiet", "--no-edit", "topic")
+    commits["m"] = git("rev-parse", "HEAD")
+    git("update-ref", "refs/remotes/origin/master", commits["m"])
+    git("update-ref", "refs/remotes/other/master", commits["m"])
+    commits["local"] = commit(git, "local")
+    git("commit-graph", "write", "--reachable")
+    return tmp_path, git, commits
+
+
+@pytest.fixture
+def weburl(repository):
+    path, _, _ = repository
+    return LocalBranch(GitRepoAnalyzer(path), name="master").weburl()
+
+
+def test_commit_graph(repository):
+    path, git, commits = repository
+    graph = CommitGraph(graph_path(path / ".git"))
+    assert len(graph) == len(commits)
+    for oid in commits.values():
+        position = graph.lookup(oid)
+        assert graph.oid(position) == oid
+        expected = git("rev-list", "--parents", "-n1", oid).split()[1:]
+        assert sorted(graph.oid(p) for p in graph.parents(position)) == sorted(expected)
+    generation = {
+        name: graph.generation(graph.lookup(oid)) for name, oid in commits.items()
+    }
+    assert generation == {"a": 1, "b": 2, "t": 3, "c": 3, "m": 4, "local": 5}
+    assert graph.lookup("0" * 40) is None
+    assert graph.lookup("f" * 40) is None
+
+
+def test_iter_refs(repository):
+    path, git, commits = repository
+    refs = RefStore(path / ".git")
+    expected = [("refs/remotes/origin/master", commits["m"])]
+    assert list(refs.iter_refs("refs/remotes/origin/")) == expected
+    git("pack-refs", "--all")
+    git("update-ref", "refs/remotes/origin/feature", commits["t"])
+    git("symbolic-ref", "refs/remotes/origin/HEAD", "refs/remotes/origin/master")
+    assert list(refs.iter_refs("refs/remotes/origin/")) == [
+        ("refs/remotes/origin/feature", commits["t"]),
+        ("refs/remotes/origin/master", commits["m"]),
+    ]
+    assert list(refs.iter_refs("refs/remotes/nothing/")) == []
+    assert list(refs.packed.iter_prefix("refs/remotes/other/")) == [
+        ("refs/remotes/other/master", commits["m"])
+    ]
+
+
+def test_is_published(repository, weburl, monkeypatch):
+    _, _, commits = repository
+    calls = count_runs(monkeypatch)
+    for name in ["a", "b", "t", "c", "m"]:
+        assert weburl.is_published(commits[name])
+    assert not weburl.is_published(commits["local"])
+    assert not weburl.is_published("HEAD")
+    assert calls == []
+
+
+def test_is_published_without_graph(repository, weburl):
+    path, git, commits = repository
+    graph_path(path / ".git").unlink()
+    assert weburl.is_published(commits["t"])
+    assert not weburl.is_published(commits["local"])
+    # Remote-tracking branch newer than the commit-graph:
+    git("commit-graph", "write", "--reachable")
+    git("update-ref", "refs/remotes/origin/master", commits["local"])
+    assert weburl.is_published(commits["local"])
+
+
+def test_is_published_octopus(repository, weburl):
+    path, git, commits = repository
+    for name in ["x", "y"]:
+        git("checkout", "--quiet", "-b", name, commits["a"])
+        commits[name] = commit(git, name)
+    git("checkout", "--quiet", "master")
+    git("merge", "--quiet", "--no-edit", "x", "y")
+    git("update-ref", "refs/remotes/origin/master", "HEAD")
+    git("commit-graph", "write", "--reachable")
+    graph = CommitGraph(graph_path(path / ".git"))
+    octopus = graph.lookup(git("rev-parse", "HEAD"))
+    expected = git("rev-list", "--parents", "-n1", "HEAD").split()[1:]
+    assert [graph.oid(p) for p in graph.parents(octopus)] == expected
+    assert weburl.is_published(commits["y"])
+    assert weburl.is_published(commits["local"])
+    assert weburl.is_published(commits["a"])
+    git("checkout", "--quiet", "-b", "z")
+    unpublished = commit(git, "z")
+    git("commit-graph", "write", "--reachable")
+    assert not weburl.is_published(unpublished)
+
+
+def test_check_published(repository, weburl):
+    path, _, commits = repository
+    assert weburl.commit("master~", check_published=True).endswith(commits["m"])
+    with pytest.raises(UnpublishedCommitError) as excinfo:
+        weburl.commit("master", check_published=True)
+    assert commits["local"] in str(excinfo.value)
+    with pytest.raises(UnpublishedCommitError):
+        weburl.file(path / "README.md", lines=1, check_published=True)
+    with pytest.raises(UnpublishedCommitError):
+        weburl.tree(permalink=True, check_published=True)
+    # Only a commit can be checked:
+    with pytest.raises(ValueError):
+        weburl.file(path / "README.md", check_published=True)
+    with pytest.raises(ValueError):
+        weburl.tree(check_published=True)
+    assert weburl.commit("master").endswith(commits["local"])
+
+
+@pytest.fixture
+def criss_cross(repository):
+    # Two merge bases: x1 and y1 are both merged into x2 and y2.
+    path, git, commits = repository
+    for name in ["x", "y"]:
+        git("checkout", "--quiet", "-b", name, commits["b"])
+        commits[f"{name}1"] = commit(git, f"{name}1")
+    git("checkout", "--quiet", "x")
+    git("merge", "--quiet", "--no-edit", commits["y1"])
+    commits["x2"] = git("rev-parse", "HEAD")
+    git("checkout", "--quiet", "y")
+    git("merge", "--quiet", "--no-edit", commits["x1"])
+    commits["y2"] = git("rev-parse", "HEAD")
+    git("checkout", "--quiet", "master")
+    git("commit-graph", "write", "--reachable")
+    return path, git, commits
+
+
+def test_merge_bases(criss_cross):
+    path, git, commits = criss_cross
+    graph = CommitGraph(graph_path(path / ".git"))
+    for one in commits.values():
+        for two in commits.values():
+            expected = git("merge-base", "--all", one, two).split()
+            assert sorted(graph.merge_bases(one, two)) == sorted(expected)
+    assert sorted(graph.merge_bases(commits["x2"], commits["y2"])) == sorted(
+        [commits["x1"], commits["y1"]]
+    )
+    with pytest.raises(LookupError):
+        graph.merge_bases(commits["a"], "0" * 40)
+
+
+def test_split_chain(criss_cross):
+    path, git, commits = criss_cross
+    graph_path(path / ".git").unlink()
+    git("checkout", "--quiet", "x")
+    git("commit-graph", "write", "--reachable", "--split=no-merge")
+    commits["x3"] = commit(git, "x3")
+    git("commit-graph", "write", "--reachable", "--split=no-merge")
+    git("checkout", "--quiet", "master")
+    chain = chain_path(path / ".git")
+    assert len(chain.read_text().split()) == 2
+
+    graph = CommitGraphFile(path / ".git").get()
+    assert graph is not None and len(graph) == len(set(commits.values()))
+    for oid in commits.values():
+        position = graph.lookup(oid)
+        assert graph.oid(position) == oid
+        expected = git("rev-list", "--parents", "-n1", oid).split()[1:]
+        assert [graph.oid(p) for p in graph.parents(position)] == expected
+        assert graph.commit_time(position) == int(git("log", "-1", "--format=%ct", oid))
+    assert graph.generation(graph.lookup(commits["x3"])) == 5
+    assert sorted(graph.merge_bases(commits["x3"], commits["y2"])) == sorted(
+        [commits["x1"], commits["y1"]]
+    )
+
+
+def test_ancestry_without_git(criss_cross, monkeypatch):
+    path, git, commits = criss_cross
+    repo = GitRepoAnalyzer(path)
+    calls = count_runs(monkeypatch)
+    assert repo.is_ancestor(commits["a"], commits["m"])
+    assert repo.is_ancestor(commits["t"], commits["t"])
+    assert not repo.is_ancestor(commits["m"], commits["t"])
+    assert repo.merge_base(commits["c"], commits["t"]) == commits["b"]
+    assert calls == []
+
+    graph_path(path / ".git").unlink()
+    assert repo.is_ancestor(commits["a"], commits["m"])
+    assert not repo.is_ancestor(commits["m"], commits["t"])
+    assert repo.merge_base(commits["c"], commits["t"]) == commits["b"]
+    assert len(calls) == 3
+
+
+def test_replace_refs(criss_cross, monkeypatch):
+    path, git, commits = criss_cross
+    git("replace", "--graft", commits["t"], commits["c"])
+    repo = GitRepoAnalyzer(path)
+    assert repo.commit_graph is None
+    assert repo.merge_base(commits["c"], commits["t"]) == commits["c"]
+    assert repo.is_ancestor(commits["c"], commits["t"])
+
+    monkeypatch.setenv("GIT_NO_REPLACE_OBJECTS", "1")
+    assert repo.commit_graph is not None
+    assert repo.merge_base(commits["c"], commits["t"]) == commits["b"]
+    assert not repo.is_ancestor(commits["c"], commits["t"])
+
+
+def test_shallow(criss_cross):
+    path, git, commits = criss_cross
+    # Cut the history below b as a shallow clone does:
+    (path / ".git" / "shallow").write_text(commits["b"] + "\n")
+    repo = GitRepoAnalyzer(path)
+    assert repo.commit_graph is None
+    assert not repo.is_ancestor(commits["a"], commits["m"])
+    assert repo.is_ancestor(commits["b"], commits["m"])
+
+
+def test_core_commit_graph(criss_cross):
+    path, git, _ = criss_cross
+    repo = GitRepoAnalyzer(path)
+    assert repo.commit_graph is not None
+    git("config", "core.commitGraph", "false")
+    repo.reload_config()
+    assert repo.commit_graph is None
+
+
+def test_diff_merge_base(repository, weburl):
+    _, git, commits = repository
+    root = "https://github.com/USER/PROJECT"
+    # Compared against origin/master, which already merged topic:
+    assert weburl.diff("topic", merge_base=True) == (
+        f"{root}/compare/{commits['t']}...{commits['t']}"
+    )
+    assert weburl.diff(commits["c"], "topic", merge_base=True) == (
+        f"{root}/compare/{commits['b']}...{commits['t']}"
+    )
+    git("checkout", "--quiet", "--orphan", "unrelated")
+    orphan = commit(git, "orphan")
+    git("checkout", "--quiet", "--force", "master")
+    with pytest.raises(NoMergeBaseError):
+        weburl.diff("master", orphan, merge_base=True)
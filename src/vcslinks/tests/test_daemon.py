@@ -0,0 +1,156 @@
+import json
+import os
+import re
+import socket
+import threading
+
+import pytest  # type: ignore
+
+from ..browse import main
+from ..conftest import init_repository
+from ..daemon import Daemon, argv_to_request, try_daemon
+from .test_weburl import SHA_RE_STR
+
+ROOTURL = "https://github.com/USER/PROJECT"
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    daemon = Daemon(str(tmp_path / "run" / "daemon.sock"), idle_timeout=10)
+    daemon.bind()
+    thread = threading.Thread(target=daemon.serve, daemon=True)
+    thread.start()
+    yield daemon
+    daemon.idle_timeout = 0.01
+    try_daemon(["--dry-run"], daemon.path)  # wake up the accept loop
+    thread.join(timeout=10)
+
+
+def test_argv_to_request():
+    assert argv_to_request(["--dry-run", "file", "a.py", "1-2"], "/x") == {
+        "command": "file",
+        "cwd": "/x",
+        "path": ".",
+        "file": "a.py",
+        "lines": "1-2",
+        "permalink": None,
+    }
+    assert argv_to_request(["commit", "--short"], "/x")["short"] is True
+    assert argv_to_request(["--help"], "/x") is None
+    assert argv_to_request(["no-such-command"], "/x") is None
+    assert argv_to_request(["serve-stdio"], "/x") is None
+
+
+def test_try_daemon(github_repository, daemon, monkeypatch, capsys):
+    monkeypatch.delenv("GIT_DIR", raising=False)
+    assert try_daemon(["--dry-run", "file", "README.md"], daemon.path) == 0
+    assert capsys.readouterr().out == f"Open: {ROOTURL}/blob/master/README.md\n"
+
+    assert try_daemon(["--dry-run", "blame", "README.md", "1"], daemon.path) == 0
+    out = capsys.readouterr().out
+    assert re.match(f"^Open: {ROOTURL}/blame/{SHA_RE_STR}/README.md#L1$", out)
+
+    assert try_daemon(["--dry-run", "commit", "no-such"], daemon.path) == 1
+    assert try_daemon(["--version"], daemon.path) is None
+
+
+def test_same_repository_as_in_process(repository, daemon, monkeypatch, capsys):
+    # <file> in a repository nested in the current one (but not a
+    # submodule) is linked in the current one, as in-process:
+    nested = repository / "nested"
+    nested.mkdir()
+    git = init_repository(nested, url="git@gitlab.com:USER/NESTED.git")
+    (nested / "README.md").write_text("")
+    git("add", "README.md")
+    git("commit", "--quiet", "--message", "first")
+    monkeypatch.chdir(str(repository))
+    monkeypatch.delenv("GIT_DIR", raising=False)
+
+    main(["--dry-run", "file", "nested/README.md"])
+    expected = capsys.readouterr().out
+    assert expected == f"Open: {ROOTURL}/blob/master/nested/README.md\n"
+    assert try_daemon(["--dry-run", "file", "nested/README.md"], daemon.path) == 0
+    assert capsys.readouterr().out == expected
+
+
+def test_try_daemon_fallback(tmp_path, monkeypatch):
+    assert try_daemon(["auto"], str(tmp_path / "missing.sock")) is None
+    (tmp_path / "stale.sock").touch()
+    assert try_daemon(["auto"], str(tmp_path / "stale.sock")) is None
+    monkeypatch.setenv("GIT_DIR", str(tmp_path))
+    assert try_daemon(["auto"], str(tmp_path / "stale.sock")) is None
+
+
+def test_try_daemon_private(tmp_path):
+    directory = tmp_path / "run"
+    directory.mkdir(mode=0o700)
+    path = str(directory / "daemon.sock")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.bind(path)
+        sock.listen(1)
+        os.chmod(path, 0o755)
+        assert try_daemon(["auto"], path) is None
+        with pytest.raises(RuntimeError):
+            Daemon(path).bind()
+        os.chmod(path, 0o700)
+        directory.chmod(0o755)
+        assert try_daemon(["auto"], path) is None
+        with pytest.raises(RuntimeError):
+            Daemon(path).bind()
+    finally:
+        sock.close()
+
+
+def request(path, data):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(10)
+        sock.connect(path)
+        sock.sendall(data + b"\n")
+        return json.loads(sock.makefile("rb").readline())
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"not json",
+        b"[]",
+        b"{}",
+        b'{"argv": 1, "cwd": "/"}',
+        b'{"argv": [1], "cwd": "/"}',
+        b'{"argv": ["auto"]}',
+    ],
+)
+def test_malformed_request(daemon, data):
+    assert request(daemon.path, data) == {"fallback": True}
+    # The daemon keeps serving:
+    assert request(daemon.path, b"[]") == {"fallback": True}
+
+
+def test_unexpected_error(daemon, monkeypatch):
+    def fail(data):
+        raise AssertionError("bug")
+
+    monkeypatch.setattr(daemon, "respond", fail)
+    data = json.dumps({"argv": ["auto"], "cwd": "/"}).encode()
+    assert request(daemon.path, data) == {"fallback": True}
+
+
+def test_client_opens_url(daemon, monkeypatch, capsys):
+    # How to open the URL is not taken from the response:
+    url = "https://example.com"
+    response = {"url": url, "dry_run": False, "browser": "rm -rf"}
+    monkeypatch.setattr(daemon, "respond", lambda data: response)
+    assert try_daemon(["--dry-run", "auto"], daemon.path) == 0
+    assert capsys.readouterr().out == f"Open: {url}\n"
+
+    opened = []
+    monkeypatch.setattr("webbrowser.open", opened.append)
+    assert try_daemon(["auto"], daemon.path) == 0
+    assert opened == [url]
+
+
+def test_idle_exit(tmp_path):
+    path = tmp_path / "daemon.sock"
+    Daemon(str(path), idle_timeout=0.01).serve()
+    assert not path.exists()
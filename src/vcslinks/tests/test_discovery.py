@@ -0,0 +1,143 @@
+import os
+import shutil
+import subprocess
+
+import pytest  # type: ignore
+
+from ..conftest import git_at
+from ..discovery import RepoFinder
+from ..git import GitRepoAnalyzer
+
+
+def rev_parse_location(path):
+    git = git_at(path)
+    return (
+        git("rev-parse", "--show-toplevel"),
+        git("rev-parse", "--absolute-git-dir"),
+        os.path.realpath(os.path.join(str(path), git("rev-parse", "--git-common-dir"))),
+    )
+
+
+def as_strings(location):
+    return tuple(map(str, location))
+
+
+@pytest.fixture(scope="module")
+def layout(tmp_path_factory):
+    base = tmp_path_factory.mktemp("vcslinks-discovery")
+    main = base / "main"
+    lib = base / "lib"
+    for path in [main, lib]:
+        path.mkdir()
+        git = git_at(path)
+        git("init", "--quiet")
+        git("commit", "--quiet", "--allow-empty", "--message", "first")
+    git = git_at(main)
+    (main / "a" / "b").mkdir(parents=True)
+    git("submodule", "--quiet", "add", str(lib), "vendor/lib")
+    git("commit", "--quiet", "--message", "add submodule")
+    git("worktree", "add", "--quiet", str(base / "wt"))
+    return base
+
+
+@pytest.mark.parametrize(
+    "relpath", ["main", "main/a/b", "main/vendor/lib", "main/vendor", "wt", "lib"]
+)
+def test_matches_git(layout, relpath):
+    path = layout / relpath
+    location = RepoFinder(environ={}).find(path)
+    assert location is not None
+    assert as_strings(location) == rev_parse_location(path)
+
+
+def test_ceiling(layout):
+    finder = RepoFinder(environ={"GIT_CEILING_DIRECTORIES": str(layout / "main")})
+    assert finder.find(layout / "main" / "a") is None
+    assert finder.find(layout / "main") is not None
+
+
+def test_git_dir_environment(layout):
+    main = layout / "main"
+    environ = {"GIT_DIR": str(main / ".git"), "GIT_WORK_TREE": str(main)}
+    location = RepoFinder(environ=environ).find(layout)
+    assert as_strings(location)[:2] == rev_parse_location(main)[:2]
+    assert RepoFinder(environ={"GIT_DIR": str(main / ".git")}).find(main) is None
+
+
+def test_memo(layout, monkeypatch):
+    finder = RepoFinder(environ={})
+    expected = finder.find(layout / "main" / "a" / "b")
+    assert finder.find(layout / "main" / "a") is expected
+
+    def fail(*args, **kwargs):
+        raise AssertionError("unexpected probe")
+
+    monkeypatch.setattr(finder, "_probe", fail)
+    for _ in range(100):
+        assert finder.find(layout / "main" / "a" / "b") is expected
+        assert finder.find(layout / "main") is expected
+
+
+def test_symlink_into_other_repository(tmp_path, monkeypatch):
+    for name in ["A", "B"]:
+        (tmp_path / name).mkdir()
+        git_at(tmp_path / name)("init", "--quiet")
+    (tmp_path / "B" / "sub").mkdir()
+    link = tmp_path / "A" / "lnk"
+    link.symlink_to(tmp_path / "B" / "sub")
+    finder = RepoFinder(environ={})
+    location = finder.find(link)
+    assert as_strings(location) == rev_parse_location(link)
+    assert location.root == (tmp_path / "B").resolve()
+    assert finder.find(tmp_path / "A").root == (tmp_path / "A").resolve()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("unexpected probe")
+
+    monkeypatch.setattr(finder, "_probe", fail)
+    assert finder.find(tmp_path / "B" / "sub") is location
+
+
+def test_memo_invalidation(tmp_path):
+    finder = RepoFinder(environ={})
+    outer = tmp_path / "outer"
+    (outer / "a" / "b").mkdir(parents=True)
+    git_at(outer)("init", "--quiet")
+    assert finder.find(outer / "a" / "b").root == outer
+
+    # Nested repository:
+    git_at(outer / "a")("init", "--quiet")
+    assert finder.find(outer / "a" / "b").root == outer / "a"
+    assert finder.find(outer).root == outer
+
+    # Moved and deleted repositories:
+    moved = tmp_path / "moved"
+    (outer / "a").rename(moved)
+    assert finder.find(moved / "b").root == moved
+    shutil.rmtree(str(outer / ".git"))
+    assert finder.find(outer) is None
+
+
+def test_bare_core_worktree(tmp_path):
+    git_at(tmp_path)("init", "--quiet")
+    with open(str(tmp_path / ".git" / "config"), "a") as file:
+        file.write("[core]\n\tworktree\n")
+    # Left to `git rev-parse`:
+    assert RepoFinder(environ={}).find(tmp_path) is None
+
+
+def test_memo_size(layout):
+    finder = RepoFinder(environ={}, size=2)
+    for path in ["main", "main/a", "main/a/b", "wt", "lib"]:
+        assert finder.find(layout / path) is not None
+        assert len(finder._memo) <= 2
+
+
+def test_analyzer_does_not_spawn(layout, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError(f"unexpected subprocess: {args}")
+
+    monkeypatch.setattr(subprocess, "run", fail)
+    repo = GitRepoAnalyzer.from_path(layout / "main" / "a" / "b")
+    assert repo.root == layout.resolve() / "main"
+    assert repo.current_branch() == "master"
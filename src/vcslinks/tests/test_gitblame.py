@@ -0,0 +1,128 @@
+import subprocess
+import sys
+
+import pytest  # type: ignore
+
+from ..conftest import git_at, init_repository
+from ..git import GitRepoAnalyzer, LocalBranch
+from ..gitblame import blame_incremental, parse_incremental
+from ..tracing import trace
+
+
+@pytest.fixture(scope="module")
+def repository(tmp_path_factory):
+    path = tmp_path_factory.mktemp("vcslinks-blame")
+    git = init_repository(path)
+    lines = [f"line {n}\n" for n in range(1, 10001)]
+    (path / "big.txt").write_text("".join(lines))
+    git("add", "big.txt")
+    git("commit", "--quiet", "--message", "first")
+    lines[4] = "changed 5\n"
+    lines[5] = "changed 6\n"
+    (path / "big.txt").write_text("".join(lines))
+    git("commit", "--quiet", "--all", "--message", "second")
+    return path
+
+
+@pytest.fixture
+def weburl(repository):
+    return LocalBranch(GitRepoAnalyzer(repository), name="master").weburl()
+
+
+def commit_url(repository, revision):
+    oid = git_at(repository)("rev-parse", revision)
+    return f"https://github.com/USER/PROJECT/commit/{oid}"
+
+
+def test_blame_commits(repository, weburl):
+    first = commit_url(repository, "HEAD~")
+    second = commit_url(repository, "HEAD")
+    got = sorted(weburl.blame_commits(repository / "big.txt", lines=(3, 8)))
+    assert got == [((3, 4), first), ((5, 6), second), ((7, 8), first)]
+    assert list(weburl.blame_commits(repository / "big.txt", lines=6)) == [
+        ((6, 6), second)
+    ]
+    assert list(
+        weburl.blame_commits(repository / "big.txt", lines=(5, 6), revision="HEAD~")
+    ) == [((5, 6), first)]
+
+
+def test_blame_commits_uncommitted(repository, weburl):
+    path = repository / "big.txt"
+    original = path.read_text()
+    try:
+        path.write_text(original.replace("line 2\n", "dirty 2\n"))
+        got = sorted(weburl.blame_commits(path, lines=(1, 3)))
+    finally:
+        path.write_text(original)
+    first = commit_url(repository, "HEAD~")
+    assert got == [((1, 1), first), ((2, 2), None), ((3, 3), first)]
+
+
+def test_blame_commits_error(repository, weburl):
+    with pytest.raises(subprocess.CalledProcessError):
+        list(
+            weburl.blame_commits(repository / "big.txt", lines=(1, 2), revision="nope")
+        )
+
+
+def test_early_close_terminates_git(repository, monkeypatch):
+    procs = []
+    popen = subprocess.Popen
+
+    def recording_popen(*args, **kwargs):
+        proc = popen(*args, **kwargs)
+        procs.append(proc)
+        return proc
+
+    monkeypatch.setattr(subprocess, "Popen", recording_popen)
+    ranges = blame_incremental(GitRepoAnalyzer(repository), ["--", "big.txt"])
+    first = next(ranges)
+    ranges.close()
+    assert first.start >= 1
+    assert len(procs) == 1
+    assert procs[0].returncode is not None
+
+
+def test_blame_is_traced(repository, weburl):
+    with trace() as tracer:
+        list(weburl.blame_commits(repository / "big.txt", lines=1))
+    argv = [e["argv"][:2] for e in tracer.events if e["type"] == "process"]
+    assert ["git", "blame"] in argv
+
+
+def test_stream_drains_stderr(repository):
+    # More than a pipe buffer of standard error before any output:
+    script = "import sys; sys.stderr.write('x' * 1000000); print('done')"
+    repo = GitRepoAnalyzer(repository)
+    assert list(repo.stream(sys.executable, "-c", script)) == ["done\n"]
+    with pytest.raises(subprocess.CalledProcessError) as excinfo:
+        list(repo.stream(sys.executable, "-c", script + "; sys.exit(3)"))
+    assert excinfo.value.returncode == 3
+    assert len(excinfo.value.stderr) == 1000000
+
+
+def test_parse_incremental_shares_commit_info():
+    output = [
+        "a" * 40 + " 1 1 1\n",
+        "author A\n",
+        "previous " + "b" * 40 + " old.txt\n",
+        "filename new.txt\n",
+        "0" * 40 + " 2 2 1\n",
+        "author Not Committed Yet\n",
+        "filename new.txt\n",
+        "a" * 40 + " 5 3 2\n",
+        "filename new.txt\n",
+    ]
+    first, dirty, last = parse_incremental(output)
+    assert (first.start, first.end, last.start, last.end) == (1, 1, 3, 4)
+    assert first.info is last.info
+    assert first.info["author"] == "A"
+    assert first.committed and not dirty.committed
+
+
+def test_parse_incremental_rejects_garbage():
+    with pytest.raises(ValueError):
+        list(parse_incremental(["garbage\n"]))
+    with pytest.raises(ValueError):
+        list(parse_incremental(["a" * 40 + " 1 1 1\n", "author A\n"]))
@@ -0,0 +1,211 @@
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest  # type: ignore
+
+from ..conftest import count_runs, git_at
+from ..git import GitRepoAnalyzer
+from ..gitconfig import GitConfig, UnsupportedConfigError, config_files, parse_config
+
+# Indented with tabs, as Git writes it:
+TRICKY_CONFIG = r"""
+# comment
+[core]
+    autocrlf = false ; trailing comment
+[remote "origin"]
+    url = git@github.com:USER/PROJECT.git
+    url = https://github.com/USER/PROJECT
+    fetch = +refs/heads/*:refs/remotes/origin/*
+[branch "Feature.X"]
+    remote = origin
+    merge = refs/heads/feature
+[alias]
+    quoted = "  spaces  kept  "
+    escaped = a\tb \"c\" d\\e
+    continued = first \
+second
+    hash = "# not a comment"
+[Section.Deprecated]
+    Flag
+[sec "sub \"quoted\""] key = inline
+"""
+TRICKY_CONFIG = TRICKY_CONFIG.replace("\n    ", "\n\t")
+
+
+def isolated_environ(tmp_path, **extra):
+    environ = {
+        "HOME": str(tmp_path / "home"),
+        "XDG_CONFIG_HOME": str(tmp_path / "xdg"),
+        "GIT_CONFIG_NOSYSTEM": "1",
+    }
+    environ.update(extra)
+    return environ
+
+
+def git_config_list(cwd, environ):
+    out = subprocess.run(
+        ["git", "config", "--list", "-z"],
+        cwd=str(cwd),
+        env=environ,
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout
+    entries = []
+    for item in out.split("\0")[:-1]:
+        key, sep, value = item.partition("\n")
+        entries.append((key, value if sep else None))
+    return entries
+
+
+def test_parse_matches_git(tmp_path):
+    repo = tmp_path / "repo"
+    subprocess.run(["git", "init", "--quiet", str(repo)], check=True)
+    with open(str(repo / ".git" / "config"), "w") as io:
+        io.write(TRICKY_CONFIG)
+    environ = isolated_environ(tmp_path)
+
+    config = GitConfig.load(repo / ".git", environ=environ)
+    expected = git_config_list(repo, dict(environ, PATH="/usr/bin:/bin"))
+    actual = [(k, v) for k in config.keys() for v in config.raw_values(k)]
+    assert actual == expected
+
+    assert config.get("alias.quoted") == "  spaces  kept  "
+    assert config.get("alias.escaped") == 'a\tb "c" d\\e'
+    assert config.get("alias.continued") == "first second"
+    assert config.get("alias.hash") == "# not a comment"
+    assert config.get("section.deprecated.flag") == ""
+    assert config.get('sec.sub "quoted".key') == "inline"
+    assert config.get_all("remote.origin.url") == [
+        "git@github.com:USER/PROJECT.git",
+        "https://github.com/USER/PROJECT",
+    ]
+    assert config.get("branch.Feature.X.remote") == "origin"
+    assert config.get("branch.feature.x.remote") is None
+
+
+def test_include(tmp_path):
+    git_dir = tmp_path / "work" / "project" / ".git"
+    git_dir.mkdir(parents=True)
+    (git_dir / "HEAD").write_text("ref: refs/heads/topic/a\n")
+    (tmp_path / "home").mkdir()
+    (tmp_path / "home" / ".gitconfig").write_text(
+        """
+[include]
+    path = common.inc
+[includeIf "gitdir:work/"]
+    path = work.inc
+[includeIf "gitdir:/elsewhere/"]
+    path = missing.inc
+[includeIf "onbranch:topic/"]
+    path = topic.inc
+"""
+    )
+    (tmp_path / "home" / "common.inc").write_text("[user]\n name = common\n")
+    (tmp_path / "home" / "work.inc").write_text("[user]\n name = work\n")
+    (tmp_path / "home" / "topic.inc").write_text("[user]\n email = topic\n")
+    (git_dir / "config").write_text("[user]\n email = local\n")
+
+    config = GitConfig.load(git_dir, environ=isolated_environ(tmp_path))
+    assert config.get_all("user.name") == ["common", "work"]
+    assert config.get_all("user.email") == ["topic", "local"]
+    assert not config.is_stale()
+
+    (tmp_path / "home" / "work.inc").write_text("[user]\n name = changed\n")
+    assert config.is_stale()
+
+
+def test_unsupported(tmp_path):
+    git_dir = tmp_path / ".git"
+    git_dir.mkdir()
+    (git_dir / "config").write_text(
+        '[includeIf "hasconfig:remote.*.url:x"]\n path = x\n'
+    )
+    with pytest.raises(UnsupportedConfigError):
+        GitConfig.load(git_dir, environ=isolated_environ(tmp_path))
+
+    with pytest.raises(UnsupportedConfigError):
+        parse_config("[core]\n bad = \\q\n")
+
+    # Git rejects non-ASCII variable names:
+    with pytest.raises(UnsupportedConfigError):
+        parse_config("[core]\n \u00e9t\u00e9 = 1\n")
+
+    with pytest.raises(UnsupportedConfigError):
+        GitConfig.load(
+            git_dir, environ=isolated_environ(tmp_path, GIT_CONFIG_PARAMETERS="")
+        )
+
+
+@pytest.mark.parametrize(
+    "git, expected",
+    [
+        ("/usr/bin/git", "/etc/gitconfig"),
+        ("/opt/homebrew/bin/git", None),
+        ("/usr/local/bin/git", None),
+    ],
+)
+def test_system_config(tmp_path, monkeypatch, git, expected):
+    monkeypatch.setattr(shutil, "which", lambda _: git)
+    environ = isolated_environ(tmp_path)
+    del environ["GIT_CONFIG_NOSYSTEM"]
+    if expected is None:
+        with pytest.raises(UnsupportedConfigError):
+            config_files(tmp_path, environ=environ)
+    else:
+        system = config_files(tmp_path, environ=environ)[0]
+        assert system == ("system", Path(expected))
+
+
+def test_analyzer_uses_config(github_repository, monkeypatch):
+    repo = GitRepoAnalyzer(github_repository)
+    assert repo.config is not None
+
+    def fail(*args, **kwargs):
+        raise AssertionError(f"unexpected subprocess: {args}")
+
+    monkeypatch.setattr(subprocess, "run", fail)
+    assert repo.remote_of_branch("master") == "origin"
+    assert repo.remote_of_branch("no-such-branch") is None
+    assert repo.remote_all_urls("master") == ["http://github.com/USER/PROJECT"]
+    assert repo.remote_branch("master") == "master"
+    assert repo.try_git_config("no.such.key") is None
+
+
+def test_snapshot(tmp_path, monkeypatch):
+    git = git_at(tmp_path)
+    git("init", "--quiet")
+    git("remote", "add", "origin", "http://github.com/USER/PROJECT")
+    git("config", "branch.master.remote", "origin")
+    git("config", "branch.master.merge", "refs/heads/master")
+    # Git prints origins relative to the top of the working tree:
+    (tmp_path / "sub").mkdir()
+    repo = GitRepoAnalyzer(tmp_path / "sub", config_snapshot=True)
+    calls = count_runs(monkeypatch)
+    assert repo.remote_of_branch("no-such-branch") is None
+    assert repo.remote_all_urls("master") == ["http://github.com/USER/PROJECT"]
+    assert repo.remote_branch("master") == "master"
+    assert calls == [("git", "config", "--list", "-z", "--show-origin")]
+
+    config = repo.config
+    assert config is not None
+    assert repo.common_dir / "config" in config.origins
+    assert tmp_path / "sub" / ".git" / "config" not in config.origins
+    assert not config.is_stale()
+    with open(str(repo.common_dir / "config"), "a") as io:
+        io.write("[vcslinks]\n\tdummy = 1\n")
+    assert config.is_stale()
+
+    repo.reload_config()
+    assert repo.git_config("vcslinks.dummy") == "1"
+
+
+def test_subsection_values_bare_key():
+    config = GitConfig()
+    for key, value in parse_config('[vcslinks "a.example.com"]\n\tprovider\n'):
+        config.add(key, value)
+    config.add("vcslinks.b.example.com.provider", "gitlab")
+    assert config.subsection_values("vcslinks", "provider") == {
+        "b.example.com": "gitlab"
+    }
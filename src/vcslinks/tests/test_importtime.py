@@ -0,0 +1,118 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest  # type: ignore
+
+SRC = str(Path(__file__).parents[2])
+
+# Modules which must not be loaded by importing each module.  Loading
+# them accounts for most of the import time; e.g., ``vcsbrowse`` loads
+# `vcslinks.api` only after the daemon client fails.  Finer timing is
+# left to the ``vcsbrowse.*`` benchmarks (see ``benchmarks/run.py``).
+NOT_LOADED = {
+    "vcslinks": ["subprocess", "vcslinks.api", "vcslinks.git", "vcslinks.weburl"],
+    "vcslinks.browse": [
+        "dataclasses",
+        "json",
+        "shlex",
+        "socket",
+        "subprocess",
+        "vcslinks.api",
+        "vcslinks.git",
+        "webbrowser",
+    ],
+    "vcslinks.api": [
+        "argparse",
+        "asyncio",
+        "json",
+        "vcslinks.commitgraph",
+        "vcslinks.objects",
+        "webbrowser",
+    ],
+}
+
+# Cumulative ``-X importtime`` budget of ``import vcslinks`` in
+# microseconds; over ten times the measured time, so that it only
+# catches heavy imports creeping back in:
+IMPORT_BUDGET_US = 50000
+
+
+def run_python(code, *options):
+    pythonpath = os.pathsep.join(filter(None, [SRC, os.environ.get("PYTHONPATH")]))
+    env = dict(os.environ, PYTHONPATH=pythonpath)
+    return subprocess.run(
+        [sys.executable, *options, "-c", code],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+
+def loaded_modules(module):
+    code = f"""
+import sys
+import {module}
+print(" ".join(sorted(sys.modules)))
+"""
+    return set(run_python(code).stdout.split())
+
+
+@pytest.mark.parametrize("module", sorted(NOT_LOADED))
+def test_import_loads_little(module):
+    loaded = loaded_modules(module)
+    assert module in loaded
+    assert loaded.isdisjoint(NOT_LOADED[module])
+
+
+def test_lazy_imports():
+    code = """
+import sys
+import vcslinks
+print(" ".join(sorted(sys.modules)))
+vcslinks.WebURL
+import vcslinks.browse
+print(" ".join(sorted(sys.modules)))
+"""
+    first, second = map(str.split, run_python(code).stdout.splitlines())
+    assert "subprocess" not in first
+    assert "vcslinks.api" not in first
+    assert "webbrowser" not in second
+    assert "dataclasses" not in second
+    # The daemon client runs before the analyzer is needed:
+    assert "vcslinks.api" not in second
+
+
+BACKENDS = [
+    "vcslinks.catfile",
+    "vcslinks.commitgraph",
+    "vcslinks.gitblame",
+    "vcslinks.hostrules",
+    "vcslinks.linemap",
+    "vcslinks.objects",
+    "vcslinks.reftable",
+    "vcslinks.submodules",
+    "vcslinks.tracing",
+]
+
+
+def test_lazy_backends():
+    assert loaded_modules("vcslinks.git").isdisjoint(BACKENDS)
+
+
+def import_time_us(module):
+    # Lines are "import time: <self> | <cumulative> | <indented name>":
+    stderr = run_python(f"import {module}", "-X", "importtime").stderr
+    for line in stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1])
+    raise AssertionError(f"{module} not found in:\n{stderr}")
+
+
+def test_import_budget():
+    # Best of a few runs, as a single one may hit a cold cache:
+    assert min(import_time_us("vcslinks") for _ in range(3)) < IMPORT_BUDGET_US
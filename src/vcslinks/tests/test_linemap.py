@@ -0,0 +1,165 @@
+import asyncio
+import os
+import subprocess
+
+import pytest  # type: ignore
+
+from .. import aio, api
+from ..cache import default_cache
+from ..conftest import count_runs, git_at, init_repository
+from ..git import GitRepoAnalyzer, LocalBranch
+from ..linemap import LineMap, UncommittedLinesError, default_linemaps
+
+ORIGINAL = "".join(f"line {n}\n" for n in range(1, 11))
+
+
+@pytest.fixture
+def repository(tmp_path):
+    git = init_repository(tmp_path)
+    (tmp_path / "file.txt").write_text(ORIGINAL)
+    git("add", "file.txt")
+    git("commit", "--quiet", "--message", "first")
+    default_linemaps.clear()
+    return tmp_path
+
+
+@pytest.fixture
+def weburl(repository):
+    return LocalBranch(GitRepoAnalyzer(repository), name="master").weburl()
+
+
+def blob_url(repository, lines, kind="blob"):
+    oid = git_at(repository)("rev-parse", "HEAD")
+    return f"https://github.com/USER/PROJECT/{kind}/{oid}/file.txt#{lines}"
+
+
+def edit(path, text):
+    # Make sure the modification time changes even on coarse file systems:
+    stat = os.stat(str(path))
+    path.write_text(text)
+    os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_unmodified(repository, weburl):
+    path = repository / "file.txt"
+    assert weburl.file(path, lines=(5, 6)) == blob_url(repository, "L5-L6")
+
+
+def test_lines_shifted(repository, weburl):
+    path = repository / "file.txt"
+    edit(path, "new 1\nnew 2\n" + ORIGINAL.replace("line 8\n", ""))
+    assert weburl.file(path, lines=(5, 6)) == blob_url(repository, "L3-L4")
+    assert weburl.file(path, lines=10) == blob_url(repository, "L9")
+    assert weburl.blame(path, lines=10) == blob_url(repository, "L9", "blame")
+    # Lines given for an explicit revision or a branch are not mapped:
+    assert weburl.file(path, lines=9, revision="HEAD").endswith("#L9")
+    assert weburl.file(path, lines=5, permalink=False).endswith("/master/file.txt#L5")
+
+
+def test_lines_not_committed(repository, weburl):
+    path = repository / "file.txt"
+    edit(path, ORIGINAL.replace("line 3\n", "changed 3\n"))
+    with pytest.raises(UncommittedLinesError) as excinfo:
+        weburl.file(path, lines=(3, 5))
+    assert str(excinfo.value) == (
+        "Lines 3-5 of file.txt do not exist in "
+        + git_at(repository)("rev-parse", "HEAD")
+        + " (they are changed in the working tree)."
+    )
+    # Ranges with unchanged ends are mapped:
+    assert weburl.file(path, lines=(2, 4)) == blob_url(repository, "L2-L4")
+
+
+def test_crlf_is_not_a_change(repository, weburl):
+    path = repository / "file.txt"
+    edit(path, "new\n" + ORIGINAL)
+    path.write_bytes(path.read_bytes().replace(b"\n", b"\r\n"))
+    assert weburl.file(path, lines=3) == blob_url(repository, "L2")
+
+
+def test_diff_cached(repository, weburl, monkeypatch):
+    path = repository / "file.txt"
+    edit(path, "new\n" + ORIGINAL)
+    line2 = blob_url(repository, "L2")
+    line1 = blob_url(repository, "L1")
+    assert weburl.file(path, lines=3) == line2
+
+    calls = count_runs(monkeypatch)
+    for _ in range(10):
+        assert weburl.file(path, lines=3) == line2
+    assert calls == []
+
+    edit(path, "new\nnew\n" + ORIGINAL)
+    assert weburl.file(path, lines=3) == line1
+    assert [args[1:3] for args in calls] == [("cat-file", "blob")]
+
+
+def test_batch_and_aio(repository, weburl):
+    # Permalinks resolved once for many files are mapped as well:
+    path = repository / "file.txt"
+    edit(path, "new 1\nnew 2\n" + ORIGINAL)
+    line1 = blob_url(repository, "L1")
+    blame1 = blob_url(repository, "L1", "blame")
+    default_cache.clear()
+    assert weburl.file(path, lines=3) == line1
+    assert list(api.files([(path, 3), (path, 4)])) == [
+        line1,
+        blob_url(repository, "L2"),
+    ]
+    assert list(api.blames([(path, 3)])) == [blame1]
+    assert asyncio.run(aio.file(path, lines=3)) == line1
+    assert asyncio.run(aio.blame(path, lines=3)) == blame1
+    # Lines given for an explicit revision are not mapped:
+    assert list(api.files([(path, 3)], revision="HEAD"))[0].endswith("#L3")
+    assert asyncio.run(aio.file(path, lines=3, revision="HEAD")).endswith("#L3")
+    default_cache.clear()
+
+
+def test_batch_coprocess(repository, monkeypatch):
+    path = repository / "file.txt"
+    edit(path, "new\n" + ORIGINAL)
+    line2 = blob_url(repository, "L2")
+    with GitRepoAnalyzer(repository, batch=True) as repo:
+        weburl = LocalBranch(repo, name="master").weburl()
+
+        def fail(*args, **kwargs):
+            raise AssertionError(f"unexpected subprocess: {args}")
+
+        monkeypatch.setattr(subprocess, "run", fail)
+        assert weburl.file(path, lines=3) == line2
+        assert repo.batch.read("no-such-object") is None
+        assert repo.batch.read("HEAD:file.txt") == ORIGINAL.encode()
+
+
+@pytest.mark.parametrize(
+    "old, new",
+    [
+        ("abcdef", "abcdef"),
+        ("abcdef", "xabcdef"),
+        ("abcdef", "abcdefx"),
+        ("abcdef", "abxxef"),
+        ("abcdef", "af"),
+        ("abcdef", ""),
+        ("", "abc"),
+        ("aaaa", "aaaaaa"),
+        ("abcabc", "abxabc"),
+    ],
+)
+def test_linemap_agrees_with_difflib(old, new):
+    import difflib
+
+    expected = {}
+    matcher = difflib.SequenceMatcher(None, list(old), list(new), autojunk=False)
+    for a, b, size in matcher.get_matching_blocks():
+        for k in range(size):
+            expected[b + k + 1] = a + k + 1
+    linemap = LineMap([c.encode() for c in old], [c.encode() for c in new])
+    got = {n: linemap.map_line(n) for n in range(1, len(new) + 1)}
+    # Stripping the common prefix and suffix never loses matches:
+    assert sum(v is not None for v in got.values()) >= len(expected)
+    for n, m in got.items():
+        if m is not None:
+            assert old[m - 1] == new[n - 1]
+    assert [m for m in got.values() if m is not None] == sorted(
+        m for m in got.values() if m is not None
+    )
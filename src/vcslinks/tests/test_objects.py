@@ -0,0 +1,152 @@
+import subprocess
+from pathlib import Path
+
+import pytest  # type: ignore
+
+from ..base import AmbiguousRevisionError, InvalidRevisionError
+from ..conftest import git_at, init_repository
+from ..git import GitRepoAnalyzer, LocalBranch
+from ..objects import ObjectDatabase, PackIndex
+from ..tracing import trace
+
+
+def add_files(path, git, names):
+    for name in names:
+        (path / name).write_text(f"{name}\n")
+    git("add", *names)
+    git("commit", "--quiet", "--message", f"add {names[0]}...")
+
+
+@pytest.fixture(scope="module")
+def repository(tmp_path_factory):
+    # Enough objects for 4-digit prefixes to collide, some packed and
+    # some loose:
+    path = tmp_path_factory.mktemp("objects")
+    git = init_repository(path)
+    add_files(path, git, [f"packed{i}.txt" for i in range(600)])
+    git("repack", "--quiet", "-a", "-d")
+    add_files(path, git, [f"loose{i}.txt" for i in range(300)])
+    oids = git("rev-list", "--objects", "--all").split("\n")
+    return path, git, sorted(line.split()[0] for line in oids)
+
+
+def objects_of(path):
+    return ObjectDatabase(Path(path) / ".git" / "objects")
+
+
+def ambiguous_prefix(oids, length=4):
+    prefixes = [oid[:length] for oid in oids]
+    return next(p for p, q in zip(prefixes, prefixes[1:]) if p == q)
+
+
+def test_pack_index(repository):
+    path, git, _ = repository
+    (idx,) = (path / ".git" / "objects" / "pack").glob("pack-*.idx")
+    with open(str(idx), "rb") as file:
+        output = subprocess.run(
+            ["git", "show-index"], stdin=file, stdout=subprocess.PIPE, check=True
+        ).stdout.decode()
+    expected = sorted(line.split()[1] for line in output.splitlines())
+    index = PackIndex(idx)
+    assert [index.oid(i) for i in range(len(index))] == expected
+
+    # Version 1 index of the same pack:
+    v1 = path / "v1.idx"
+    pack = idx.with_suffix(".pack")
+    git("index-pack", "--index-version=1", "-o", str(v1), str(pack))
+    index_v1 = PackIndex(v1)
+    assert [index_v1.oid(i) for i in range(len(index_v1))] == expected
+    prefix = expected[100][:5]
+    assert list(index_v1.iter_prefix(prefix)) == list(index.iter_prefix(prefix))
+
+
+def test_find_agrees_with_git(repository):
+    path, git, oids = repository
+    objects = objects_of(path)
+    for oid in oids[::7] + [ambiguous_prefix(oids) + "0" * 36]:
+        for length in (4, 5, 6):
+            prefix = oid[:length]
+            expected = git("rev-parse", f"--disambiguate={prefix}").split()
+            assert objects.find(prefix, limit=None) == sorted(expected)
+
+
+def test_abbreviate_agrees_with_git(repository):
+    path, git, oids = repository
+    objects = objects_of(path)
+    full = [line.split()[2] for line in git("ls-tree", "HEAD").splitlines()]
+    short = [
+        line.split()[2] for line in git("ls-tree", "--abbrev=4", "HEAD").splitlines()
+    ]
+    assert [objects.abbreviate(oid, 4) for oid in full] == short
+    assert objects.abbreviate(oids[0], 40) == oids[0]
+
+
+def test_resolve_abbreviation(repository):
+    path, git, oids = repository
+    repo = GitRepoAnalyzer(path)
+    head = git("rev-parse", "HEAD")
+    prefix = ambiguous_prefix(oids)
+    with trace() as tracer:
+        assert repo.resolve_revision(head[:8]) == head
+        assert repo.resolve_revision(head[:8].upper()) == head
+        assert repo.abbreviate(head) == git("rev-parse", "--short", "HEAD")
+        with pytest.raises(AmbiguousRevisionError) as excinfo:
+            repo.resolve_revision(prefix)
+        results = repo.resolve_revisions([head[:10], prefix])
+    assert not [e for e in tracer.events if e["type"] == "process"]
+    candidates = git("rev-parse", f"--disambiguate={prefix}").split()
+    assert excinfo.value.candidates == candidates
+    assert results[0] == head
+    assert isinstance(results[1], AmbiguousRevisionError)
+    assert isinstance(results[1], InvalidRevisionError)
+
+    # Refs take precedence over abbreviations:
+    git("tag", prefix, "HEAD~1")
+    try:
+        assert repo.resolve_revision(prefix) == git("rev-parse", "HEAD~1")
+    finally:
+        git("tag", "--delete", prefix)
+
+    with pytest.raises(subprocess.CalledProcessError):
+        repo.resolve_revision("0000000")
+
+
+@pytest.mark.parametrize("value", ["4", "12", "auto", "no"])
+def test_core_abbrev(repository, value):
+    path, git, _ = repository
+    git("config", "core.abbrev", value)
+    try:
+        expected = git("rev-parse", "--short", "HEAD")
+        repo = GitRepoAnalyzer(path)
+        assert repo.abbreviate(git("rev-parse", "HEAD")) == expected
+    finally:
+        git("config", "--unset", "core.abbrev")
+
+
+def test_alternates(repository, tmp_path):
+    path, git, oids = repository
+    clone = tmp_path / "clone"
+    git("clone", "--quiet", "--shared", str(path), str(clone))
+    git_at(clone)("commit", "--quiet", "--allow-empty", "--message", "new")
+    objects = objects_of(clone)
+    assert len(objects.directories()) == 2
+    assert objects.expand(oids[0][:12]) == oids[0]
+    new = git_at(clone)("rev-parse", "HEAD")
+    expected = git_at(clone)("rev-parse", "--short=4", new)
+    assert objects.abbreviate(new, 4) == expected
+
+
+def test_short_links(repository):
+    path, git, _ = repository
+    head = git("rev-parse", "HEAD")
+    short = git("rev-parse", "--short", "HEAD")
+    weburl = LocalBranch(GitRepoAnalyzer(path), name="master").weburl()
+    root = "https://github.com/USER/PROJECT"
+    assert weburl.commit(head[:9], short=True) == f"{root}/commit/{short}"
+    assert weburl.file(path / "loose1.txt", lines=1, short=True) == (
+        f"{root}/blob/{short}/loose1.txt#L1"
+    )
+    assert weburl.file(path / "loose1.txt", short=True) == (
+        f"{root}/blob/master/loose1.txt"
+    )
+    assert weburl.tree(permalink=True, short=True) == f"{root}/tree/{short}"
@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+
+import pytest  # type: ignore
+
+from .. import providers
+from ..git import LocalBranch
+from ..hostrules import HostRules
+from ..providers import Provider, get_provider, register_provider
+from ..testing import DummyRepoAnalyzer
+
+
+class Gitea(Provider):
+    name = "gitea"
+    hosts = ("gitea.example.com",)
+
+    def pull_request(self, rooturl, branch):
+        return f"{rooturl}/compare/master...{branch}"
+
+    def tree(self, rooturl, revision, relurl):
+        return f"{rooturl}/src/branch/{revision}" + (f"/{relurl}" if relurl else "")
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(providers, "_by_name", dict(providers._by_name))
+    monkeypatch.setattr(providers, "_by_host", dict(providers._by_host))
+    monkeypatch.setattr(providers, "_entry_points_loaded", False)
+    monkeypatch.setattr(providers, "_iter_entry_points", lambda: iter(()))
+
+
+def weburl_for(remote_url):
+    repo = DummyRepoAnalyzer()
+    repo.mock.remote_url.return_value = remote_url
+    return LocalBranch(repo).weburl()
+
+
+def test_builtin_providers():
+    assert get_provider("https://github.com/USER/PROJECT").name == "github"
+    assert get_provider("https://GitHub.com/USER/PROJECT").name == "github"
+    assert get_provider("https://bitbucket.org/USER/PROJECT").name == "bitbucket"
+    assert get_provider("https://git.example.com/USER/PROJECT").name == "generic"
+
+
+def test_generic_host(registry):
+    weburl = weburl_for("git@git.example.com:USER/PROJECT.git")
+    assert weburl.pull_request() is None
+    assert weburl.file("README.md", lines=(1, 2), permalink=False) == (
+        "https://git.example.com/USER/PROJECT/blob/master/README.md#L1-L2"
+    )
+
+
+def test_register_provider(registry):
+    register_provider(Gitea)
+    weburl = weburl_for("git@gitea.example.com:USER/PROJECT.git")
+    assert weburl.provider.name == "gitea"
+    assert weburl.pull_request() == (
+        "https://gitea.example.com/USER/PROJECT/compare/master...master"
+    )
+    assert weburl.tree() == "https://gitea.example.com/USER/PROJECT/src/branch/master"
+    assert not weburl.is_github()
+
+
+def test_entry_points(registry, monkeypatch):
+    loaded = []
+
+    def load():
+        loaded.append(True)
+        return Gitea
+
+    entry_point = SimpleNamespace(name="gitea", load=load)
+    monkeypatch.setattr(providers, "_iter_entry_points", lambda: iter([entry_point]))
+    assert get_provider("https://github.com/USER/PROJECT").name == "github"
+    assert loaded == []  # not loaded for known hosts
+    assert get_provider("https://gitea.example.com/USER/PROJECT").name == "gitea"
+    assert get_provider("https://other.example.com/USER/PROJECT").name == "generic"
+    assert loaded == [True]
+
+
+def test_broken_entry_point(registry, monkeypatch):
+    def load():
+        raise ImportError("No module named 'vcslinks_broken'")
+
+    entry_points = [
+        SimpleNamespace(name="broken", load=load),
+        SimpleNamespace(name="gitea", load=lambda: Gitea),
+    ]
+    monkeypatch.setattr(providers, "_iter_entry_points", lambda: iter(entry_points))
+    with pytest.warns(UserWarning, match="'broken'"):
+        assert get_provider("https://gitea.example.com/USER/PROJECT").name == "gitea"
+
+
+def test_self_hosted_gitlab_wiki(monkeypatch):
+    rules = HostRules([("code.example.com", "gitlab")])
+    monkeypatch.setattr(DummyRepoAnalyzer, "host_rules", rules)
+    weburl = weburl_for("git@code.example.com:USER/PROJECT.wiki.git")
+    assert weburl.rooturl == "https://code.example.com/USER/PROJECT/wikis"
+    assert weburl.is_gitlab_wiki()
+    assert weburl_for("git@github.com:USER/PROJECT.wiki.git").rooturl == (
+        "https://github.com/USER/PROJECT.wiki"
+    )
@@ -0,0 +1,96 @@
+import subprocess
+
+import pytest  # type: ignore
+
+from ..conftest import GIT_COMMAND_BASE
+from ..git import GitRepoAnalyzer
+from ..refs import PackedRefs, RefStore
+
+
+@pytest.fixture(scope="module")
+def tagged_repository(tmp_path_factory):
+    path = tmp_path_factory.mktemp("vcslinks-refs")
+
+    def git(*args):
+        return subprocess.run(
+            list(GIT_COMMAND_BASE) + list(args),
+            cwd=str(path),
+            check=True,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+        ).stdout.strip()
+
+    git("init", "--quiet")
+    git("commit", "--quiet", "--allow-empty", "--message", "first")
+    for i in range(50):
+        git("tag", f"v{i:03d}")
+    git("tag", "--annotate", "--message", "annotated", "release")
+    git("branch", "feature/x")
+    git("commit", "--quiet", "--allow-empty", "--message", "second")
+    git("pack-refs", "--all")
+    git("commit", "--quiet", "--allow-empty", "--message", "third")  # loose master
+    git("branch", "zzz")
+    return path, git
+
+
+NAMES = [
+    "HEAD",
+    "master",
+    "refs/heads/master",
+    "heads/master",
+    "feature/x",
+    "v000",
+    "v025",
+    "v049",
+    "tags/v010",
+    "release",
+    "zzz",
+]
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_resolve_matches_git(tagged_repository, name):
+    path, git = tagged_repository
+    store = RefStore(path / ".git")
+    assert store.resolve(name) == git("rev-parse", "--verify", name)
+
+
+@pytest.mark.parametrize("name", ["HEAD~1", "master^", "@{0}", "no-such-ref", "v0"])
+def test_resolve_fallback(tagged_repository, name):
+    path, _ = tagged_repository
+    assert RefStore(path / ".git").resolve(name) is None
+
+
+def test_peeled(tagged_repository):
+    path, git = tagged_repository
+    packed = PackedRefs(path / ".git" / "packed-refs")
+    oid, peeled = packed.lookup("refs/tags/release")
+    assert oid == git("rev-parse", "release")
+    assert peeled == git("rev-parse", "release^{commit}")
+    assert packed.lookup("refs/tags/v001")[1] is None
+    assert packed.lookup("refs/tags/v0") is None
+    assert packed.lookup("refs/tags/zzz") is None
+
+
+def test_current_branch(tagged_repository):
+    path, git = tagged_repository
+    store = RefStore(path / ".git")
+    assert store.current_branch() == "master"
+    git("checkout", "--quiet", "--detach")
+    try:
+        assert store.current_branch() == "HEAD"
+    finally:
+        git("checkout", "--quiet", "master")
+
+
+def test_analyzer_resolves_in_process(tagged_repository, monkeypatch):
+    path, git = tagged_repository
+    repo = GitRepoAnalyzer(path)
+    expected = git("rev-parse", "v001")
+
+    def fail(*args, **kwargs):
+        raise AssertionError(f"unexpected subprocess: {args}")
+
+    monkeypatch.setattr(subprocess, "run", fail)
+    assert repo.resolve_revision("v001") == expected
+    assert repo.current_branch() == "master"
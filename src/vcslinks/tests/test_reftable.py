@@ -0,0 +1,332 @@
+import hashlib
+import shutil
+import zlib
+
+import pytest  # type: ignore
+
+from ..conftest import init_repository
+from ..git import GitRepoAnalyzer, LocalBranch
+from ..reftable import (
+    Reftable,
+    ReftableError,
+    ReftableRefStore,
+    ReftableStack,
+    read_varint,
+)
+from ..tracing import trace
+
+
+def varint(value):
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        value -= 1
+        out.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(out))
+
+
+def encode_ref(value):
+    # Value type and payload of a ref record (update_index_delta is 0):
+    if value is None:
+        return 0, b"\0"
+    if isinstance(value, tuple):
+        return 2, b"\0" + bytes.fromhex(value[0]) + bytes.fromhex(value[1])
+    if value.startswith("ref: "):
+        target = value[len("ref: ") :].encode()
+        return 3, b"\0" + varint(len(target)) + target
+    return 1, b"\0" + bytes.fromhex(value)
+
+
+class BlockWriter:
+    def __init__(self, block_type, offset, header_size, block_size, interval):
+        self.offset = offset
+        self.header_size = header_size
+        self.block_size = block_size
+        self.interval = interval
+        self.body = bytearray(bytes([ord(block_type)]) + b"\0\0\0")
+        self.restarts = []
+        self.count = 0
+        self.last = b""
+
+    def add(self, key, value_type, payload):
+        restart = self.count % self.interval == 0
+        prefix = 0
+        if not restart:
+            while (
+                prefix < min(len(key), len(self.last))
+                and key[prefix] == self.last[prefix]
+            ):
+                prefix += 1
+        suffix = key[prefix:]
+        record = varint(prefix) + varint(len(suffix) << 3 | value_type)
+        record += suffix + payload
+        size = self.header_size + len(self.body) + len(record)
+        size += 3 * (len(self.restarts) + restart) + 2
+        if self.block_size and self.count and size > self.block_size:
+            return False
+        if restart:
+            self.restarts.append(self.header_size + len(self.body))
+        self.body += record
+        self.count += 1
+        self.last = key
+        return True
+
+    def finish(self, padded):
+        for restart in self.restarts:
+            self.body += restart.to_bytes(3, "big")
+        self.body += len(self.restarts).to_bytes(2, "big")
+        length = self.header_size + len(self.body)
+        self.body[1:4] = length.to_bytes(3, "big")
+        if padded and length < self.block_size:
+            self.body += b"\0" * (self.block_size - length)
+        return bytes(self.body)
+
+
+def write_table(
+    path,
+    refs,
+    block_size=256,
+    interval=4,
+    version=1,
+    padded=True,
+    index=True,
+    update_index=1,
+):
+    """
+    Write a reftable with the `refs` (a dictionary from refnames to
+    values as understood by `encode_ref`) and no logs.
+    """
+    header = b"REFT" + bytes([version]) + block_size.to_bytes(3, "big")
+    header += update_index.to_bytes(8, "big") * 2
+    if version == 2:
+        header += b"sha1"
+    out = bytearray(header)
+    blocks = []
+    writer = None
+    for name in sorted(refs):
+        key = name.encode()
+        value_type, payload = encode_ref(refs[name])
+        if writer is not None:
+            if writer.add(key, value_type, payload):
+                continue
+            blocks.append((writer.last, writer.offset))
+            out += writer.finish(padded)
+        # The first block starts with the file header:
+        offset, header_size = (len(out), 0) if blocks else (0, len(header))
+        writer = BlockWriter("r", offset, header_size, block_size, interval)
+        writer.add(key, value_type, payload)
+    if writer is not None:
+        blocks.append((writer.last, writer.offset))
+        out += writer.finish(padded)
+
+    ref_index = 0
+    if index and len(blocks) > 1:
+        ref_index = len(out)
+        writer = BlockWriter("i", ref_index, 0, 0, interval)
+        for last, offset in blocks:
+            writer.add(last, 0, varint(offset))
+        out += writer.finish(False)
+
+    footer = header + ref_index.to_bytes(8, "big") + bytes(32)
+    footer += zlib.crc32(footer).to_bytes(4, "big")
+    path.write_bytes(bytes(out + footer))
+    return len(blocks)
+
+
+def oid(n):
+    return hashlib.sha1(str(n).encode()).hexdigest()
+
+
+def sample_refs():
+    refs = {f"refs/tags/v{i:03d}": oid(i) for i in range(300)}
+    refs["refs/tags/release"] = (oid("tag"), oid(1))
+    refs["refs/heads/master"] = oid("master")
+    refs["refs/heads/feature/x"] = oid("x")
+    refs["HEAD"] = "ref: refs/heads/master"
+    return refs
+
+
+def test_read_varint():
+    for value in [0, 1, 127, 128, 255, 16383, 16511, 2 ** 24, 2 ** 40 + 12345]:
+        encoded = varint(value)
+        assert read_varint(b"\xff" + encoded, 1) == (value, 1 + len(encoded))
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"index": False},
+        {"padded": False},
+        {"version": 2},
+        {"interval": 1},
+        {"block_size": 4096},
+    ],
+)
+def test_table(tmp_path, options):
+    refs = sample_refs()
+    path = tmp_path / "table.ref"
+    num_blocks = write_table(path, refs, **options)
+    if "block_size" not in options:
+        assert num_blocks > 10
+    table = Reftable(path)
+    for name, value in refs.items():
+        record = table.lookup(name)
+        assert record is not None and record.name == name
+        if isinstance(value, tuple):
+            assert (record.oid, record.peeled) == value
+        elif value.startswith("ref: "):
+            assert (record.oid, record.target) == (None, value[len("ref: ") :])
+        else:
+            assert (record.oid, record.peeled, record.target) == (value, None, None)
+    for missing in ["A", "refs/tags/v", "refs/tags/v0000", "refs/tags/v299x", "z"]:
+        assert table.lookup(missing) is None
+    tags = [record.name for record in table.iter_prefix("refs/tags/v")]
+    assert tags == [f"refs/tags/v{i:03d}" for i in range(300)]
+    assert [record.name for record in table.iter_prefix("refs/heads/")] == [
+        "refs/heads/feature/x",
+        "refs/heads/master",
+    ]
+    assert list(table.iter_prefix("refs/remotes/")) == []
+
+
+def write_stack(path, tables):
+    path.mkdir(parents=True, exist_ok=True)
+    names = []
+    for i, refs in enumerate(tables, start=1):
+        # Table names end with a random suffix:
+        suffix = zlib.crc32(repr(sorted(refs.items())).encode())
+        name = f"0x{i:012x}-0x{i:012x}-{suffix:08x}.ref"
+        write_table(path / name, refs, update_index=i)
+        names.append(name)
+    (path / "tables.list").write_text("".join(f"{name}\n" for name in names))
+
+
+def test_stack(tmp_path):
+    older = {f"refs/heads/b{i:03d}": oid(i) for i in range(100)}
+    newer = {
+        "refs/heads/b010": oid("changed"),
+        "refs/heads/b020": None,
+        "refs/heads/b100": oid(100),
+    }
+    write_stack(tmp_path, [older, newer])
+    stack = ReftableStack(tmp_path)
+    assert len(stack.tables()) == 2
+    assert stack.lookup("refs/heads/b000").oid == oid(0)
+    assert stack.lookup("refs/heads/b010").oid == oid("changed")
+    assert stack.lookup("refs/heads/b020") is None
+    assert stack.lookup("refs/heads/b100").oid == oid(100)
+    expected = dict(older, **newer)
+    del expected["refs/heads/b020"]
+    assert [(r.name, r.oid) for r in stack.iter_prefix("refs/heads/")] == sorted(
+        expected.items()
+    )
+
+    # Compaction replaces the tables:
+    for path in tmp_path.glob("*.ref"):
+        path.unlink()
+    write_stack(tmp_path, [{"refs/heads/b000": oid("compacted")}])
+    assert len(stack.tables()) == 1
+    assert stack.lookup("refs/heads/b000").oid == oid("compacted")
+    assert stack.lookup("refs/heads/b001") is None
+
+
+def test_worktree_stack(tmp_path):
+    common = tmp_path / "common"
+    worktree = common / "worktrees" / "wt"
+    write_stack(
+        common / "reftable",
+        [{"HEAD": "ref: refs/heads/master", "refs/heads/master": oid("m")}],
+    )
+    write_stack(
+        worktree / "reftable",
+        [{"HEAD": oid("detached"), "refs/bisect/bad": oid("bad")}],
+    )
+    assert ReftableRefStore(common).current_branch() == "master"
+    store = ReftableRefStore(worktree, common)
+    assert store.current_branch() == "HEAD"
+    assert store.read_ref("HEAD") == oid("detached")
+    assert store.read_ref("refs/bisect/bad") == oid("bad")
+    assert store.read_ref("refs/heads/master") == oid("m")
+    assert list(store.iter_refs("refs/heads/")) == [("refs/heads/master", oid("m"))]
+
+
+@pytest.fixture(scope="module")
+def reftable_repository(tmp_path_factory):
+    # Git 2.39 cannot write reftables, so a repository with the "files"
+    # backend is converted by hand:
+    path = tmp_path_factory.mktemp("reftable")
+    git = init_repository(path)
+    git("commit", "--quiet", "--allow-empty", "--message", "first")
+    for i in range(200):
+        git("tag", f"v{i:03d}")
+    git("tag", "--annotate", "--message", "annotated", "release")
+    git("branch", "feature/x")
+    git("commit", "--quiet", "--allow-empty", "--message", "second")
+    git("update-ref", "refs/remotes/origin/master", "HEAD~1")
+    git("update-ref", "refs/remotes/origin/feature", "HEAD")
+    output = git("for-each-ref", "--format=%(refname) %(objectname) %(*objectname)")
+    refs = {}
+    for line in output.splitlines():
+        name, value, *peeled = line.split()
+        refs[name] = (value, peeled[0]) if peeled else value
+    refs["HEAD"] = "ref: refs/heads/master"
+    expected = {
+        name: git("rev-parse", "--verify", name)
+        for name in ["HEAD", "master", "feature/x", "v000", "v199", "release"]
+    }
+
+    git_dir = path / ".git"
+    if (git_dir / "packed-refs").exists():
+        (git_dir / "packed-refs").unlink()
+    shutil.rmtree(str(git_dir / "refs"))
+    (git_dir / "refs" / "heads").mkdir(parents=True)
+    (git_dir / "HEAD").write_text("ref: refs/heads/.invalid\n")
+    git("config", "core.repositoryformatversion", "1")
+    git("config", "extensions.refStorage", "reftable")
+    older = dict(refs, **{"refs/heads/feature/x": oid("old")})
+    newer = {"refs/heads/feature/x": refs["refs/heads/feature/x"]}
+    write_stack(git_dir / "reftable", [older, newer])
+    return path, expected
+
+
+def test_analyzer_resolves_in_process(reftable_repository):
+    path, expected = reftable_repository
+    repo = GitRepoAnalyzer(path)
+    with trace() as tracer:
+        assert isinstance(repo.refs, ReftableRefStore)
+        for name, oid_ in expected.items():
+            assert repo.resolve_revision(name) == oid_
+        assert repo.refs.peel("refs/tags/release") == expected["v000"]
+        assert repo.current_branch() == "master"
+        assert sorted(repo.remote_tips("origin")) == sorted(
+            [expected["master"], expected["v000"]]
+        )
+        tracking = repo.tracking_revision("master", "master")
+        assert tracking == "refs/remotes/origin/master"
+        weburl = LocalBranch(repo, name="master").weburl()
+        assert weburl.commit("v001") == (
+            f"https://github.com/USER/PROJECT/commit/{expected['v000']}"
+        )
+    assert not [e for e in tracer.events if e["type"] == "process"]
+
+
+def test_corrupt_table(reftable_repository):
+    path, _ = reftable_repository
+    stack = path / ".git" / "reftable"
+    for name in (stack / "tables.list").read_text().split():
+        (stack / name).write_bytes(b"not a reftable")
+    store = ReftableRefStore(path / ".git")
+    with pytest.raises(ReftableError):
+        store.exists("refs/remotes/origin/master")
+    with pytest.raises(ReftableError):
+        store.iter_refs("refs/remotes/origin/")
+
+    # Not mistaken for missing refs; Git is asked instead:
+    repo = GitRepoAnalyzer(path)
+    assert repo.commit_graph is None
+    with trace() as tracer:
+        repo.tracking_revision("master", "master")
+    argvs = [e["argv"] for e in tracer.events if e["type"] == "process"]
+    assert argvs and argvs[0][:2] == ["git", "show-ref"]
@@ -0,0 +1,89 @@
+import pytest  # type: ignore
+
+from .. import scanner
+from ..conftest import git_at
+from ..git import NoRemoteError
+from ..scanner import find_repositories, scan
+from ..weburl import UnsupportedURLError
+
+
+@pytest.fixture(scope="module")
+def workspace(tmp_path_factory):
+    base = tmp_path_factory.mktemp("vcslinks-workspace")
+    for name in ["lib", "app", "broken"]:
+        (base / name).mkdir()
+        git = git_at(base / name)
+        git("init", "--quiet")
+        git("commit", "--quiet", "--allow-empty", "--message", "first")
+    git_at(base / "lib")("remote", "add", "origin", "git@github.com:USER/lib.git")
+    git = git_at(base / "app")
+    git("remote", "add", "origin", "git@gitlab.com:USER/app.git")
+    git("submodule", "add", "--quiet", str(base / "lib"), "vendor/lib")
+    git("commit", "--quiet", "--message", "add submodule")
+    git("worktree", "add", "--quiet", "-b", "feature", str(base / "nested" / "wt"))
+    git("config", "branch.feature.remote", "origin")
+    git("worktree", "add", "--quiet", "-b", "inner", str(base / "app" / "trees" / "in"))
+    # An untracked clone inside a working tree is not looked for:
+    git("clone", "--quiet", str(base / "lib"), str(base / "app" / "build" / "lib"))
+    (base / "plain" / "dir").mkdir(parents=True)
+    return base
+
+
+def test_find_repositories(workspace):
+    found = [str(p.relative_to(workspace)) for p in find_repositories(workspace)]
+    assert found == [
+        "app",
+        "app/trees/in",
+        "app/vendor/lib",
+        "broken",
+        "lib",
+        "nested/wt",
+    ]
+
+
+def test_scan(workspace):
+    results = {str(r.path.relative_to(workspace)): r for r in scan(workspace)}
+    assert set(results) == {
+        "app",
+        "app/trees/in",
+        "app/vendor/lib",
+        "broken",
+        "lib",
+        "nested/wt",
+    }
+    assert results["app/trees/in"].branch == "inner"
+    assert results["app"].rooturl == "https://gitlab.com/USER/app"
+    # The submodule's remote is a local path:
+    assert isinstance(results["app/vendor/lib"].error, UnsupportedURLError)
+    assert results["lib"].rooturl == "https://github.com/USER/lib"
+    assert results["lib"].error is None
+    assert results["nested/wt"].branch == "feature"
+    assert results["nested/wt"].pull_request == (
+        "https://gitlab.com/USER/app/merge_requests/new"
+        "?merge_request%5Bsource_branch%5D=feature"
+    )
+    broken = results["broken"]
+    assert broken.rooturl is None
+    assert isinstance(broken.error, NoRemoteError)
+
+
+def test_scan_ordered(workspace):
+    paths = [r.path for r in scan(workspace, ordered=True, max_workers=2)]
+    assert paths == list(find_repositories(workspace))
+
+
+@pytest.mark.parametrize("ordered", [False, True])
+def test_scan_streams(workspace, monkeypatch, ordered):
+    walked = []
+
+    def walk(root_dir):
+        for path in find_repositories(root_dir):
+            walked.append(path)
+            yield path
+
+    monkeypatch.setattr(scanner, "find_repositories", walk)
+    results = scan(workspace, ordered=ordered, max_workers=1)
+    next(results)
+    # At most `IN_FLIGHT_PER_WORKER` analyses are submitted ahead:
+    assert len(walked) <= scanner.IN_FLIGHT_PER_WORKER
+    results.close()
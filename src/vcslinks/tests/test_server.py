@@ -0,0 +1,87 @@
+import io
+import json
+import re
+
+from ..browse import main
+from ..server import handle_request
+from .test_weburl import SHA_RE_STR
+
+ROOTURL = "https://github.com/USER/PROJECT"
+
+
+def test_handle_request(github_repository):
+    assert handle_request({"id": 1, "command": "root"}) == {"id": 1, "url": ROOTURL}
+    assert handle_request({"command": "file", "file": "README.md"}) == {
+        "url": f"{ROOTURL}/blob/master/README.md"
+    }
+    request = {"command": "file", "file": "README.md", "lines": [1, 2]}
+    url = handle_request(request)["url"]
+    assert re.match(f"^{ROOTURL}/blob/{SHA_RE_STR}/README.md#L1-L2$", url)
+    url = handle_request(
+        {"command": "blame", "file": "README.md", "lines": "1", "permalink": False}
+    )["url"]
+    assert url == f"{ROOTURL}/blame/master/README.md#L1"
+    url = handle_request({"command": "commit", "short": True})["url"]
+    assert re.match(f"^{ROOTURL}/commit/[0-9a-f]{{7}}$", url)
+    assert handle_request({"command": "nope"}) == {"error": "Unknown command: nope"}
+    assert "error" in handle_request({"command": "commit", "revision": "no-such"})
+    for command in ["commit", "tree", "file", "blame"]:
+        request = {"command": command, "permalink": True, "check_published": True}
+        if command in ("file", "blame"):
+            request["file"] = "README.md"
+        assert "is not pushed" in handle_request(request)["error"]
+    assert handle_request({"id": 2, "command": "file"}) == {
+        "id": 2,
+        "error": "Invalid request: missing file",
+    }
+
+
+def test_cwd(github_repository, tmp_path, monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    response = handle_request(
+        {"command": "file", "file": "README.md", "cwd": str(github_repository)}
+    )
+    assert response == {"url": f"{ROOTURL}/blob/master/README.md"}
+
+
+def test_missing_cwd(github_repository, tmp_path, monkeypatch, capsys):
+    requests = [
+        {"id": "a", "command": "root", "cwd": str(tmp_path / "no" / "such")},
+        {"id": "b", "command": "root"},
+    ]
+    lines = [json.dumps(r) for r in requests]
+    monkeypatch.setattr("sys.stdin", io.StringIO("\n".join(lines) + "\n"))
+    main(["serve-stdio"])
+    responses = list(map(json.loads, capsys.readouterr().out.splitlines()))
+    assert "No such file or directory" in responses[0]["error"]
+    assert responses[1] == {"id": "b", "url": ROOTURL}
+
+
+def test_serve_stdio(github_repository, monkeypatch, capsys):
+    requests = [
+        {"id": "a", "command": "log"},
+        "not json",
+        {"id": "b", "command": "tree"},
+    ]
+    lines = [r if isinstance(r, str) else json.dumps(r) for r in requests]
+    monkeypatch.setattr("sys.stdin", io.StringIO("\n".join(lines) + "\n\n"))
+    main(["serve-stdio"])
+    responses = list(map(json.loads, capsys.readouterr().out.splitlines()))
+    assert responses[0] == {"id": "a", "url": f"{ROOTURL}/commits/master"}
+    assert responses[1]["error"].startswith("Invalid JSON")
+    assert responses[2] == {"id": "b", "url": f"{ROOTURL}/tree/master"}
+
+
+def test_unexpected_error(repository, monkeypatch, capsys):
+    from ..conftest import git_at
+
+    git_at(repository)("config", "branch.master.merge", "refs/tags/v1")
+    requests = [{"id": "a", "command": "pull_request"}, {"id": "b", "command": "root"}]
+    lines = [json.dumps(r) for r in requests]
+    monkeypatch.chdir(str(repository))
+    monkeypatch.setattr("sys.stdin", io.StringIO("\n".join(lines) + "\n"))
+    main(["serve-stdio"])
+    responses = list(map(json.loads, capsys.readouterr().out.splitlines()))
+    assert responses[0]["id"] == "a"
+    assert "error" in responses[0]
+    assert responses[1] == {"id": "b", "url": ROOTURL}
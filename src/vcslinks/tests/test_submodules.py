@@ -0,0 +1,185 @@
+import shutil
+
+import pytest  # type: ignore
+
+from .. import submodules
+from ..api import analyze
+from ..base import ApplicationError, UnpublishedCommitError
+from ..conftest import count_runs, git_at
+from ..git import GitRepoAnalyzer
+
+
+@pytest.fixture(scope="module")
+def superproject(tmp_path_factory):
+    base = tmp_path_factory.mktemp("vcslinks-submodules")
+    for name in ["inner", "lib", "app"]:
+        (base / name).mkdir()
+        git = git_at(base / name)
+        git("init", "--quiet")
+        (base / name / "README.md").write_text(f"{name}\n" * 3)
+        git("add", "README.md")
+        git("commit", "--quiet", "--message", "first")
+    git_at(base / "lib")("submodule", "add", "--quiet", str(base / "inner"), "inner")
+    git_at(base / "lib")("commit", "--quiet", "--message", "add inner")
+
+    app = base / "app"
+    git = git_at(app)
+    git("remote", "add", "origin", "git@github.com:USER/app.git")
+    git("config", "branch.master.remote", "origin")
+    git("config", "branch.master.merge", "refs/heads/master")
+    git("submodule", "add", "--quiet", str(base / "lib"), "vendor/lib")
+    git("config", "--file", ".gitmodules", "submodule.vendor/lib.url", "../lib.git")
+    git("config", "--unset", "submodule.vendor/lib.url")
+    git("commit", "--quiet", "--all", "--message", "add lib")
+    git("submodule", "update", "--quiet", "--init", "--recursive")
+    git_at(app / "vendor" / "lib")(
+        "config", "submodule.inner.url", "git@gitlab.com:USER/inner.git"
+    )
+    return app
+
+
+def head(path):
+    return git_at(path)("rev-parse", "HEAD")
+
+
+def test_file_in_submodule(superproject):
+    weburl = analyze(superproject)
+    lib = superproject / "vendor" / "lib"
+    assert weburl.file(lib / "README.md", lines=1) == (
+        f"https://github.com/USER/lib/blob/{head(lib)}/README.md#L1"
+    )
+    assert weburl.blame(lib / "README.md", revision="master") == (
+        f"https://github.com/USER/lib/blame/{head(lib)}/README.md"
+    )
+    assert weburl.tree(lib) == f"https://github.com/USER/lib/tree/{head(lib)}"
+    short = git_at(lib)("rev-parse", "--short", "HEAD")
+    assert weburl.blame(lib / "README.md", short=True) == (
+        f"https://github.com/USER/lib/blame/{short}/README.md"
+    )
+    assert weburl.file(superproject / "README.md") == (
+        "https://github.com/USER/app/blob/master/README.md"
+    )
+
+
+def test_nested_submodule(superproject):
+    weburl = analyze(superproject)
+    inner = superproject / "vendor" / "lib" / "inner"
+    assert weburl.file(inner / "README.md") == (
+        f"https://gitlab.com/USER/inner/blob/{head(inner)}/README.md"
+    )
+
+
+def test_gitlinks_read_once(superproject, monkeypatch):
+    repo = GitRepoAnalyzer(superproject)
+    weburl = repo.find_submodule(superproject / "vendor" / "lib", None)[0]
+    calls = count_runs(monkeypatch)
+    for i in range(100):
+        path = superproject / "vendor" / "lib" / f"file{i}.txt"
+        assert repo.find_submodule(path, None)[0] is weburl
+        assert repo.find_submodule(superproject / f"file{i}.txt", None) is None
+    assert calls == []
+
+
+def test_gitlinks_cache_size(superproject, monkeypatch):
+    monkeypatch.setattr(submodules, "GITLINKS_CACHE_SIZE", 1)
+    read = []
+    read_gitlinks = submodules.read_gitlinks
+
+    def recording_read(repo, commit, paths):
+        read.append(commit)
+        return read_gitlinks(repo, commit, paths)
+
+    monkeypatch.setattr(submodules, "read_gitlinks", recording_read)
+    index = GitRepoAnalyzer(superproject).submodules
+    lib = index.lookup(["vendor", "lib"])
+    assert lib is not None
+    commits = [head(superproject), git_at(superproject)("rev-parse", "HEAD~")]
+    for commit in [commits[0], commits[0], commits[1], commits[0]]:
+        index.gitlink(lib, commit)
+    assert read == [commits[0], commits[1], commits[0]]
+
+
+def test_pinned_without_permalink(superproject):
+    # The superproject's branches do not exist in the submodule:
+    weburl = analyze(superproject)
+    lib = superproject / "vendor" / "lib"
+    assert weburl.file(lib / "README.md", permalink=False) == (
+        f"https://github.com/USER/lib/blob/{head(lib)}/README.md"
+    )
+    assert weburl.blame(lib / "README.md", lines=2, permalink=False) == (
+        f"https://github.com/USER/lib/blame/{head(lib)}/README.md#L2"
+    )
+    assert weburl.tree(lib, permalink=False) == (
+        f"https://github.com/USER/lib/tree/{head(lib)}"
+    )
+
+
+def test_history_in_submodule(superproject):
+    lib = superproject / "vendor" / "lib"
+    weburl, oid = GitRepoAnalyzer(superproject).find_submodule(lib, None)
+    first = git_at(lib)("rev-parse", "HEAD~")
+    assert weburl.repo.merge_base(first, oid) == first
+    assert weburl.repo.is_ancestor(first, oid)
+    assert not weburl.repo.is_ancestor(oid, first)
+
+
+@pytest.fixture
+def modified_superproject(superproject, tmp_path):
+    base = tmp_path / "base"
+    shutil.copytree(str(superproject.parent), str(base), symlinks=True)
+    return base / "app"
+
+
+def test_check_published(superproject, modified_superproject):
+    weburl = analyze(superproject)
+    lib = superproject / "vendor" / "lib"
+    assert weburl.file(lib / "README.md", check_published=True) == (
+        f"https://github.com/USER/lib/blob/{head(lib)}/README.md"
+    )
+
+    app = modified_superproject
+    lib = app / "vendor" / "lib"
+    git_at(lib)("commit", "--quiet", "--allow-empty", "--message", "local")
+    git_at(app)("commit", "--quiet", "--all", "--message", "update lib")
+    weburl = analyze(app)
+    assert weburl.file(lib / "README.md") == (
+        f"https://github.com/USER/lib/blob/{head(lib)}/README.md"
+    )
+    with pytest.raises(UnpublishedCommitError):
+        weburl.file(lib / "README.md", check_published=True)
+    with pytest.raises(UnpublishedCommitError):
+        weburl.blame(lib / "README.md", lines=1, check_published=True)
+    with pytest.raises(UnpublishedCommitError):
+        weburl.tree(lib, check_published=True)
+
+
+def test_map_lines_in_submodule(modified_superproject):
+    app = modified_superproject
+    lib = app / "vendor" / "lib"
+    inner = lib / "inner"
+    for path in [lib, inner]:
+        (path / "README.md").write_text("new\n" + (path / "README.md").read_text())
+    weburl = analyze(app)
+    assert weburl.file(lib / "README.md", lines=2) == (
+        f"https://github.com/USER/lib/blob/{head(lib)}/README.md#L1"
+    )
+    assert weburl.file(inner / "README.md", lines=(2, 3)) == (
+        f"https://gitlab.com/USER/inner/blob/{head(inner)}/README.md#L1-2"
+    )
+    # Lines of an explicit revision are not mapped:
+    assert weburl.file(lib / "README.md", lines=2, revision="HEAD") == (
+        f"https://github.com/USER/lib/blob/{head(lib)}/README.md#L2"
+    )
+
+
+def test_not_checked_out(modified_superproject):
+    app = modified_superproject
+    lib = app / "vendor" / "lib"
+    git_at(app)("submodule", "--quiet", "deinit", "--force", "vendor/lib")
+    weburl, oid = GitRepoAnalyzer(app).find_submodule(lib, None)
+    with pytest.raises(submodules.SubmoduleNotCheckedOutError) as exc_info:
+        weburl.repo.resolve_revision("master")
+    assert isinstance(exc_info.value, ApplicationError)
+    assert str(exc_info.value) == "submodule vendor/lib is not checked out"
+    with pytest.raises(ApplicationError):
+        weburl.repo.is_ancestor(oid, oid)
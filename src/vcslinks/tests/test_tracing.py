@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest  # type: ignore
+
+from .. import aio, api, tracing
+from ..git import GitRepoAnalyzer
+
+SRC = str(Path(__file__).parents[2])
+
+
+def processes(tracer):
+    return [e for e in tracer.events if e["type"] == "process"]
+
+
+def test_disabled_by_default():
+    assert tracing.active is None
+
+
+def test_api_call(repository):
+    with tracing.trace() as tracer:
+        assert tracing.active is tracer
+        # Not a plain refname; needs `git rev-parse`:
+        url = api.commit("HEAD~0", path=repository)
+    assert tracing.active is None
+    (proc,) = processes(tracer)
+    oid = url.rsplit("/", 1)[1]
+    assert proc["argv"] == ["git", "rev-parse", "--verify", "HEAD~0"]
+    assert proc["api"] == "commit"
+    assert proc["returncode"] == 0
+    assert proc["stdout_size"] == len(oid) + 1
+    assert proc["cwd"] == str(repository)
+    (call,) = [e for e in tracer.events if e["type"] == "api"]
+    assert call["name"] == "commit"
+    assert call["duration"] >= proc["duration"]
+    # The nested `analyze` call is attributed to `commit`:
+    summary = tracer.summary()
+    assert list(summary) == ["commit"]
+    assert summary["commit"]["calls"] == 1
+    assert summary["commit"]["processes"] == 1
+
+
+def test_failed_process(repository):
+    with tracing.trace() as tracer:
+        with pytest.raises(subprocess.CalledProcessError):
+            api.commit("HEAD~5", path=repository)
+    (proc,) = processes(tracer)
+    assert proc["returncode"] != 0
+    assert proc["stderr_size"] > 0
+    (call,) = [e for e in tracer.events if e["type"] == "api"]
+    assert call["error"] == "CalledProcessError"
+
+
+def test_lazy_api(repository):
+    with tracing.trace() as tracer:
+        urls = api.files([repository], revision="HEAD~0", permalink=True)
+        assert tracer.summary()["files"]["processes"] == 0
+        list(urls)
+        repo = GitRepoAnalyzer(repository)
+        repo.git("rev-parse", "HEAD")
+    summary = tracer.summary()
+    assert summary["files"] == dict(summary["files"], calls=1, processes=1)
+    assert summary[""]["processes"] == 1
+    assert "files" in tracer.format_summary()
+
+
+def test_aio(repository):
+    with tracing.trace() as tracer:
+        asyncio.run(aio.commit("HEAD~0", path=repository))
+    assert ["git", "rev-parse", "--verify", "HEAD~0"] in [
+        p["argv"] for p in processes(tracer)
+    ]
+
+
+@pytest.mark.parametrize(
+    "name, format", [("trace.jsonl", "jsonl"), ("trace.json", "chrome")]
+)
+def test_output_file(repository, tmp_path_factory, name, format):
+    path = tmp_path_factory.mktemp("trace") / name
+    with tracing.trace(str(path)) as tracer:
+        assert tracer.format == format
+        api.commit("HEAD~0", path=repository)
+    text = path.read_text()
+    if format == "jsonl":
+        records = [json.loads(line) for line in text.splitlines()]
+        assert [r["type"] for r in records] == ["process", "api", "summary"]
+        assert records[-1]["commit"]["processes"] == 1
+    else:
+        events = json.loads(text)
+        assert [e["cat"] for e in events[:2]] == ["process", "api"]
+        assert events[0]["ph"] == "X"
+        assert events[0]["args"]["api"] == "commit"
+        assert events[-1]["name"] == "summary"
+
+
+def test_environment_variable(repository, tmp_path_factory):
+    path = tmp_path_factory.mktemp("trace") / "trace.jsonl"
+    pythonpath = os.pathsep.join(filter(None, [SRC, os.environ.get("PYTHONPATH")]))
+    env = dict(os.environ, PYTHONPATH=pythonpath, VCSLINKS_TRACE=str(path))
+    code = "import sys, vcslinks; vcslinks.commit('HEAD~0', path=sys.argv[1])"
+    subprocess.run([sys.executable, "-c", code, str(repository)], env=env, check=True)
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert records[0]["argv"][:2] == ["git", "rev-parse"]
+    assert records[-1] == dict(records[-1], type="summary")
+    assert records[-1]["commit"]["calls"] == 1
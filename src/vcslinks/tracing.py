@@ -0,0 +1,341 @@
+"""
+Tracing of Git processes and API calls.
+
+Set the environment variable ``VCSLINKS_TRACE`` to a file name (or
+``-`` for standard error) to record every Git process started by
+`vcslinks` and every call of the high-level API, with their wall time.
+Records are written as JSON lines, or in the Chrome trace event format
+(viewable in ``chrome://tracing`` or Perfetto) if the file name ends
+with ``.json`` or ``VCSLINKS_TRACE_FORMAT=chrome``.  A summary of the
+Git processes per API function is written at exit.
+
+Tracing can also be enabled temporarily by `vcslinks.trace`:
+
+..
+   >>> _ = getfixture("github_repository")
+
+>>> import vcslinks
+>>> with vcslinks.trace() as tracer:
+...     _ = vcslinks.commit("HEAD")
+>>> tracer.summary()["commit"]["calls"]
+1
+
+When tracing is disabled, instrumented code only checks that `active`
+is `None`.
+"""
+
+import contextvars
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import IO, Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# The tracer in effect, if any:
+active: Optional["Tracer"] = None
+
+# Outermost API function being called in the current context:
+_current_api: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar(
+    "vcslinks_current_api", default=None
+)
+
+
+class Tracer:
+    """
+    Recorder of Git processes and API calls.
+
+    Records are written to `stream` (if given) in `format` (``jsonl``
+    or ``chrome``) as they happen and are otherwise kept in `events`.
+    """
+
+    def __init__(self, stream: Optional[IO[str]] = None, format: str = "jsonl"):
+        if format not in ("jsonl", "chrome"):
+            raise ValueError(f"unknown trace format: {format!r}")
+        self.stream = stream
+        self.format = format
+        self.events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        # API name -> [calls, processes, process time, API time]
+        self._stats: Dict[Optional[str], List[float]] = {}
+        if stream is not None and format == "chrome":
+            # The closing bracket is optional in the JSON array format.
+            stream.write("[\n")
+
+    def _emit(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            if self.stream is None:
+                self.events.append(event)
+                return
+            import json
+
+            if self.format == "chrome":
+                event = self._chrome_event(event)
+                self.stream.write(json.dumps(event) + ",\n")
+            else:
+                self.stream.write(json.dumps(event) + "\n")
+            self.stream.flush()
+
+    @staticmethod
+    def _chrome_event(event: Dict[str, Any]) -> Dict[str, Any]:
+        args = {
+            k: v
+            for k, v in event.items()
+            if k not in ("type", "name", "start", "duration", "pid", "tid")
+        }
+        return {
+            "name": event["name"],
+            "cat": event["type"],
+            "ph": "X",
+            "ts": round(event["start"] * 1e6, 3),
+            "dur": round(event["duration"] * 1e6, 3),
+            "pid": event["pid"],
+            "tid": event["tid"],
+            "args": args,
+        }
+
+    def _stat(self, api: Optional[str]) -> List[float]:
+        stat = self._stats.get(api)
+        if stat is None:
+            stat = self._stats[api] = [0, 0, 0.0, 0.0]
+        return stat
+
+    def record_process(
+        self,
+        argv: Sequence[str],
+        cwd: Optional[str],
+        start: float,
+        returncode: Optional[int],
+        stdout_size: Optional[int] = None,
+        stderr_size: Optional[int] = None,
+    ) -> None:
+        """
+        Record a process started at `start` (`time.perf_counter`) and
+        finished now.  `returncode` is `None` for long-lived processes.
+        """
+        end = time.perf_counter()
+        api = _current_api.get()
+        with self._lock:
+            stat = self._stat(api)
+            stat[1] += 1
+            stat[2] += end - start
+        self._emit(
+            {
+                "type": "process",
+                "name": " ".join(argv[:2]),
+                "argv": list(argv),
+                "cwd": cwd,
+                "start": start - self._start,
+                "duration": end - start,
+                "returncode": returncode,
+                "stdout_size": stdout_size,
+                "stderr_size": stderr_size,
+                "api": api,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+        )
+
+    def run(self, args: Sequence[str], kwargs: Dict[str, Any]):
+        """
+        Run and record `subprocess.run(args, **kwargs)`.
+        """
+        import subprocess
+
+        start = time.perf_counter()
+        cwd = kwargs.get("cwd")
+        try:
+            proc = subprocess.run(args, **kwargs)
+        except subprocess.CalledProcessError as err:
+            self.record_process(
+                args, cwd, start, err.returncode, _size(err.stdout), _size(err.stderr)
+            )
+            raise
+        self.record_process(
+            args, cwd, start, proc.returncode, _size(proc.stdout), _size(proc.stderr)
+        )
+        return proc
+
+    @contextmanager
+    def api_call(self, name: str) -> Iterator[None]:
+        """
+        Attribute processes started in the context to API function `name`.
+        """
+        token = _current_api.set(name)
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as err:
+            error = type(err).__name__
+            raise
+        finally:
+            _current_api.reset(token)
+            self.record_api(name, start, error)
+
+    def record_api(
+        self, name: str, start: float, error: Optional[str], count: bool = True
+    ) -> None:
+        """
+        Record a call of API function `name` started at `start` and
+        finished now.  Resuming a lazy result is recorded with `count`
+        false.
+        """
+        end = time.perf_counter()
+        with self._lock:
+            stat = self._stat(name)
+            stat[0] += count
+            stat[3] += end - start
+        self._emit(
+            {
+                "type": "api",
+                "name": name,
+                "start": start - self._start,
+                "duration": end - start,
+                "error": error,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+        )
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Calls, Git processes and time (in seconds) per API function.
+        Processes started outside of the API are reported under ``""``.
+        """
+        with self._lock:
+            stats = {api or "": tuple(stat) for api, stat in self._stats.items()}
+        return {
+            api: {
+                "calls": int(calls),
+                "processes": int(processes),
+                "process_time": process_time,
+                "time": api_time,
+            }
+            for api, (calls, processes, process_time, api_time) in sorted(stats.items())
+        }
+
+    def format_summary(self) -> str:
+        lines = [f"{'API':<16} {'calls':>6} {'git':>6} {'git ms':>9} {'ms':>9}"]
+        for api, stat in self.summary().items():
+            lines.append(
+                f"{api or '-':<16} {stat['calls']:>6} {stat['processes']:>6}"
+                f" {stat['process_time'] * 1e3:>9.1f} {stat['time'] * 1e3:>9.1f}"
+            )
+        return "\n".join(lines)
+
+    def close(self) -> None:
+        """
+        Write the summary to the stream.
+        """
+        if self.stream is None:
+            return
+        import json
+
+        summary = self.summary()
+        with self._lock:
+            if self.format == "chrome":
+                event = {
+                    "name": "summary",
+                    "ph": "i",
+                    "s": "g",
+                    "ts": round((time.perf_counter() - self._start) * 1e6, 3),
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "args": summary,
+                }
+                self.stream.write(json.dumps(event) + "\n]\n")
+            else:
+                self.stream.write(json.dumps({"type": "summary", **summary}) + "\n")
+            self.stream.flush()
+
+
+def _size(output: Any) -> Optional[int]:
+    return None if output is None else len(output)
+
+
+def traced_api(name: str, func, args: Tuple, kwargs: Dict[str, Any]) -> Any:
+    """
+    Call `func` as the API function `name` under the active tracer.
+    Calls nested in another API function are attributed to the outer one.
+    """
+    tracer = active
+    if tracer is None or _current_api.get() is not None:
+        return func(*args, **kwargs)
+    with tracer.api_call(name):
+        result = func(*args, **kwargs)
+    if isinstance(result, Iterator):
+        return _traced_iter(tracer, name, result)
+    return result
+
+
+def _traced_iter(tracer: Tracer, name: str, iterator: Iterator) -> Iterator:
+    # Attribute the work done while producing each item to `name`,
+    # without affecting the caller between the items.
+    start = time.perf_counter()
+    error = None
+    try:
+        while True:
+            token = _current_api.set(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            except BaseException as err:
+                error = type(err).__name__
+                raise
+            finally:
+                _current_api.reset(token)
+            yield item
+    finally:
+        tracer.record_api(name, start, error, count=False)
+
+
+@contextmanager
+def trace(path: Optional[str] = None, format: Optional[str] = None) -> Iterator[Tracer]:
+    """
+    Enable tracing in the context and yield the `Tracer`.
+
+    Records are written to the file at `path` (see `vcslinks.tracing`
+    for the formats) or kept in `Tracer.events` if `path` is `None`.
+    """
+    global active
+    stream = None
+    if path is not None:
+        if format is None:
+            format = "chrome" if path.endswith(".json") else "jsonl"
+        stream = sys.stderr if path == "-" else open(path, "w")
+    tracer = Tracer(stream, format or "jsonl")
+    previous = active
+    active = tracer
+    try:
+        yield tracer
+    finally:
+        active = previous
+        tracer.close()
+        if stream is not None and stream is not sys.stderr:
+            stream.close()
+
+
+def _from_environ(environ=os.environ) -> Optional[Tracer]:
+    path = environ.get("VCSLINKS_TRACE")
+    if not path:
+        return None
+    format = environ.get("VCSLINKS_TRACE_FORMAT")
+    if not format:
+        format = "chrome" if path.endswith(".json") else "jsonl"
+    if path == "-":
+        stream = sys.stderr
+    elif format == "chrome":
+        stream = open(path, "w")
+    else:
+        stream = open(path, "a")
+    tracer = Tracer(stream, format)
+    import atexit
+
+    atexit.register(tracer.close)
+    return tracer
+
+
+active = _from_environ()